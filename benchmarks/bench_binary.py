@@ -0,0 +1,110 @@
+"""Bytes on the wire and encode/decode cost: maze-binary records vs the JSON API
+
+Runs both paths in-process against one MazeGame, without sockets, so the
+numbers are the protocol cost alone:
+
+  move       HttpClientInterface.set_location (JSON POST /api/player/move)
+             vs MOVE / MOVE_RESULT records
+  positions  one GET /api/player/location per player (what remote players poll)
+             vs one SNAPSHOT_REQUEST / POSITIONS exchange
+
+    python benchmarks/bench_binary.py --players 8 --iterations 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import maze_binary  # noqa: E402
+import maze_server  # noqa: E402
+from http_client import HttpClientInterface  # noqa: E402
+
+# Two positions inside the start cell, always valid whatever the maze
+POSITIONS = [(30, 30), (31, 30)]
+
+
+def json_move(client, server, i):
+    x, y = POSITIONS[i % 2]
+    request = client.build_http_request('POST', '/api/player/move',
+                                        {'player_id': client.player_id, 'x': x, 'y': y})
+    response = server.proses(request.decode())
+    result = client.parse_http_response(response)
+    return len(request), len(response), result['status'] == 'OK'
+
+
+def binary_move(session, i):
+    x, y = POSITIONS[i % 2]
+    request = maze_binary.encode_move(x, y)
+    response = session.feed(request)
+    _, ok, _, _, _ = maze_binary.MOVE_RESULT_RECORD.unpack_from(response)
+    return len(request), len(response), bool(ok)
+
+
+def json_positions(client, server, player_ids):
+    sent = received = 0
+    for player_id in player_ids:
+        request = client.build_http_request('GET', '/api/player/location', params={'id': player_id})
+        response = server.proses(request.decode())
+        location = client.parse_http_response(response)['location'].split(',')
+        int(location[0]), int(location[1])
+        sent += len(request)
+        received += len(response)
+    return sent, received
+
+
+def binary_positions(session):
+    request = maze_binary.SNAPSHOT_REQUEST_RECORD.pack(maze_binary.SNAPSHOT_REQUEST)
+    response = session.feed(request)
+    _, _, count = maze_binary.POSITIONS_HEADER.unpack_from(response)
+    entry = maze_binary.POSITION_ENTRY
+    [entry.unpack_from(response, maze_binary.POSITIONS_HEADER.size + i * entry.size) for i in range(count)]
+    return len(request), len(response)
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        result = fn(i)
+    return (time.perf_counter() - start) / iterations * 1e6, result
+
+
+def report(name, json_us, json_bytes, binary_us, binary_bytes):
+    print(f"{name:<10} {'json':<7} {json_bytes[0]:>8} {json_bytes[1]:>9} {json_us:>10.1f}")
+    print(f"{'':<10} {'binary':<7} {binary_bytes[0]:>8} {binary_bytes[1]:>9} {binary_us:>10.1f}")
+    print(f"{'':<10} {'ratio':<7} {json_bytes[0] / binary_bytes[0]:>7.1f}x "
+          f"{json_bytes[1] / binary_bytes[1]:>8.1f}x {json_us / binary_us:>9.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--players', type=int, default=8)
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    game = maze_server.game
+    player_ids = [f"bot{i:05d}" for i in range(args.players)]
+    for player_id in player_ids:
+        game.add_player(player_id, player_id)
+
+    client = HttpClientInterface(player_ids[0], player_ids[0], ('localhost', 55556))
+    server = maze_server.MazeHttpServer()
+    server.allow_keep_alive = True
+    session = maze_binary.BinarySession(game, player_ids[0])
+
+    print(f"{'message':<10} {'path':<7} {'sent B':>8} {'recv B':>9} {'us/op':>10}")
+    json_us, (sent, received, ok) = timed(lambda i: json_move(client, server, i), args.iterations)
+    assert ok
+    binary_us, (b_sent, b_received, b_ok) = timed(lambda i: binary_move(session, i), args.iterations)
+    assert b_ok
+    report('move', json_us, (sent, received), binary_us, (b_sent, b_received))
+
+    iterations = max(1, args.iterations // args.players)
+    json_us, json_bytes = timed(lambda i: json_positions(client, server, player_ids), iterations)
+    binary_us, binary_bytes = timed(lambda i: binary_positions(session), iterations)
+    report(f'pos x{args.players}', json_us, json_bytes, binary_us, binary_bytes)
+
+
+if __name__ == '__main__':
+    main()
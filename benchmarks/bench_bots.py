@@ -0,0 +1,314 @@
+"""Headless load test: bot players walking the maze through the client protocol
+
+Starts `maze_server.py` locally (or targets a running one with --server) and
+runs --bots bot players, spread over --procs client processes with one thread
+per bot. Each bot talks through HttpClientInterface exactly like
+maze_client.py without a stream connection:
+
+  join   POST /api/player/add, GET /api/maze, its start position
+  walk   one batched move per frame (--fps, 5 px like the client) along the
+         maze corridors, cell by cell, with a random pause (--pause) after
+         every cell, as a player holding and releasing keys
+  poll   GET /api/gamestate?since=<version> every --poll-interval seconds;
+         a new round refetches the maze and restarts the walk
+  reset  bot 0 resets the game every --reset-interval seconds, and as soon
+         as it sees a winner
+
+Reports requests, errors (transport failures and non-OK answers), req/s and
+latency percentiles per endpoint.
+
+    python benchmarks/bench_bots.py --bots 200 --duration 30
+    python benchmarks/bench_bots.py --bots 500 --procs 8 --engine asyncio --fps 30
+    python benchmarks/bench_bots.py --server 10.0.0.5:55556 --bots 100 --room loadtest
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_client import HttpClientInterface  # noqa: E402
+from maze_grid import MazeGrid  # noqa: E402
+from bench_engines import ROOT, percentile, wait_for_port  # noqa: E402
+
+# Pixels per move, Player.speed in maze_client.py
+SPEED = 5
+DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+class EndpointStats:
+    """Latencies and error counts per "METHOD /path", filled by TimedClient"""
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def merge(self, latencies, errors):
+        for endpoint, values in latencies.items():
+            self.latencies.setdefault(endpoint, []).extend(values)
+        for endpoint, count in errors.items():
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + count
+
+
+class TimedClient(HttpClientInterface):
+    """HttpClientInterface that times every request it sends"""
+    def __init__(self, stats, *args, **kwargs):
+        HttpClientInterface.__init__(self, *args, **kwargs)
+        self.stats = stats
+
+    def send_http_request(self, method, path, data=None, params=None, headers=None):
+        start = time.perf_counter()
+        result = HttpClientInterface.send_http_request(self, method, path, data, params, headers)
+        self.stats.record(f"{method} {path}", time.perf_counter() - start,
+                          result.get('status') in ('OK', 'NOT_MODIFIED'))
+        return result
+
+
+class Bot:
+    def __init__(self, index, args, stats, deadline):
+        self.index = index
+        self.args = args
+        self.deadline = deadline
+        self.random = random.Random(args.seed + index if args.seed is not None else None)
+        # Unique per run: the server refuses to hand an id that is playing to someone else
+        player_id = f'bot{index}-{args.run_id}'
+        self.client = TimedClient(stats, player_id, player_id, args.address, room=args.room)
+        self.maze_info = None
+        self.maze = None
+        self.round_number = None
+        self.version = None
+        self.x = self.y = 0
+        self.visited = set()
+        self.path = []           # Cells back to where the walk started, for backtracking
+        self.steps = []          # Moves (dx, dy) left to reach the next cell
+
+    def run(self):
+        time.sleep(self.random.uniform(0, self.args.ramp))
+        if self.client.add_player()['status'] != 'OK' or not self.sync_round():
+            self.client.close()
+            return
+        frame = 1.0 / self.args.fps
+        next_frame = next_poll = next_reset = time.perf_counter()
+        next_reset += self.args.reset_interval
+        while True:
+            now = time.perf_counter()
+            if now >= self.deadline:
+                break
+            if now >= next_poll:
+                self.poll()
+                next_poll = now + self.args.poll_interval
+            if self.index == 0 and self.args.reset_interval and now >= next_reset:
+                self.reset()
+                next_reset = now + self.args.reset_interval
+            if not self.steps:
+                self.plan_next_cell()
+                if self.args.pause:
+                    time.sleep(self.random.uniform(0, 2 * self.args.pause))
+                    next_frame = time.perf_counter()
+                continue
+            self.move(*self.steps[0])
+            # A slow server delays the next frame instead of piling moves up
+            next_frame = max(next_frame + frame, time.perf_counter())
+            time.sleep(max(0.0, next_frame - time.perf_counter()))
+        self.client.close()
+
+    def sync_round(self):
+        """Fetch the maze and our position, and start walking from there"""
+        maze_info = self.client.get_maze()
+        location = self.client.get_location()
+        if not maze_info or not location:
+            return False
+        self.maze_info = maze_info
+        self.maze = MazeGrid.from_maze_info(maze_info)
+        self.round_number = maze_info['round_number']
+        self.x, self.y = location
+        self.visited = {self.cell()}
+        self.path = []
+        self.steps = []
+        return True
+
+    def cell(self):
+        size = self.maze_info['cell_size']
+        return self.x // size, self.y // size
+
+    def plan_next_cell(self):
+        """Depth-first walk: an unvisited open neighbour, else back the way we came"""
+        size = self.maze_info['cell_size']
+        if self.x % size or self.y % size:
+            # A reset or rejected move left us between cells: back to the cell's corner first
+            self.steps = [step for step in ((-(self.x % size), 0), (0, -(self.y % size))) if any(step)]
+            return
+        cx, cy = self.cell()
+        options = [(dx, dy) for dx, dy in DIRECTIONS
+                   if self.maze.is_open(cx + dx, cy + dy) and (cx + dx, cy + dy) not in self.visited]
+        if options:
+            dx, dy = self.random.choice(options)
+            self.path.append((cx, cy))
+        elif self.path:
+            px, py = self.path.pop()
+            dx, dy = px - cx, py - cy
+        else:
+            self.visited = {(cx, cy)}  # Explored everything, start over
+            return
+        self.visited.add((cx + dx, cy + dy))
+        self.steps = [(dx * SPEED, dy * SPEED)] * (self.maze_info['cell_size'] // SPEED)
+
+    def move(self, dx, dy):
+        """One frame of movement, batched like Player.move_batched"""
+        moved = []
+        answered = []
+
+        def apply(result):
+            if 'x' in result:
+                self.x, self.y = result['x'], result['y']
+                answered.append(True)
+            moved.append(result['status'] == 'OK')
+
+        data = {'player_id': self.client.player_id}
+        if dx:
+            data['dx'] = dx
+        if dy:
+            data['dy'] = dy
+        self.client.begin_batch()
+        self.client.queue_request('POST', '/api/player/move', data, callback=apply)
+        self.client.flush_batch()
+        if moved == [True]:
+            self.steps.pop(0)
+        else:
+            # A reset moved us or the request failed: plan again from where the server says we are
+            self.steps = []
+            self.path = []
+            if not answered:
+                self.resync()
+
+    def resync(self):
+        location = self.client.get_location()
+        if location:
+            self.x, self.y = location
+
+    def poll(self):
+        game_state = self.client.get_game_state(self.version)
+        if not game_state:
+            return
+        self.version = game_state.get('version', self.version)
+        round_number = game_state.get('round_number', self.round_number)
+        if round_number != self.round_number:
+            self.sync_round()
+        elif game_state.get('winner') and self.index == 0:
+            self.reset()
+
+    def reset(self):
+        if self.client.reset_game()['status'] == 'OK':
+            self.sync_round()
+
+
+def bot_thread(index, args, stats, deadline):
+    try:
+        Bot(index, args, stats, deadline).run()
+    except Exception as e:  # One broken bot must not stop the run
+        stats.record('bot crashed', 0.0, False)
+        print(f"bot{index}: {e}", file=sys.stderr)
+
+
+def client_process(indexes, args, deadline, results):
+    stats = EndpointStats()
+    threads = [threading.Thread(target=bot_thread, args=(index, args, stats, deadline)) for index in indexes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((stats.latencies, stats.errors))
+
+
+def run(args):
+    procs = max(1, min(args.bots, args.procs))
+    results = multiprocessing.Queue()
+    # Bots join during the first --ramp seconds and all stop at the deadline
+    deadline = time.perf_counter() + args.ramp + args.duration
+    workers = [multiprocessing.Process(target=client_process,
+                                       args=(range(i, args.bots, procs), args, deadline, results))
+               for i in range(procs)]
+    for worker in workers:
+        worker.start()
+    stats = EndpointStats()
+    for _ in workers:
+        stats.merge(*results.get())
+    for worker in workers:
+        worker.join()
+    return stats
+
+
+def report(stats, args):
+    print(f"{'endpoint':<28} {'requests':>9} {'errors':>7} {'err %':>6} {'req/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    rows = sorted(stats.latencies.items(), key=lambda item: -len(item[1]))
+    rows.append(('total', [value for _, values in rows for value in values]))
+    for endpoint, latencies in rows:
+        latencies.sort()
+        errors = sum(stats.errors.values()) if endpoint == 'total' else stats.errors.get(endpoint, 0)
+        count = len(latencies)
+        print(f"{endpoint:<28} {count:>9} {errors:>7} {100.0 * errors / max(count, 1):>6.2f} "
+              f"{count / args.duration:>8.0f} {percentile(latencies, 50) * 1000:>8.2f} "
+              f"{percentile(latencies, 95) * 1000:>8.2f} {percentile(latencies, 99) * 1000:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--bots', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=20.0,
+                        help="seconds of load after the ramp-up")
+    parser.add_argument('--ramp', type=float, default=2.0, help="bots join spread over this many seconds")
+    parser.add_argument('--fps', type=float, default=60.0, help="moves per second while a bot walks")
+    parser.add_argument('--pause', type=float, default=0.3, help="mean pause in seconds at each cell")
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="seconds between gamestate polls")
+    parser.add_argument('--reset-interval', type=float, default=30.0, help="seconds between resets, 0 for none")
+    parser.add_argument('--room', default=None, help="room to play in (created if missing)")
+    parser.add_argument('--server', default=None, metavar='HOST:PORT',
+                        help="use a running server instead of starting one")
+    parser.add_argument('--port', type=int, default=55621, help="port of the server started by the tool")
+    parser.add_argument('--engine', default='threaded')
+    parser.add_argument('--server-args', default='', help="extra maze_server.py arguments, e.g. '--workers 64'")
+    parser.add_argument('--procs', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    args.run_id = os.urandom(3).hex()
+
+    server = None
+    if args.server:
+        host, _, port = args.server.rpartition(':')
+        args.address = (host or 'localhost', int(port))
+    else:
+        args.address = ('127.0.0.1', args.port)
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, 'maze_server.py'), str(args.port), '--engine', args.engine]
+            + args.server_args.split(),
+            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if server and not wait_for_port(args.port):
+            raise RuntimeError(f"server did not start on port {args.port}")
+        if args.room:
+            HttpClientInterface('setup', 'setup', args.address, room=args.room).create_room()
+        print(f"{args.bots} bots for {args.duration:.0f}s on {args.address[0]}:{args.address[1]}"
+              f"{' room ' + args.room if args.room else ''}: {args.fps:.0f} moves/s while walking, "
+              f"gamestate every {args.poll_interval}s, reset every {args.reset_interval:.0f}s")
+        stats = run(args)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    report(stats, args)
+
+
+if __name__ == '__main__':
+    main()
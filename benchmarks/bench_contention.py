@@ -0,0 +1,114 @@
+"""Readers against writers on one MazeGame: throughput and torn reads
+
+Reader threads serve what the HTTP handlers serve (the encoded game state, a
+delta, the player list and a location) while writer threads move players
+around and keep adding new ones, so the dicts grow under the readers. Any
+exception on a reader ("dictionary changed size during iteration" and the
+like) is counted as an error.
+
+  snapshot  readers go through the published immutable snapshots
+  live      readers json.dumps the live dicts, as the handlers used to
+
+    python benchmarks/bench_contention.py --readers 16 --writers 4 --duration 5
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from maze_game import MazeGame  # noqa: E402
+
+# Two positions inside the start cell, always valid whatever the maze
+POSITIONS = [(30, 30), (31, 30)]
+
+
+def read_snapshot(game, since):
+    json.dumps(game.get_game_state())
+    json.dumps(game.get_game_state_delta(since))
+    player_ids = game.get_player_ids()
+    game.get_player_position(player_ids[-1])
+    return game.snapshot.version
+
+
+def read_live(game, since):
+    json.dumps({'players': game.player_positions, 'player_stats': game.player_stats,
+                'collectibles': game.collectibles})
+    # Python-level walks like the old position snapshot and delta builders
+    positions = [(game.players[pid]['index'], pos['x'], pos['y'])
+                 for pid, pos in game.player_positions.items()]
+    {pid: game.player_stats[pid] for pid in game.player_stats}
+    player_ids = list(game.players.keys())
+    game.player_positions[player_ids[-1]]
+    return len(positions) and game.version
+
+
+def reader(game, read, deadline, counts, errors):
+    done = 0
+    since = 0
+    while time.perf_counter() < deadline:
+        try:
+            since = read(game, max(0, since - 5))
+        except Exception as e:
+            errors.append(type(e).__name__ + ': ' + str(e))
+        done += 1
+    counts.append(done)
+
+
+def writer(game, index, deadline, join_every, counts):
+    done = 0
+    player_id = f'writer{index}'
+    game.add_player(player_id, player_id)
+    while time.perf_counter() < deadline:
+        x, y = POSITIONS[done % 2]
+        game.move_player(player_id, x, y)
+        done += 1
+        if done % join_every == 0:
+            game.add_player(f'w{index}-{done}', 'joiner')
+    counts.append(done)
+
+
+def run(mode, args):
+    game = MazeGame()
+    read = read_snapshot if mode == 'snapshot' else read_live
+    deadline = time.perf_counter() + args.duration
+    reads, writes, errors = [], [], []
+    threads = [threading.Thread(target=writer, args=(game, i, deadline, args.join_every, writes))
+               for i in range(args.writers)]
+    threads += [threading.Thread(target=reader, args=(game, read, deadline, reads, errors))
+                for _ in range(args.readers)]
+    # Writers first, so readers always find at least one player
+    for thread in threads[:args.writers]:
+        thread.start()
+    time.sleep(0.05)
+    for thread in threads[args.writers:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(reads), sum(writes), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--join-every', type=int, default=20,
+                        help="each writer adds a new player every N moves")
+    parser.add_argument('--modes', nargs='+', default=['snapshot', 'live'], choices=['snapshot', 'live'])
+    args = parser.parse_args()
+
+    print(f"{args.readers} readers, {args.writers} writers, {args.duration:.0f}s")
+    print(f"{'mode':<9} {'reads/s':>9} {'writes/s':>9} {'errors':>7}")
+    for mode in args.modes:
+        reads, writes, errors = run(mode, args)
+        print(f"{mode:<9} {reads / args.duration:>9.0f} {writes / args.duration:>9.0f} {len(errors):>7}")
+        for message in sorted(set(errors))[:3]:
+            print(f"{'':<9} {message}")
+
+
+if __name__ == '__main__':
+    main()
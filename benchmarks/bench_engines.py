@@ -0,0 +1,169 @@
+"""Compare the threaded and asyncio server engines
+
+Each engine is started as `maze_server.py <port> --engine <name>` in a
+subprocess and driven by client processes that poll one endpoint as fast as
+they can, either over persistent connections or one connection per request.
+Reports requests/sec and latency percentiles per engine.
+
+    python benchmarks/bench_engines.py --clients 60 --duration 10
+    python benchmarks/bench_engines.py --no-keep-alive --path /api/status
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def read_response(sock, buffer):
+    """Read one Content-Length framed response, returns (ok, closed, leftover bytes)"""
+    while b"\r\n\r\n" not in buffer:
+        data = sock.recv(65536)
+        if not data:
+            return False, True, b""
+        buffer += data
+    header_end = buffer.find(b"\r\n\r\n") + 4
+    content_length = 0
+    closed = False
+    for line in buffer[:header_end].split(b"\r\n"):
+        line = line.lower()
+        if line.startswith(b"content-length:"):
+            content_length = int(line.split(b":", 1)[1])
+        elif line.startswith(b"connection:"):
+            closed = b"close" in line
+    while len(buffer) < header_end + content_length:
+        data = sock.recv(65536)
+        if not data:
+            return False, True, b""
+        buffer += data
+    return buffer.startswith(b"HTTP/1.1 2"), closed, buffer[header_end + content_length:]
+
+
+def client_loop(port, path, deadline, keep_alive, latencies, errors):
+    request = "GET {} HTTP/1.1\r\nHost: localhost\r\nConnection: {}\r\n\r\n".format(
+        path, 'keep-alive' if keep_alive else 'close').encode()
+    sock = None
+    buffer = b""
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if sock is None:
+                sock = socket.create_connection(('127.0.0.1', port), timeout=10)
+                buffer = b""
+            sock.sendall(request)
+            ok, closed, buffer = read_response(sock, buffer)
+        except OSError:
+            ok = closed = False
+        latencies.append(time.perf_counter() - start)
+        if not ok:
+            errors.append(1)
+        if not ok or closed:
+            if sock is not None:
+                sock.close()
+            sock = None
+    if sock is not None:
+        sock.close()
+
+
+def client_process(port, path, duration, keep_alive, threads, results):
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + duration
+    workers = [threading.Thread(target=client_loop,
+                                args=(port, path, deadline, keep_alive, latencies, errors))
+               for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put((latencies, len(errors)))
+
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100.0))
+    return sorted_values[index]
+
+
+def bench_engine(engine, args):
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'maze_server.py'), str(args.port), '--engine', engine],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(args.port):
+            raise RuntimeError(f"{engine} server did not start on port {args.port}")
+
+        procs = min(args.clients, args.procs)
+        results = multiprocessing.Queue()
+        workers = []
+        for i in range(procs):
+            threads = args.clients // procs + (1 if i < args.clients % procs else 0)
+            workers.append(multiprocessing.Process(
+                target=client_process,
+                args=(args.port, args.path, args.duration, args.keep_alive, threads, results)))
+        for worker in workers:
+            worker.start()
+
+        latencies = []
+        errors = 0
+        for _ in workers:
+            worker_latencies, worker_errors = results.get()
+            latencies.extend(worker_latencies)
+            errors += worker_errors
+        for worker in workers:
+            worker.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    return {
+        'engine': engine,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / args.duration,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--engines', nargs='+', default=['threaded', 'asyncio'])
+    parser.add_argument('--port', type=int, default=55600)
+    parser.add_argument('--path', default='/api/gamestate')
+    parser.add_argument('--clients', type=int, default=60)
+    parser.add_argument('--procs', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--no-keep-alive', dest='keep_alive', action='store_false')
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients, {args.duration:.0f}s, GET {args.path}, "
+          f"keep-alive {'on' if args.keep_alive else 'off'}")
+    print(f"{'engine':<10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for engine in args.engines:
+        r = bench_engine(engine, args)
+        print(f"{r['engine']:<10} {r['requests']:>9} {r['errors']:>7} {r['rps']:>9.0f} "
+              f"{r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+        time.sleep(1)  # Let the port drain before the next engine binds it
+
+
+if __name__ == '__main__':
+    main()
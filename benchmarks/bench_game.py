@@ -0,0 +1,162 @@
+"""Micro-benchmarks of the MazeGame and HttpServer hot paths, with a baseline check
+
+Runs in-process. Every case is timed with timeit (autoranged loops,
+--repeat rounds) and reported as the best and the median microseconds per
+call:
+
+  generate_maze/WxH            maze generation at several sizes
+  generate_collectibles/WxH    collectible placement on that maze
+  is_valid_position/valid      a position inside the start cell
+  is_valid_position/wall       a position overlapping a wall
+  move_player/no_collectibles  a move on a game without collectibles
+  move_player/collectibles     the same with the round's collectibles
+  get_game_state/N             get_game_state() + json.dumps with N players
+  generate_player_avatar       one avatar image
+  proses/status                HttpServer.proses of a GET /status
+  response/json                HttpServer.response with a small JSON body
+
+--output writes the results as JSON; --baseline compares them with an
+earlier output and exits with status 1 when a case got slower than
+--threshold (best time, relative). Baselines only compare on the machine
+that made them.
+
+    python benchmarks/bench_game.py --output baseline.json
+    python benchmarks/bench_game.py --baseline baseline.json --threshold 0.2
+    python benchmarks/bench_game.py --filter get_game_state --repeat 10
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_server import HttpServer  # noqa: E402
+from maze_game import MazeGame  # noqa: E402
+
+MAZE_SIZES = [(21, 15), (41, 31), (61, 45), (201, 201)]
+PLAYER_COUNTS = [1, 10, 100, 500]
+# Two positions inside the start cell, always valid whatever the maze
+POSITIONS = [(30, 30), (31, 30)]
+
+
+def game_with_players(count):
+    game = MazeGame()
+    for i in range(count):
+        game.add_player(f'p{i}', f'p{i}')
+    return game
+
+
+def mover(game):
+    """move_player back and forth between POSITIONS"""
+    game.add_player('mover', 'mover')
+    state = {'i': 0}
+
+    def move():
+        state['i'] ^= 1
+        game.move_player('mover', *POSITIONS[state['i']])
+    return move
+
+
+def cases():
+    """(name, zero-argument callable) pairs; setup happens here, outside the timing"""
+    for width, height in MAZE_SIZES:
+        game = MazeGame(width, height)
+        yield f'generate_maze/{width}x{height}', game.generate_maze
+        yield f'generate_collectibles/{width}x{height}', game.generate_collectibles
+
+    game = MazeGame()
+    yield 'is_valid_position/valid', lambda: game.is_valid_position(30, 30)
+    yield 'is_valid_position/wall', lambda: game.is_valid_position(15, 15)
+
+    game = MazeGame()
+    game.collectibles = []
+    yield 'move_player/no_collectibles', mover(game)
+    game = MazeGame()
+    yield 'move_player/collectibles', mover(game)
+
+    for count in PLAYER_COUNTS:
+        game = game_with_players(count)
+        yield f'get_game_state/{count}', lambda game=game: json.dumps(game.get_game_state())
+
+    game = MazeGame()
+    yield 'generate_player_avatar', lambda: game.generate_player_avatar(game.player_colors[0], 'Player')
+
+    server = HttpServer()
+    yield 'proses/status', lambda: server.proses("GET /status HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    body = json.dumps({'status': 'OK', 'message': 'Position updated', 'x': 30, 'y': 30})
+    yield 'response/json', lambda: server.response(200, 'OK', body, {'Content-Type': 'application/json'})
+
+
+def measure(function, repeat):
+    timer = timeit.Timer(function)
+    try:
+        number, _ = timer.autorange()
+        times = timer.repeat(repeat, number)
+    except RecursionError:
+        return {'error': 'RecursionError'}
+    per_call = [t / number * 1e6 for t in times]
+    return {'best_us': round(min(per_call), 3), 'median_us': round(statistics.median(per_call), 3),
+            'number': number}
+
+
+def compare(results, baseline, threshold):
+    """Print the change of every case against the baseline, returns the regressed case names"""
+    regressions = []
+    print(f"\n{'case':<36} {'base us':>10} {'now us':>10} {'change':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or 'best_us' not in base or 'best_us' not in result:
+            continue
+        change = result['best_us'] / base['best_us'] - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<36} {base['best_us']:>10.2f} {result['best_us']:>10.2f} {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=5, help="timing rounds per case")
+    parser.add_argument('--filter', default='', help="only cases whose name contains this")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="JSON file of an earlier --output to compare with")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="slowdown that counts as a regression (default: 0.2 = 20%%)")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)  # add_player logs every join
+
+    results = {}
+    print(f"{'case':<36} {'best us':>10} {'median us':>10}")
+    for name, function in cases():
+        if args.filter not in name:
+            continue
+        result = results[name] = measure(function, args.repeat)
+        if 'error' in result:
+            print(f"{name:<36} {result['error']:>21}")
+        else:
+            print(f"{name:<36} {result['best_us']:>10.2f} {result['median_us']:>10.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}, f, indent=2)
+            f.write('\n')
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) slower than the baseline by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
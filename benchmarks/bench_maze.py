@@ -0,0 +1,98 @@
+"""Maze generation time and memory: the old recursive generator vs MazeGrid
+
+  recursive  the carve_path closure MazeGame used before, over a list of
+             lists of ints (copied here); fails with RecursionError once the
+             carve gets deeper than the recursion limit
+  maze_grid  MazeGrid.generate, explicit stack, stored at one bit per cell
+
+For every size: the best of --repeat generation times and the peak memory
+traced by tracemalloc during one generation (the grid itself plus the
+generator's working memory). tracemalloc slows allocation down, so the
+memory run is separate from the timed ones.
+
+    python benchmarks/bench_maze.py
+    python benchmarks/bench_maze.py --sizes 21x15 1001x1001 --repeat 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from maze_grid import MazeGrid  # noqa: E402
+
+SIZES = ['21x15', '101x101', '1001x1001', '2001x2001', '4001x4001']
+
+
+def recursive_maze(width, height):
+    """MazeGame.generate_maze as it was, recursive backtracking over lists"""
+    maze = [[1 for _ in range(width)] for _ in range(height)]
+
+    def carve_path(x, y):
+        maze[y][x] = 0
+        directions = [(0, 2), (2, 0), (0, -2), (-2, 0)]
+        random.shuffle(directions)
+        for dx, dy in directions:
+            nx, ny = x + dx, y + dy
+            if 0 < nx < width - 1 and 0 < ny < height - 1 and maze[ny][nx] == 1:
+                maze[y + dy // 2][x + dx // 2] = 0
+                carve_path(nx, ny)
+
+    carve_path(1, 1)
+    maze[height - 2][width - 2] = 0
+    return maze
+
+
+def grid_maze(width, height):
+    return MazeGrid.generate(width, height)
+
+
+GENERATORS = [('recursive', recursive_maze), ('maze_grid', grid_maze)]
+
+
+def measure(function, width, height, repeat):
+    """(best seconds, peak bytes), or the exception name when generation fails"""
+    try:
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function(width, height)
+            best = min(best, time.perf_counter() - start)
+        tracemalloc.start()
+        try:
+            function(width, height)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    except RecursionError as e:
+        return type(e).__name__
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', nargs='+', default=SIZES, help="WIDTHxHEIGHT, odd numbers")
+    parser.add_argument('--repeat', type=int, default=3, help="timed generations per size")
+    parser.add_argument('--only', choices=[name for name, _ in GENERATORS], help="run one generator")
+    args = parser.parse_args()
+
+    print(f"recursion limit {sys.getrecursionlimit()}")
+    print(f"{'size':<12} {'generator':<10} {'best ms':>10} {'peak MB':>9}")
+    for size in args.sizes:
+        width, height = (int(side) for side in size.split('x'))
+        for name, function in GENERATORS:
+            if args.only and name != args.only:
+                continue
+            result = measure(function, width, height, args.repeat)
+            if isinstance(result, str):
+                print(f"{size:<12} {name:<10} {result:>20}")
+            else:
+                seconds, peak = result
+                print(f"{size:<12} {name:<10} {seconds * 1000:>10.2f} {peak / 1e6:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""Request parsing cost: RequestParser vs the old extract/decode/split path
+
+Runs in-process, without sockets. Each scenario delivers the same bytes in
+the same chunks to both parsers and reports microseconds per request:
+
+  get        a small GET in one read
+  post       a POST with a 2 KiB JSON body in one read
+  pipelined  50 GETs in one read
+  trickle    a POST with a 64 KiB body arriving in 512-byte reads
+
+    python benchmarks/bench_parser.py --iterations 2000
+
+--fuzz N checks the parser instead: N rounds of random requests (multibyte
+UTF-8 bodies included) split at random points must parse back to exactly
+what was sent, and random corruptions of them may only be answered with
+RequestError, never another exception.
+
+    python benchmarks/bench_parser.py --fuzz 5000 --seed 1
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_server import RequestError, RequestParser  # noqa: E402
+
+
+def legacy_extract(buffer):
+    """The old extract_request: rescans the whole buffer on every read"""
+    header_end = buffer.find(b"\r\n\r\n")
+    if header_end < 0:
+        return None, buffer
+    content_length = 0
+    for line in buffer[:header_end].split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            try:
+                content_length = max(0, int(value.strip()))
+            except ValueError:
+                content_length = 0
+            break
+    request_end = header_end + 4 + content_length
+    if len(buffer) < request_end:
+        return None, buffer
+    return buffer[:request_end], buffer[request_end:]
+
+
+def legacy_parse(chunks):
+    """extract, decode the whole request, split it again as proses() used to"""
+    parsed = 0
+    buffer = b""
+    for chunk in chunks:
+        buffer = buffer + chunk
+        while True:
+            request, buffer = legacy_extract(buffer)
+            if request is None:
+                break
+            data = request.decode(errors='replace')
+            lines = data.split("\r\n")
+            [n for n in lines[1:] if n != '']
+            data[data.find("\r\n\r\n") + 4:]
+            parsed += 1
+    return parsed
+
+
+def parser_parse(chunks):
+    parsed = 0
+    parser = RequestParser(max_body_size=1 << 20)
+    for chunk in chunks:
+        parser.feed(chunk)
+        while parser.next_request() is not None:
+            parsed += 1
+    return parsed
+
+
+def build_request(method, path, body=b'', headers=()):
+    lines = [f"{method} {path} HTTP/1.1", "Host: localhost", "User-Agent: bench"]
+    lines.extend(headers)
+    if body:
+        lines.append("Content-Type: application/json")
+        lines.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def scenarios():
+    get = build_request('GET', '/api/gamestate?room=default')
+    post = build_request('POST', '/api/player/move',
+                         json.dumps({'player_id': 'bot', 'x': 30, 'y': 30, 'pad': 'x' * 2000}).encode())
+    big = build_request('POST', '/api/batch', json.dumps({'pad': 'y' * 65536}).encode())
+    return [
+        ('get', [get], 1),
+        ('post', [post], 1),
+        ('pipelined', [get * 50], 50),
+        ('trickle', split(big, 512), 1),
+    ]
+
+
+def bench(iterations):
+    print(f"{'scenario':<10} {'legacy us':>10} {'parser us':>10} {'speedup':>8}")
+    for name, chunks, count in scenarios():
+        results = []
+        for parse in (legacy_parse, parser_parse):
+            rounds = max(1, iterations // count) if name != 'trickle' else max(1, iterations // 100)
+            start = time.perf_counter()
+            for _ in range(rounds):
+                assert parse(chunks) == count
+            results.append((time.perf_counter() - start) / (rounds * count) * 1e6)
+        print(f"{name:<10} {results[0]:>10.2f} {results[1]:>10.2f} {results[0] / results[1]:>7.1f}x")
+
+
+def random_request(rng):
+    text = ''.join(rng.choice('abc xyz 123 é ü 迷路 🎮 "{}\r\n') for _ in range(rng.randint(0, 200)))
+    body = text.encode() if rng.random() < 0.7 else b''
+    method = 'POST' if body else rng.choice(['GET', 'OPTIONS'])
+    headers = [f"X-Fuzz-{i}: {rng.randint(0, 10 ** 6)}" for i in range(rng.randint(0, 5))]
+    raw = build_request(method, f"/api/fuzz?n={rng.randint(0, 999)}", body, headers)
+    head = raw.partition(b"\r\n\r\n")[0].decode().split("\r\n")
+    return raw, (head[0], head[1:], body.decode())
+
+
+def random_chunks(rng, data):
+    chunks = []
+    i = 0
+    while i < len(data):
+        size = rng.choice([1, 2, 3, 7, 64, 512, 4096])
+        chunks.append(data[i:i + size])
+        i += size
+    return chunks
+
+
+def corrupt(rng, data):
+    data = bytearray(data)
+    for _ in range(rng.randint(1, 8)):
+        choice = rng.random()
+        position = rng.randint(0, len(data))
+        if choice < 0.4:
+            data[position:position] = bytes(rng.randint(0, 255) for _ in range(rng.randint(1, 16)))
+        elif choice < 0.7 and position < len(data):
+            del data[position:position + rng.randint(1, 16)]
+        else:
+            data[position:position] = rng.choice([b"\r\n\r\n", b"Content-Length: -1\r\n",
+                                                   b"Content-Length: 99999999999\r\n", b"\r\n",
+                                                   b"Transfer-Encoding: chunked\r\n", b"\xff\xfe"])
+    return bytes(data)
+
+
+def fuzz(rounds, seed):
+    rng = random.Random(seed)
+    rejected = 0
+    for n in range(rounds):
+        sent = [random_request(rng) for _ in range(rng.randint(1, 5))]
+        parser = RequestParser(max_header_size=4096, max_body_size=4096)
+        received = []
+        for chunk in random_chunks(rng, b"".join(raw for raw, _ in sent)):
+            parser.feed(chunk)
+            while True:
+                request = parser.next_request()
+                if request is None:
+                    break
+                received.append((request.request_line, request.headers, request.body))
+        expected = [parsed for _, parsed in sent]
+        if received != expected or parser.rest():
+            raise AssertionError(f"round {n}: parsed {received!r}, sent {expected!r}")
+
+        parser = RequestParser(max_header_size=4096, max_body_size=4096)
+        try:
+            for chunk in random_chunks(rng, corrupt(rng, b"".join(raw for raw, _ in sent))):
+                parser.feed(chunk)
+                while parser.next_request() is not None:
+                    pass
+        except RequestError:
+            rejected += 1
+    print(f"fuzz: {rounds} rounds passed, {rejected} corrupted streams rejected with RequestError")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--fuzz', type=int, default=0, metavar='N',
+                        help="run N fuzz rounds instead of the benchmark")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.fuzz:
+        fuzz(args.fuzz, args.seed)
+    else:
+        bench(args.iterations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Response building and writing: header templates + sendmsg vs the old response()
+
+Runs in-process. For each body size it reports
+
+  build  microseconds to build one response: the old path (strftime Date,
+         headers concatenated with format(), encoded, joined with the body)
+         vs HttpServer.response_buffers (cached status line, Date and header
+         blocks; the body is not copied)
+  write  MB/s writing the responses into a socketpair, read on a thread:
+         sendall() of the joined bytes vs send_buffers() (sendmsg)
+
+    python benchmarks/bench_response.py --sizes 100 10000 1000000 --iterations 20000
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_server import HttpServer, send_buffers  # noqa: E402
+
+HEADERS = {'Content-Type': 'application/json'}
+
+
+def legacy_response(server, kode, message, messagebody, headers):
+    """HttpServer.response as it was: rebuilt from scratch for every request"""
+    tanggal = datetime.now().strftime('%c')
+    resp = []
+    resp.append("HTTP/1.1 {} {}\r\n".format(kode, message))
+    resp.append("Date: {}\r\n".format(tanggal))
+    if server.keep_alive:
+        resp.append("Connection: keep-alive\r\n")
+        resp.append("Keep-Alive: timeout={}, max={}\r\n".format(server.keep_alive_timeout, server.keep_alive_max))
+    else:
+        resp.append("Connection: close\r\n")
+    resp.append("Server: mazeserver/1.0\r\n")
+    resp.append("Content-Length: {}\r\n".format(len(messagebody)))
+    resp.append("Access-Control-Allow-Origin: *\r\n")
+    resp.append("Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n")
+    resp.append("Access-Control-Allow-Headers: Content-Type\r\n")
+    for kk in headers:
+        resp.append("{}:{}\r\n".format(kk, headers[kk]))
+    resp.append("\r\n")
+    response_headers = ''
+    for i in resp:
+        response_headers = "{}{}".format(response_headers, i)
+    return response_headers.encode() + messagebody
+
+
+def timed_build(build, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        build()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def drain(sock, total):
+    received = 0
+    while received < total:
+        data = sock.recv(1 << 20)
+        if not data:
+            return
+        received += len(data)
+
+
+def timed_write(send, response_size, iterations):
+    """MB/s for `iterations` calls of send(sock) through a socketpair"""
+    writer, reader = socket.socketpair()
+    thread = threading.Thread(target=drain, args=(reader, response_size * iterations))
+    thread.start()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        send(writer)
+    thread.join()
+    elapsed = time.perf_counter() - start
+    writer.close()
+    reader.close()
+    return response_size * iterations / elapsed / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000, 1000000])
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    server = HttpServer()
+    server.keep_alive = True
+    print(f"{'body B':>9} {'old us':>8} {'new us':>8} {'speedup':>8} {'old MB/s':>9} {'new MB/s':>9}")
+    for size in args.sizes:
+        body = b'x' * size
+        iterations = max(20, min(args.iterations, args.iterations * 1000 // size))
+        old_us = timed_build(lambda: legacy_response(server, 200, 'OK', body, HEADERS), iterations)
+        new_us = timed_build(lambda: server.response_buffers(200, 'OK', body, HEADERS), iterations)
+
+        response_size = len(legacy_response(server, 200, 'OK', body, HEADERS))
+        old_mbs = timed_write(lambda sock: sock.sendall(legacy_response(server, 200, 'OK', body, HEADERS)),
+                              response_size, iterations)
+        response_size = sum(len(b) for b in server.response_buffers(200, 'OK', body, HEADERS))
+        new_mbs = timed_write(lambda sock: send_buffers(sock, server.response_buffers(200, 'OK', body, HEADERS)),
+                              response_size, iterations)
+        print(f"{size:>9} {old_us:>8.2f} {new_us:>8.2f} {old_us / new_us:>7.1f}x {old_mbs:>9.0f} {new_mbs:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
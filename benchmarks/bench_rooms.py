@@ -0,0 +1,185 @@
+"""Throughput and latency as the number of concurrent rooms grows
+
+For every room count a fresh `maze_server.py` is started, the rooms are
+created and each gets one player per client that serves it. The same number
+of clients then cycles through its rooms, each step a move in one room
+followed by a GET /api/gamestate of that room, so the load stays constant
+while the rooms multiply. Reports requests/sec, latency percentiles and how
+evenly the rooms were served.
+
+    python benchmarks/bench_rooms.py --rooms 1 10 100 200 --clients 40
+    python benchmarks/bench_rooms.py --rooms 100 --engine asyncio --duration 20
+    python benchmarks/bench_rooms.py --rooms 100 --processes 1 4   # pre-fork scaling
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from bench_engines import ROOT, percentile, read_response, wait_for_port
+
+
+def post(path, body):
+    body = json.dumps(body).encode()
+    return ("POST {} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+            "Content-Length: {}\r\n\r\n".format(path, len(body))).encode() + body
+
+
+def get(path):
+    return "GET {} HTTP/1.1\r\nHost: localhost\r\n\r\n".format(path).encode()
+
+
+def setup_rooms(port, room_ids, assignments):
+    """Create every room and add each client's player to the rooms it serves"""
+    requests = [post('/api/room/create', {'room': room_id}) for room_id in room_ids]
+    for client, client_rooms in assignments:
+        requests.extend(post('/api/player/add?room=' + room_id,
+                             {'player_id': f'bot{client}', 'player_name': f'bot{client}'})
+                        for room_id in client_rooms)
+    sock = None
+    for request in requests:
+        if sock is None:
+            sock = socket.create_connection(('127.0.0.1', port), timeout=10)
+            buffer = b""
+        sock.sendall(request)
+        ok, closed, buffer = read_response(sock, buffer)
+        if not ok:
+            raise RuntimeError("Room setup failed: " + request.split(b"\r\n")[0].decode())
+        if closed:  # Server's per-connection request limit
+            sock.close()
+            sock = None
+    if sock is not None:
+        sock.close()
+
+
+def client_loop(port, client, room_ids, deadline, latencies, served, errors):
+    requests = []
+    for room_id in room_ids:
+        move = post('/api/player/move?room=' + room_id, {'player_id': f'bot{client}', 'dx': 0, 'dy': 0})
+        requests.append((room_id, move, get('/api/gamestate?room=' + room_id)))
+    sock = None
+    buffer = b""
+    step = 0
+    while time.perf_counter() < deadline:
+        room_id, move, gamestate = requests[step % len(requests)]
+        step += 1
+        for request in (move, gamestate):
+            start = time.perf_counter()
+            try:
+                if sock is None:
+                    sock = socket.create_connection(('127.0.0.1', port), timeout=10)
+                    buffer = b""
+                sock.sendall(request)
+                ok, closed, buffer = read_response(sock, buffer)
+            except OSError:
+                ok = closed = False
+            latencies.append(time.perf_counter() - start)
+            served[room_id] = served.get(room_id, 0) + 1
+            if not ok:
+                errors.append(1)
+            if not ok or closed:
+                if sock is not None:
+                    sock.close()
+                sock = None
+    if sock is not None:
+        sock.close()
+
+
+def client_process(port, assignments, duration, results):
+    latencies = []
+    errors = []
+    served = {}
+    deadline = time.perf_counter() + duration
+    workers = [threading.Thread(target=client_loop,
+                                args=(port, client, room_ids, deadline, latencies, served, errors))
+               for client, room_ids in assignments]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put((latencies, served, len(errors)))
+
+
+def bench_rooms(room_count, processes, args):
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'maze_server.py'), str(args.port), '--engine', args.engine,
+         '--processes', str(processes)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(args.port):
+            raise RuntimeError(f"server did not start on port {args.port}")
+        time.sleep(0.5 if processes > 1 else 0)  # Let every worker bind before the load starts
+
+        # Client c serves rooms c, c + clients, ... (or shares one when rooms < clients)
+        room_ids = [f'room{i:04d}' for i in range(room_count)]
+        assignments = [(c, room_ids[c::args.clients] or [room_ids[c % room_count]])
+                       for c in range(args.clients)]
+        setup_rooms(args.port, room_ids, assignments)
+        procs = min(args.clients, args.procs)
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=client_process,
+                                           args=(args.port, assignments[i::procs], args.duration, results))
+                   for i in range(procs)]
+        for worker in workers:
+            worker.start()
+
+        latencies = []
+        served = {}
+        errors = 0
+        for _ in workers:
+            worker_latencies, worker_served, worker_errors = results.get()
+            latencies.extend(worker_latencies)
+            for room_id, count in worker_served.items():
+                served[room_id] = served.get(room_id, 0) + count
+            errors += worker_errors
+        for worker in workers:
+            worker.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    counts = [served.get(room_id, 0) for room_id in room_ids]
+    return {
+        'rooms': room_count,
+        'processes': processes,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / args.duration,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'min_room': min(counts),
+        'max_room': max(counts),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rooms', type=int, nargs='+', default=[1, 10, 100, 200])
+    parser.add_argument('--engine', default='asyncio')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1],
+                        help="server pre-fork worker counts to compare")
+    parser.add_argument('--port', type=int, default=55601)
+    parser.add_argument('--clients', type=int, default=40)
+    parser.add_argument('--procs', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients, {args.duration:.0f}s, {args.engine} engine, move + gamestate per room")
+    print(f"{'procs':>5} {'rooms':>6} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'min/room':>9} {'max/room':>9}")
+    for processes in args.processes:
+        for room_count in args.rooms:
+            r = bench_rooms(room_count, processes, args)
+            print(f"{r['processes']:>5} {r['rooms']:>6} {r['requests']:>9} {r['errors']:>7} {r['rps']:>9.0f} "
+                  f"{r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['min_room']:>9} {r['max_room']:>9}")
+            time.sleep(1)  # Let the port drain before the next server binds it
+
+
+if __name__ == '__main__':
+    main()
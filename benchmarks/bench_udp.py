@@ -0,0 +1,117 @@
+"""UDP movement channel on a simulated bad network
+
+Runs a UdpGameServer in-process on a fresh room and drives it with one mover
+(absolute MOVE datagrams, acked) and one observer (PING, then position
+pushes). Both directions go through maze_udp.LossyLink, so every scenario
+gets the configured loss, latency, jitter and duplication. Reports how many
+moves were acked, the round-trip times, how many stale or duplicate
+datagrams each side dropped and how many pushes the observer received.
+
+    python benchmarks/bench_udp.py --loss 0 0.05 0.2 --latency 0.03 --jitter 0.02
+    python benchmarks/bench_udp.py --loss 0.1 --duplicate 0.1 --rate 120 --duration 10
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import maze_udp  # noqa: E402
+from maze_game import MazeGame  # noqa: E402
+from maze_server import RoomRegistry  # noqa: E402
+from bench_engines import percentile  # noqa: E402
+
+# Two positions inside the start cell, always valid whatever the maze
+POSITIONS = [(30, 30), (31, 30)]
+
+
+def run(loss, port, args):
+    def link(sock):
+        return maze_udp.LossyLink(sock, loss=loss, latency=args.latency, jitter=args.jitter,
+                                  duplicate=args.duplicate, seed=args.seed)
+
+    rooms = RoomRegistry(MazeGame())
+    room = rooms.get(RoomRegistry.default_room)
+    server = maze_udp.UdpGameServer(port, rooms)
+    server.link = link(server.sock)
+    server.bind()
+    server.start()
+
+    channels = []
+    for player_id in ('mover', 'observer'):
+        room.game.add_player(player_id, player_id)
+        token = room.game.get_session_token(player_id)
+        server.register(room, player_id, token)
+        channel = maze_udp.UdpChannel(token, ('127.0.0.1', port))
+        channel.link = link(channel.sock)
+        channels.append(channel)
+    mover, observer = channels
+
+    sent = {}
+    rtts = []
+    last_ack = None
+    pushes = 0
+    observer.ping()
+    interval = 1.0 / args.rate
+    deadline = time.perf_counter() + args.duration
+    next_send = time.perf_counter()
+    # Keep polling a little past the deadline for datagrams still in flight
+    drain_until = deadline + args.latency + args.jitter + 0.1
+    while time.perf_counter() < drain_until:
+        now = time.perf_counter()
+        if now < deadline and now >= next_send:
+            x, y = POSITIONS[len(sent) % 2]
+            sent[mover.move(x, y)] = now
+            next_send += interval
+            if len(sent) % args.rate == 0:
+                observer.ping()  # Keeps the observer's session alive
+        mover.poll()  # The mover gets position pushes too, count only new acks
+        if mover.last_ack_seq is not None and mover.last_ack_seq != last_ack:
+            last_ack = mover.last_ack_seq
+            rtts.append(time.perf_counter() - sent[last_ack])
+        if observer.poll():
+            pushes += 1
+        time.sleep(0.0005)
+
+    server.sock.close()
+    for channel in channels:
+        channel.close()
+    rtts.sort()
+    return {
+        'loss': loss,
+        'sent': len(sent),
+        'acked': len(rtts),
+        'p50_ms': percentile(rtts, 50) * 1000 if rtts else 0.0,
+        'p99_ms': percentile(rtts, 99) * 1000 if rtts else 0.0,
+        'server_stale': server.stale_packets,
+        'client_stale': mover.stale_packets + observer.stale_packets,
+        'pushes': pushes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--loss', type=float, nargs='+', default=[0.0, 0.05, 0.2],
+                        help="datagram loss probabilities to compare, each direction")
+    parser.add_argument('--latency', type=float, default=0.03, help="one-way delay in seconds")
+    parser.add_argument('--jitter', type=float, default=0.02, help="+/- seconds around the latency")
+    parser.add_argument('--duplicate', type=float, default=0.02, help="probability to send a datagram twice")
+    parser.add_argument('--rate', type=int, default=60, help="moves per second")
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--port', type=int, default=55701)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"{args.rate} moves/s for {args.duration:.0f}s, latency {args.latency * 1000:.0f}"
+          f"+/-{args.jitter * 1000:.0f} ms, {args.duplicate:.0%} duplicated")
+    print(f"{'loss':>6} {'sent':>6} {'acked':>6} {'p50 ms':>8} {'p99 ms':>8} {'stale srv':>10} "
+          f"{'stale cli':>10} {'pushes':>7}")
+    for i, loss in enumerate(args.loss):
+        r = run(loss, args.port + i, args)
+        print(f"{r['loss']:>6.0%} {r['sent']:>6} {r['acked']:>6} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+              f"{r['server_stale']:>10} {r['client_stale']:>10} {r['pushes']:>7}")
+
+
+if __name__ == '__main__':
+    main()
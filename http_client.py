@@ -0,0 +1,331 @@
+import socket
+import json
+import gzip
+import zlib
+import urllib.parse
+import maze_binary
+import maze_grid
+
+class HttpClientInterface:
+    def __init__(self, player_id='1', player_name='Player', server_address=('localhost', 55556),
+                 use_binary=False, room=None):
+        self.player_id = player_id
+        self.player_name = player_name
+        self.server_address = server_address
+        self.room = room  # Sent as ?room= on every request, None for the default room
+        self.sock = None  # Persistent HTTP/1.1 connection, reused across requests
+        self.etag_cache = {}  # url -> (ETag, result) for conditional GETs
+        # Opt-in maze-binary connection for moves, JSON stays for everything else
+        self.binary_channel = maze_binary.BinaryChannel(player_id, server_address, room) if use_binary else None
+        # Operations collected between begin_batch() and flush_batch()
+        self.batch = None
+
+    def close(self):
+        if self.binary_channel:
+            self.binary_channel.close()
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def read_http_response(self, sock):
+        """Read exactly one response (headers plus Content-Length body) from sock"""
+        response = b""
+        while b"\r\n\r\n" not in response:
+            data = sock.recv(4096)
+            if not data:
+                return response, False
+            response += data
+
+        header_end = response.find(b"\r\n\r\n") + 4
+        content_length = None
+        keep_alive = True
+        for line in response[:header_end].decode(errors='replace').split('\r\n')[1:]:
+            name, _, value = line.partition(':')
+            name = name.strip().lower()
+            if name == 'content-length':
+                content_length = int(value.strip())
+            elif name == 'connection' and value.strip().lower() == 'close':
+                keep_alive = False
+
+        if content_length is None:
+            # No framing information, the server signals the end by closing
+            while True:
+                data = sock.recv(4096)
+                if not data:
+                    break
+                response += data
+            return response, False
+
+        while len(response) < header_end + content_length:
+            data = sock.recv(4096)
+            if not data:
+                return response, False
+            response += data
+        return response, keep_alive
+
+    def send_http_request(self, method, path, data=None, params=None, headers=None):
+        """Send HTTP request to server"""
+        # A reused connection may have been closed by the server's idle
+        # timeout, so a failure on it is retried once on a fresh socket
+        reused = self.sock is not None
+        result = self._send_http_request(method, path, data, params, headers)
+        if reused and result.pop('retry', False):
+            result = self._send_http_request(method, path, data, params, headers)
+        result.pop('retry', None)
+        return result
+
+    def begin_batch(self):
+        """Start collecting queue_request() calls into a single /api/batch round-trip"""
+        self.batch = []
+
+    def queue_request(self, method, path, data=None, params=None, callback=None):
+        """Add an operation to the current batch; callback(result) runs on flush_batch()"""
+        if self.batch is None:
+            result = self.send_http_request(method, path, data, params)
+            if callback:
+                callback(result)
+            return
+        operation = {'method': method, 'path': path}
+        if data is not None:
+            operation['body'] = data
+        if params is not None:
+            operation['params'] = params
+        self.batch.append((operation, callback))
+
+    def flush_batch(self):
+        """Send the collected operations in one request and hand each callback its result"""
+        batch, self.batch = self.batch, None
+        if not batch:
+            return []
+        result = self.send_http_request('POST', '/api/batch', {'operations': [op for op, _ in batch]})
+        if result['status'] == 'OK':
+            results = result['results']
+        else:
+            results = [result] * len(batch)
+        for (_, callback), operation_result in zip(batch, results):
+            if callback:
+                callback(operation_result)
+        return results
+
+    def send_conditional_get(self, path, params=None):
+        """GET that revalidates a previously fetched result with If-None-Match"""
+        url = path + ('?' + urllib.parse.urlencode(params) if params else '')
+        cached = self.etag_cache.get(url)
+        headers = {'If-None-Match': cached[0]} if cached else None
+        result = self.send_http_request('GET', path, params=params, headers=headers)
+        if result['status'] == 'NOT_MODIFIED' and cached:
+            return cached[1]
+        if result['status'] == 'OK' and result.get('etag'):
+            self.etag_cache[url] = (result.pop('etag'), result)
+        return result
+
+    def build_http_request(self, method, path, data=None, params=None, headers=None):
+        """Encode one request exactly as it goes on the wire"""
+        # Build URL with parameters
+        url = path
+        if self.room:
+            params = dict(params or {}, room=self.room)
+        if params:
+            query_string = urllib.parse.urlencode(params)
+            url = f"{path}?{query_string}"
+        
+        extra_headers = ''.join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        
+        # Build HTTP request
+        body = b""
+        if method == 'GET':
+            request = f"GET {url} HTTP/1.1\r\n"
+            request += f"Host: {self.server_address[0]}:{self.server_address[1]}\r\n"
+            request += "Connection: keep-alive\r\n"
+            request += "Accept-Encoding: gzip, deflate\r\n"
+            request += extra_headers
+            request += "\r\n"
+        elif method == 'POST':
+            if data:
+                body = json.dumps(data).encode()
+            
+            request = f"POST {url} HTTP/1.1\r\n"
+            request += f"Host: {self.server_address[0]}:{self.server_address[1]}\r\n"
+            request += "Content-Type: application/json\r\n"
+            request += f"Content-Length: {len(body)}\r\n"
+            request += "Connection: keep-alive\r\n"
+            request += "Accept-Encoding: gzip, deflate\r\n"
+            request += extra_headers
+            request += "\r\n"
+        
+        return request.encode() + body
+
+    def parse_http_response(self, response):
+        """Decode a raw HTTP response into the server's JSON result"""
+        if b"\r\n\r\n" in response:
+            headers, body = response.split(b"\r\n\r\n", 1)
+            headers = headers.decode(errors='replace')
+            
+            # Parse status line
+            status_line = headers.split('\r\n')[0]
+            status_code = int(status_line.split()[1])
+            if status_code == 304:
+                return {'status': 'NOT_MODIFIED'}
+            
+            response_headers = {}
+            for line in headers.split('\r\n')[1:]:
+                name, _, value = line.partition(':')
+                response_headers[name.strip().lower()] = value.strip()
+            
+            if body.strip():
+                try:
+                    body = self.decode_body(body, response_headers.get('content-encoding', ''))
+                    result = json.loads(body)
+                    if 'etag' in response_headers:
+                        result['etag'] = response_headers['etag']
+                    return result
+                except (json.JSONDecodeError, UnicodeDecodeError, OSError, zlib.error):
+                    return {'status': 'ERROR', 'message': 'Invalid JSON response'}
+            else:
+                return {'status': 'ERROR', 'message': 'Empty response'}
+        else:
+            return {'status': 'ERROR', 'message': 'Invalid HTTP response'}
+
+    @staticmethod
+    def decode_body(body, content_encoding):
+        content_encoding = content_encoding.lower()
+        if content_encoding == 'gzip':
+            return gzip.decompress(body)
+        if content_encoding == 'deflate':
+            return zlib.decompress(body)
+        return body
+
+    def _send_http_request(self, method, path, data=None, params=None, headers=None):
+        try:
+            if self.sock is None:
+                self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                self.sock.settimeout(5.0)
+                self.sock.connect(self.server_address)
+            sock = self.sock
+            
+            sock.sendall(self.build_http_request(method, path, data, params, headers))
+            
+            # Receive response
+            response, keep_alive = self.read_http_response(sock)
+            if not keep_alive:
+                self.close()
+            if not response:
+                return {'status': 'ERROR', 'message': 'Empty response', 'retry': True}
+            
+            return self.parse_http_response(response)
+                
+        except socket.timeout:
+            self.close()
+            return {'status': 'ERROR', 'message': 'Connection timeout'}
+        except ConnectionRefusedError:
+            self.close()
+            return {'status': 'ERROR', 'message': 'Server not running'}
+        except (ConnectionResetError, BrokenPipeError) as e:
+            self.close()
+            return {'status': 'ERROR', 'message': str(e), 'retry': True}
+        except Exception as e:
+            self.close()
+            return {'status': 'ERROR', 'message': str(e)}
+
+    def get_tick_rate(self):
+        """Server simulation ticks per second, 0 when it only accepts direct moves"""
+        result = self.send_http_request('GET', '/api/status')
+        if result['status'] == 'OK':
+            return result.get('tick_rate', 0)
+        return 0
+
+    def create_room(self):
+        """Make sure self.room exists on the server (creating an existing room is a no-op)"""
+        return self.send_http_request('POST', '/api/room/create', {'room': self.room})
+
+    def get_rooms(self):
+        result = self.send_http_request('GET', '/api/rooms')
+        if result['status'] == 'OK':
+            return result['rooms']
+        return []
+
+    def add_player(self, token=None):
+        """Join the game; rejoining an id that is already playing takes its session token"""
+        data = {
+            'player_id': self.player_id,
+            'player_name': self.player_name
+        }
+        if token:
+            data['token'] = token
+        return self.send_http_request('POST', '/api/player/add', data)
+
+    def get_players_face(self, player_id=None):
+        """Base64 avatar of a player, this client's own by default"""
+        params = {'id': player_id or self.player_id}
+        result = self.send_conditional_get('/api/player/face', params=params)
+        if result['status'] == 'OK':
+            return result['face']
+        return None
+
+    def get_all_players(self):
+        result = self.send_http_request('GET', '/api/players')
+        if result['status'] == 'OK':
+            return result['players']
+        return []
+
+    def set_location(self, x, y):
+        if self.binary_channel:
+            try:
+                ok, _, _, _ = self.binary_channel.move(x, y)
+                return ok
+            except (OSError, maze_binary.ProtocolError) as e:
+                # Stay on JSON for the rest of the session
+                print(f"Warning: binary moves unavailable, using JSON: {e}")
+                self.binary_channel.close()
+                self.binary_channel = None
+        data = {
+            'player_id': self.player_id,
+            'x': x,
+            'y': y
+        }
+        result = self.send_http_request('POST', '/api/player/move', data)
+        return result['status'] == 'OK'
+
+    def send_input(self, dx, dy):
+        """Queue a held direction on the server; the result arrives as a 'tick' stream event"""
+        data = {
+            'player_id': self.player_id,
+            'dx': dx,
+            'dy': dy
+        }
+        result = self.send_http_request('POST', '/api/player/input', data)
+        return result['status'] == 'OK'
+
+    def get_location(self, player_id=None):
+        if player_id is None:
+            player_id = self.player_id
+        params = {'id': player_id}
+        result = self.send_http_request('GET', '/api/player/location', params=params)
+        if result['status'] == 'OK':
+            location = result['location'].split(',')
+            return (int(location[0]), int(location[1]))
+        return None
+
+    def get_maze(self):
+        """Maze layout of the current round (unchanged until a reset, so revalidated by ETag)
+
+        The maze comes packed, one bit per cell; MazeGrid.from_maze_info() decodes it.
+        """
+        result = self.send_conditional_get('/api/maze', {'encoding': maze_grid.ENCODING})
+        if result['status'] == 'OK':
+            return result['maze']
+        return None
+
+    def get_game_state(self, since=None):
+        """Full game state, or only the changes after version `since` (see 'delta' in the result)"""
+        params = {'since': since} if since is not None else None
+        result = self.send_http_request('GET', '/api/gamestate', params=params)
+        if result['status'] == 'OK':
+            return result['game_state']
+        return None
+
+    def reset_game(self):
+        return self.send_http_request('POST', '/api/game/reset')
@@ -1,62 +1,507 @@
 import sys
+import os
 import os.path
+import asyncio
+import stat
+import threading
+import urllib.parse
 import uuid
-from glob import glob
-from datetime import datetime
+import gzip
+import time
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
 import json
 
+class RequestError(Exception):
+    """A request that cannot be served; the connection answers status and closes"""
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+        self.message = message
+
+class HttpRequest:
+    """One parsed request: the request line and header lines as text, the body decoded once
+
+    raw keeps the request's bytes as received, for relaying it unchanged.
+    """
+    __slots__ = ('request_line', 'headers', 'body', 'raw')
+
+    def __init__(self, request_line, headers, body='', raw=None):
+        self.request_line = request_line
+        self.headers = headers
+        self.body = body
+        self.raw = raw
+
+class RequestParser:
+    """Incremental HTTP/1.1 request parser for one connection
+
+    feed() appends received bytes to a bytearray; next_request() hands out
+    complete requests (header block plus Content-Length bytes of body) one
+    at a time in arrival order, None while the next one is still incomplete.
+    The search for the end of the header block resumes where the previous
+    call stopped, so a request trickling in costs linear time. Header bytes
+    are decoded as latin-1, which cannot fail; the body is decoded as UTF-8
+    once it is complete, so characters split across reads are kept intact.
+    """
+    max_header_size = 16 * 1024
+    max_body_size = 1024 * 1024
+
+    def __init__(self, max_header_size=None, max_body_size=None):
+        if max_header_size is not None:
+            self.max_header_size = max_header_size
+        if max_body_size is not None:
+            self.max_body_size = max_body_size
+        self.buffer = bytearray()
+        self.scan_from = 0
+        # Parsed header block of the request being received, None until complete
+        self.head = None
+        self.body_start = 0
+        self.content_length = 0
+
+    def feed(self, data):
+        self.buffer += data
+
+    def rest(self):
+        """Bytes received after the last request handed out (e.g. after an upgrade)"""
+        return bytes(self.buffer)
+
+    def next_request(self):
+        """Next complete HttpRequest or None; raises RequestError for one that breaks the limits"""
+        buffer = self.buffer
+        head = self.head
+        if head is None:
+            # Empty lines between requests are allowed (RFC 9112, 2.2)
+            while buffer.startswith(b"\r\n"):
+                del buffer[:2]
+                self.scan_from = 0
+            header_end = buffer.find(b"\r\n\r\n", self.scan_from)
+            if header_end < 0:
+                if len(buffer) > self.max_header_size:
+                    raise RequestError(431, 'Request Header Fields Too Large')
+                self.scan_from = max(0, len(buffer) - 3)
+                return None
+            if header_end > self.max_header_size:
+                raise RequestError(431, 'Request Header Fields Too Large')
+            head = self.head = self.parse_head(buffer[:header_end])
+            self.body_start = header_end + 4
+
+        body_start = self.body_start
+        content_length = self.content_length
+        request_end = body_start + content_length
+        if len(buffer) < request_end:
+            return None
+        raw = bytes(buffer[:request_end])
+        del buffer[:request_end]  # O(1) at the front of a bytearray
+        self.head = None
+        self.scan_from = 0
+        body = raw[body_start:].decode('utf-8', errors='replace') if content_length else ''
+        return HttpRequest(head[0], head[1], body, raw)
+
+    def parse_head(self, head):
+        text = head.decode('latin-1')
+        lines = text.split("\r\n")
+        if not 1 <= lines[0].count(" ") <= 2:
+            raise RequestError(400, 'Bad Request')
+        headers = [line for line in lines[1:] if line != '']
+        self.content_length = 0
+        lowered = text.lower()
+        if 'content-length' not in lowered and 'transfer-encoding' not in lowered:
+            return lines[0], headers  # Most GETs: nothing to look up
+        content_length = None
+        for line in headers:
+            name, _, value = line.partition(':')
+            name = name.strip().lower()
+            if name == 'content-length':
+                value = value.strip()
+                if not value.isdigit() or (content_length is not None and int(value) != content_length):
+                    raise RequestError(400, 'Bad Request')
+                content_length = int(value)
+            elif name == 'transfer-encoding':
+                # Bodies are delimited by Content-Length only, also when relayed
+                raise RequestError(501, 'Not Implemented')
+        self.content_length = content_length or 0
+        if self.content_length > self.max_body_size:
+            raise RequestError(413, 'Payload Too Large')
+        return lines[0], headers
+
+# Response header pieces that never change, encoded once
+SERVER_HEADERS = (b"Server: mazeserver/1.0\r\n"
+                  # CORS headers for web clients
+                  b"Access-Control-Allow-Origin: *\r\n"
+                  b"Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
+                  b"Access-Control-Allow-Headers: Content-Type\r\n")
+status_lines = {}
+# Encoded blocks for the extra header dicts handlers pass (mostly a
+# Content-Type), bounded because ETag values make some of them unique
+header_blocks = {}
+max_header_blocks = 256
+
+_date = [0, b""]
+
+def http_date():
+    """Date header value (RFC 9110 IMF-fixdate), formatted at most once per second"""
+    now = int(time.time())
+    if now != _date[0]:
+        _date[1] = formatdate(now, usegmt=True).encode()
+        _date[0] = now
+    return _date[1]
+
+def status_line(kode, message):
+    line = status_lines.get((kode, message))
+    if line is None:
+        line = status_lines[(kode, message)] = "HTTP/1.1 {} {}\r\n".format(kode, message).encode()
+    return line
+
+def header_block(headers):
+    if not headers:
+        return b""
+    key = tuple(headers.items())
+    block = header_blocks.get(key)
+    if block is None:
+        block = "".join("{}:{}\r\n".format(kk, vv) for kk, vv in key).encode()
+        if len(header_blocks) < max_header_blocks:
+            header_blocks[key] = block
+    return block
+
+class FileBody:
+    """Response body left in a file: length bytes from offset, sent with sendfile"""
+    __slots__ = ('path', 'offset', 'length')
+
+    def __init__(self, path, offset, length):
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            return f.read(self.length)
+
+    def check_sent(self, sent):
+        # The file shrank after its size went out as Content-Length: the
+        # connection cannot be reused, so fail it
+        if sent != self.length:
+            raise ConnectionError("{} changed while it was being sent".format(self.path))
+
+def send_buffers(sock, data):
+    """sendall() for a response given as bytes or as a sequence of buffers
+
+    Buffers go out with one sendmsg() (scatter-gather), so a body is never
+    copied into a joined response; partial sends resume through memoryviews.
+    A FileBody part goes out with socket.sendfile (os.sendfile, zero-copy).
+    """
+    if isinstance(data, (bytes, bytearray)):
+        sock.sendall(data)
+        return
+    buffers = []
+    for part in data:
+        if isinstance(part, FileBody):
+            send_gathered(sock, buffers)
+            buffers = []
+            with open(part.path, 'rb') as f:
+                part.check_sent(sock.sendfile(f, part.offset, part.length))
+        elif part:
+            buffers.append(memoryview(part))
+    send_gathered(sock, buffers)
+
+def send_gathered(sock, buffers):
+    if not hasattr(sock, 'sendmsg'):
+        sock.sendall(b"".join(buffers))  # e.g. Windows
+        return
+    while buffers:
+        sent = sock.sendmsg(buffers)
+        while sent:
+            if sent >= len(buffers[0]):
+                sent -= len(buffers[0])
+                buffers.pop(0)
+            else:
+                buffers[0] = buffers[0][sent:]
+                sent = 0
+
+async def write_buffers(writer, data):
+    """send_buffers for an asyncio StreamWriter, drained; the transport gathers the buffers itself"""
+    if isinstance(data, (bytes, bytearray)):
+        writer.write(data)
+    else:
+        for part in data:
+            if isinstance(part, FileBody):
+                await writer.drain()
+                with open(part.path, 'rb') as f:
+                    part.check_sent(await asyncio.get_running_loop().sendfile(
+                        writer.transport, f, part.offset, part.length))
+            else:
+                writer.write(part)
+    await writer.drain()
+
+def join_buffers(data):
+    if isinstance(data, (bytes, bytearray)):
+        return data
+    return b"".join(part.read() if isinstance(part, FileBody) else part for part in data)
+
+def parse_range(value, size):
+    """(first, last) byte of a single "bytes=" Range, None to send the whole file
+
+    Multiple ranges and malformed values are ignored, which RFC 9110 allows.
+    first >= size means the range cannot be satisfied (416).
+    """
+    unit, _, spec = value.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, dash, last = spec.strip().partition('-')
+    if not dash:
+        return None
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            return (max(0, size - length), size - 1) if length > 0 else (size, size)
+        first = int(first)
+        last = min(int(last), size - 1) if last else size - 1
+        if first < 0 or (first < size and last < first):
+            return None
+    except ValueError:
+        return None
+    return first, last
+
+class StaticFile:
+    """Metadata of one served file, valid while its stat signature is unchanged"""
+    def __init__(self, path, st, content=None):
+        self.path = path
+        self.signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+        self.size = st.st_size
+        self.mtime = int(st.st_mtime)
+        self.etag = '"{:x}-{:x}"'.format(st.st_size, st.st_mtime_ns)
+        self.last_modified = formatdate(st.st_mtime, usegmt=True)
+        # Small files are kept in memory (and their compressed forms, by
+        # coding), bigger ones are sent from disk with sendfile
+        self.content = content
+        self.compressed = {}
+
+    def body(self, first=0, last=None):
+        last = self.size - 1 if last is None else last
+        if self.content is not None:
+            return self.content[first:last + 1]
+        return FileBody(self.path, first, last + 1 - first)
+
+class StaticFiles:
+    """Files under root served by URL path, with a stat-validated metadata cache
+
+    Every lookup costs one os.stat(); the ETag, Last-Modified and, for files
+    under sendfile_min_size, the content are only rebuilt when size, mtime or
+    inode change. Hidden names (including "..") and anything resolving
+    outside root are never served.
+    """
+    sendfile_min_size = 64 * 1024
+    max_cached_bytes = 8 * 1024 * 1024
+    max_entries = 1024
+
+    def __init__(self, root):
+        self.root = os.path.realpath(root)
+        self.entries = {}
+        self.cached_bytes = 0
+        self.lock = threading.Lock()
+
+    def resolve(self, url_path):
+        parts = [part for part in url_path.split('/') if part]
+        if not parts or any(part.startswith('.') or '\\' in part or '\0' in part for part in parts):
+            return None
+        path = os.path.realpath(os.path.join(self.root, *parts))
+        if not path.startswith(self.root + os.sep):
+            return None  # A symlink pointing out of root
+        return path
+
+    def lookup(self, object_address):
+        """StaticFile for a request target, None when there is no such file"""
+        url_path = urllib.parse.unquote(object_address.partition('?')[0])
+        entry = self.entries.get(url_path)
+        path = entry.path if entry else self.resolve(url_path)
+        if path is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        if st is None or not stat.S_ISREG(st.st_mode):
+            self.forget(url_path)
+            return None
+        if entry is not None and entry.signature == (st.st_size, st.st_mtime_ns, st.st_ino):
+            return entry
+
+        content = None
+        if st.st_size < self.sendfile_min_size and self.cached_bytes + st.st_size <= self.max_cached_bytes:
+            try:
+                with open(path, 'rb') as f:
+                    content = f.read()
+            except OSError:
+                return None
+            st = os.stat(path)  # Signature of what was read
+        entry = StaticFile(path, st, content)
+        with self.lock:
+            self.forget(url_path)
+            if len(self.entries) < self.max_entries:
+                self.entries[url_path] = entry
+                self.cached_bytes += len(content or b'')
+        return entry
+
+    def forget(self, url_path):
+        entry = self.entries.pop(url_path, None)
+        if entry is not None:
+            self.cached_bytes -= len(entry.content or b'')
+
+# Content codings offered to clients, in order of preference
+ENCODINGS = ('gzip', 'deflate')
+
+def compress_body(body, encoding, level=6):
+    if encoding == 'gzip':
+        # mtime=0 so the same body always compresses to the same bytes
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    return zlib.compress(body, level)  # HTTP "deflate" is the zlib format
+
+def negotiate_encoding(accept_encoding):
+    """Best of ENCODINGS allowed by an Accept-Encoding value, None for identity"""
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    best = None
+    for coding in ENCODINGS:
+        q = weights.get(coding, weights.get('*', 0.0))
+        if q > 0 and (best is None or q > weights.get(best, weights.get('*', 0.0))):
+            best = coding
+    return best
+
 class HttpServer:
+    # (keep_alive, timeout, max) -> encoded Connection header lines
+    connection_blocks = {}
+    # Files served for GET paths no handler claims; replace to change the root
+    static_files = StaticFiles('static')
+
     def __init__(self):
         self.sessions = {}
+        # Persistent connection state, updated by proses() for every request
+        self.allow_keep_alive = False
+        self.keep_alive = False
+        self.keep_alive_timeout = 15
+        self.keep_alive_max = 100
+        # Response compression: coding negotiated for the current request
+        # (None = identity) and the smallest body worth compressing
+        self.content_encoding = None
+        self.compress_min_size = 1024
+        self.compression_level = 6
+        self.compressible_types = ('application/json', 'text/')
         self.types = {}
         self.types['.pdf'] = 'application/pdf'
         self.types['.jpg'] = 'image/jpeg'
         self.types['.txt'] = 'text/plain'
         self.types['.html'] = 'text/html'
         self.types['.json'] = 'application/json'
+        self.types['.css'] = 'text/css'
+        self.types['.js'] = 'text/javascript'
+        self.types['.png'] = 'image/png'
+        self.types['.svg'] = 'image/svg+xml'
+        self.types['.ico'] = 'image/x-icon'
         
-    def response(self, kode=404, message='Not Found', messagebody=bytes(), headers={}):
-        tanggal = datetime.now().strftime('%c')
-        resp = []
-        resp.append("HTTP/1.0 {} {}\r\n".format(kode, message))
-        resp.append("Date: {}\r\n".format(tanggal))
-        resp.append("Connection: close\r\n")
-        resp.append("Server: mazeserver/1.0\r\n")
-        resp.append("Content-Length: {}\r\n".format(len(messagebody)))
-        
-        # Add CORS headers for web clients
-        resp.append("Access-Control-Allow-Origin: *\r\n")
-        resp.append("Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n")
-        resp.append("Access-Control-Allow-Headers: Content-Type\r\n")
-        
-        for kk in headers:
-            resp.append("{}:{}\r\n".format(kk, headers[kk]))
-        resp.append("\r\n")
-
-        response_headers = ''
-        for i in resp:
-            response_headers = "{}{}".format(response_headers, i)
-            
-        # Convert messagebody to bytes if needed
+    def response(self, kode=404, message='Not Found', messagebody=bytes(), headers={}, compressed=None):
+        """Full response as bytes, see response_buffers"""
+        return b"".join(self.response_buffers(kode, message, messagebody, headers, compressed))
+
+    def response_buffers(self, kode=404, message='Not Found', messagebody=bytes(), headers={}, compressed=None):
+        """Full response as (header block, body) for send_buffers; the body is compressed when the request allows it
+
+        compressed is an optional dict (coding -> bytes) kept by the caller
+        next to a cached body, so the same body is only compressed once.
+        """
+        # Convert messagebody to bytes first so Content-Length counts bytes,
+        # which persistent connections rely on to find the next response
         if type(messagebody) is not bytes:
             messagebody = messagebody.encode()
 
-        response = response_headers.encode() + messagebody
-        return response
+        if self.should_compress(kode, messagebody, headers):
+            encoding = self.content_encoding
+            encoded = compressed.get(encoding) if compressed is not None else None
+            if encoded is None:
+                encoded = compress_body(messagebody, encoding, self.compression_level)
+                if compressed is not None:
+                    compressed[encoding] = encoded
+            headers = dict(headers)
+            headers['Content-Encoding'] = encoding
+            headers['Vary'] = 'Accept-Encoding'
+            messagebody = encoded
+
+        return (self.response_headers(kode, message, headers, len(messagebody)), messagebody)
+
+    def should_compress(self, kode, messagebody, headers):
+        if not self.content_encoding or kode != 200 or len(messagebody) < self.compress_min_size:
+            return False
+        if 'Content-Encoding' in headers:
+            return False
+        content_type = headers.get('Content-Type', '')
+        return content_type.startswith(self.compressible_types)
+
+    def request_error_response(self, error):
+        """Answer to a RequestError from the parser; the connection closes after it"""
+        self.keep_alive = False
+        return self.response(error.status, error.message, error.message, {'Content-Type': 'text/plain'})
+
+    def stream_response(self, headers={}):
+        """Headers for an open-ended body (e.g. Server-Sent Events) that ends when the connection closes"""
+        self.keep_alive = False
+        return self.response_headers(200, 'OK', headers)
+
+    def upgrade_response(self, protocol):
+        """101 Switching Protocols: after this the connection no longer speaks HTTP"""
+        self.keep_alive = False
+        resp = "HTTP/1.1 101 Switching Protocols\r\n"
+        resp += "Upgrade: {}\r\n".format(protocol)
+        resp += "Connection: Upgrade\r\n"
+        resp += "\r\n"
+        return resp.encode()
+
+    def response_headers(self, kode, message, headers, content_length=None):
+        parts = [status_line(kode, message), b"Date: ", http_date(), b"\r\n",
+                 self.connection_headers(), SERVER_HEADERS]
+        if content_length is not None:
+            parts.append(b"Content-Length: %d\r\n" % content_length)
+        parts.append(header_block(headers))
+        parts.append(b"\r\n")
+        return b"".join(parts)
+
+    def connection_headers(self):
+        """Connection (and Keep-Alive) header lines, encoded once per setting"""
+        key = (self.keep_alive, self.keep_alive_timeout, self.keep_alive_max)
+        block = self.connection_blocks.get(key)
+        if block is None:
+            if self.keep_alive:
+                block = "Connection: keep-alive\r\nKeep-Alive: timeout={}, max={}\r\n".format(
+                    self.keep_alive_timeout, self.keep_alive_max).encode()
+            else:
+                block = b"Connection: close\r\n"
+            self.connection_blocks[key] = block
+        return block
 
     def proses(self, data):
-        requests = data.split("\r\n")
-        baris = requests[0]
-        all_headers = [n for n in requests[1:] if n != '']
-        
-        # Extract request body for POST requests
-        body = ""
-        if "\r\n\r\n" in data:
-            body_start = data.find("\r\n\r\n") + 4
-            if body_start < len(data):
-                body = data[body_start:]
+        """Serve one request given as text; connections parse theirs with RequestParser"""
+        head, _, body = data.partition("\r\n\r\n")
+        lines = head.split("\r\n")
+        return join_buffers(self.handle_request(HttpRequest(lines[0], [n for n in lines[1:] if n != ''], body)))
+
+    def handle_request(self, request):
+        """Response to a parsed request: bytes or buffers, written with send_buffers"""
+        baris = request.request_line
+        all_headers = request.headers
+        body = request.body
 
         j = baris.split(" ")
+        self.keep_alive = self.allow_keep_alive and self.wants_keep_alive(j, all_headers)
+        self.content_encoding = negotiate_encoding(self.get_header(all_headers, 'Accept-Encoding'))
         try:
             method = j[0].upper().strip()
             if method == 'GET':
@@ -73,10 +518,46 @@ class HttpServer:
         except IndexError:
             return self.response(400, 'Bad Request', '', {})
 
+    def get_header(self, headers, name, default=''):
+        """Value of a request header from the list of "Name: value" lines"""
+        name = name.lower()
+        for header in headers:
+            key, _, value = header.partition(':')
+            if key.strip().lower() == name:
+                return value.strip()
+        return default
+
+    def etag_response(self, etag, messagebody, headers, request_headers, compressed=None):
+        """200 with an ETag, or 304 Not Modified when If-None-Match already has it"""
+        headers = dict(headers)
+        # Each representation has its own tag: "<tag>-gzip" for the gzip body
+        encoded_etag = etag
+        if self.should_compress(200, messagebody, headers):
+            encoded_etag = '{}-{}"'.format(etag[:-1], self.content_encoding)
+            headers['Vary'] = 'Accept-Encoding'
+        headers['ETag'] = encoded_etag
+        if self.none_match_has(request_headers, encoded_etag):
+            return self.response_buffers(304, 'Not Modified', bytes(), headers)
+        return self.response_buffers(200, 'OK', messagebody, headers, compressed)
+
+    def none_match_has(self, request_headers, etag):
+        """True when the request's If-None-Match lists etag (or *)"""
+        if_none_match = self.get_header(request_headers, 'If-None-Match')
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        tags = [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+        return '*' in tags or etag in tags
+
+    def wants_keep_alive(self, request_line, headers):
+        """HTTP/1.1 keeps the connection open unless asked not to, HTTP/1.0 only on request"""
+        version = request_line[2].strip().upper() if len(request_line) > 2 else 'HTTP/1.0'
+        connection = self.get_header(headers, 'Connection').lower()
+        if version == 'HTTP/1.1':
+            return connection != 'close'
+        return connection == 'keep-alive'
+
     def http_get(self, object_address, headers):
-        files = glob('./*')
-        thedir = './'
-        
         if object_address == '/':
             return self.response(200, 'OK', 'Maze Game HTTP Server', dict())
         
@@ -84,30 +565,66 @@ class HttpServer:
             return self.response(200, 'OK', 'Server is running', 
                                {'Content-Type': 'text/plain'})
         
-        object_address = object_address[1:]
-        if thedir + object_address not in files:
+        return self.static_response(object_address, headers)
+
+    def static_response(self, object_address, request_headers):
+        """A file from static_files: 200, 206 for a Range, 304 when the client's copy is current"""
+        entry = self.static_files.lookup(object_address)
+        if entry is None:
             return self.response(404, 'Not Found', '', {})
-            
-        fp = open(thedir + object_address, 'rb')
-        isi = fp.read()
-        fp.close()
-        
-        fext = os.path.splitext(thedir + object_address)[1]
-        content_type = self.types.get(fext, 'application/octet-stream')
-        
-        headers = {'Content-type': content_type}
-        return self.response(200, 'OK', isi, headers)
+
+        fext = os.path.splitext(entry.path)[1]
+        headers = {'Content-Type': self.types.get(fext, 'application/octet-stream'),
+                   'Last-Modified': entry.last_modified,
+                   'Accept-Ranges': 'bytes'}
+
+        byte_range = None
+        range_header = self.get_header(request_headers, 'Range')
+        if range_header and self.get_header(request_headers, 'If-Range', entry.etag) in (entry.etag, entry.last_modified):
+            byte_range = parse_range(range_header, entry.size)
+        if byte_range is not None:
+            first, last = byte_range
+            if first >= entry.size:
+                headers['Content-Range'] = 'bytes */{}'.format(entry.size)
+                return self.response(416, 'Range Not Satisfiable', '', headers)
+            headers['ETag'] = entry.etag
+            headers['Content-Range'] = 'bytes {}-{}/{}'.format(first, last, entry.size)
+            return self.body_response(206, 'Partial Content', entry.body(first, last), headers)
+
+        # If-Modified-Since only counts without If-None-Match (RFC 9110, 13.1.3)
+        if_modified_since = self.get_header(request_headers, 'If-Modified-Since')
+        if if_modified_since and not self.get_header(request_headers, 'If-None-Match'):
+            try:
+                if entry.mtime <= parsedate_to_datetime(if_modified_since).timestamp():
+                    headers['ETag'] = entry.etag
+                    return self.response(304, 'Not Modified', bytes(), headers)
+            except (TypeError, ValueError, IndexError):
+                pass  # Malformed date: send the file
+        if entry.content is not None:
+            return self.etag_response(entry.etag, entry.content, headers, request_headers, entry.compressed)
+        headers['ETag'] = entry.etag
+        if self.none_match_has(request_headers, entry.etag):
+            return self.response(304, 'Not Modified', bytes(), headers)
+        return self.body_response(200, 'OK', entry.body(), headers)
+
+    def body_response(self, kode, message, body, headers):
+        """response_buffers for a body that may be a FileBody (never compressed)"""
+        if isinstance(body, FileBody):
+            return (self.response_headers(kode, message, headers, body.length), body)
+        return (self.response_headers(kode, message, headers, len(body)), body)
 
     def http_post(self, object_address, headers, body):
         headers = {}
         isi = "kosong"
         return self.response(200, 'OK', isi, headers)
 
-    def create_json_response(self, data, status_code=200, status_message='OK'):
-        """Helper method to create JSON responses"""
+    def create_json_response(self, data, status_code=200, status_message=None):
+        """Helper method to create JSON responses; the reason phrase defaults to the standard one for status_code"""
+        if status_message is None:
+            status_message = HTTPStatus(status_code).phrase
         json_data = json.dumps(data)
         headers = {'Content-Type': 'application/json'}
-        return self.response(status_code, status_message, json_data, headers)
+        return self.response_buffers(status_code, status_message, json_data, headers)
 
 if __name__ == "__main__":
     httpserver = HttpServer()
@@ -0,0 +1,175 @@
+import socket
+import struct
+import urllib.parse
+
+# Compact binary framing for the hot messages (moves, position snapshots,
+# collectible pickups). A client opts in per connection with
+#
+#     GET /api/binary?id=<player_id> HTTP/1.1
+#     Connection: Upgrade
+#     Upgrade: maze-binary
+#
+# and after "101 Switching Protocols" both sides exchange the fixed-size,
+# network byte order records below. Players are referred to by the small
+# 'index' from player_info; the JSON API stays available for everything else.
+PROTOCOL = 'maze-binary'
+
+# Client -> server
+MOVE = 0x01                # type, x, y
+SNAPSHOT_REQUEST = 0x02    # type
+
+# Server -> client
+MOVE_RESULT = 0x81         # type, ok, x, y (authoritative position), pickups that follow
+POSITIONS = 0x82           # type, version, count, then count x (index, x, y)
+PICKUP = 0x83              # type, collectible index, player index, new score
+
+MOVE_RECORD = struct.Struct('!Bii')
+SNAPSHOT_REQUEST_RECORD = struct.Struct('!B')
+MOVE_RESULT_RECORD = struct.Struct('!BBiiB')
+POSITIONS_HEADER = struct.Struct('!BIH')
+POSITION_ENTRY = struct.Struct('!Hii')
+PICKUP_RECORD = struct.Struct('!BHHI')
+
+CLIENT_RECORDS = {
+    MOVE: MOVE_RECORD,
+    SNAPSHOT_REQUEST: SNAPSHOT_REQUEST_RECORD,
+}
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_move(x, y):
+    return MOVE_RECORD.pack(MOVE, x, y)
+
+
+def encode_positions(version, positions):
+    """positions: iterable of (player index, x, y)"""
+    positions = list(positions)
+    parts = [POSITIONS_HEADER.pack(POSITIONS, version & 0xFFFFFFFF, len(positions))]
+    parts.extend(POSITION_ENTRY.pack(index, x, y) for index, x, y in positions)
+    return b''.join(parts)
+
+
+class BinarySession:
+    """Server side of one upgraded connection, independent of the socket engine
+
+    feed() takes whatever bytes arrived and returns the reply bytes for every
+    complete record; partial records wait in the buffer for the next call.
+    """
+    def __init__(self, game, player_id):
+        self.game = game
+        self.player_id = player_id
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+        replies = []
+        while self.buffer:
+            record = CLIENT_RECORDS.get(self.buffer[0])
+            if record is None:
+                raise ProtocolError("Unknown record type {}".format(self.buffer[0]))
+            if len(self.buffer) < record.size:
+                break
+            fields = record.unpack_from(self.buffer)
+            del self.buffer[:record.size]
+
+            if fields[0] == MOVE:
+                replies.append(self.handle_move(fields[1], fields[2]))
+            else:
+                replies.append(self.handle_snapshot())
+        return b''.join(replies)
+
+    def handle_move(self, x, y):
+        before = self.collected_by_player()
+        ok = self.game.move_player(self.player_id, x, y)
+        snapshot = self.game.snapshot
+        pos = snapshot.players[self.player_id]
+        picked = sorted(self.collected_by_player() - before)
+        reply = [MOVE_RESULT_RECORD.pack(MOVE_RESULT, 1 if ok else 0, pos['x'], pos['y'], len(picked))]
+        player_index = snapshot.player_info[self.player_id]['index']
+        score = snapshot.player_stats[self.player_id]['score']
+        for index in picked:
+            reply.append(PICKUP_RECORD.pack(PICKUP, index, player_index, score))
+        return b''.join(reply)
+
+    def handle_snapshot(self):
+        snapshot = self.game.snapshot
+        positions = []
+        for player_id, pos in snapshot.players.items():
+            positions.append((snapshot.player_info[player_id]['index'], pos['x'], pos['y']))
+        return encode_positions(snapshot.version, positions)
+
+    def collected_by_player(self):
+        return {index for index, c in enumerate(self.game.snapshot.collectibles)
+                if c['collected_by'] == self.player_id}
+
+
+class BinaryChannel:
+    """Client side: one upgraded connection carrying one player's moves"""
+    def __init__(self, player_id, server_address=('localhost', 55556), room=None):
+        self.player_id = player_id
+        self.server_address = server_address
+        self.room = room
+        self.sock = None
+        self.buffer = b''
+
+    def connect(self):
+        self.sock = socket.create_connection(self.server_address, timeout=5.0)
+        params = {'id': self.player_id}
+        if self.room:
+            params['room'] = self.room
+        request = "GET /api/binary?{} HTTP/1.1\r\n".format(urllib.parse.urlencode(params))
+        request += "Host: {}:{}\r\n".format(*self.server_address)
+        request += "Connection: Upgrade\r\n"
+        request += "Upgrade: {}\r\n".format(PROTOCOL)
+        request += "\r\n"
+        self.sock.sendall(request.encode())
+
+        response = b''
+        while b"\r\n\r\n" not in response:
+            data = self.sock.recv(4096)
+            if not data:
+                break
+            response += data
+        headers, _, self.buffer = response.partition(b"\r\n\r\n")
+        if not headers.startswith(b"HTTP/1.1 101"):
+            self.close()
+            raise ProtocolError("Server refused binary upgrade: {}".format(
+                headers.split(b"\r\n")[0].decode(errors='replace')))
+
+    def close(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def recv_exact(self, size):
+        while len(self.buffer) < size:
+            data = self.sock.recv(4096)
+            if not data:
+                raise ConnectionError("Binary channel closed")
+            self.buffer += data
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+    def move(self, x, y):
+        """Returns (ok, x, y, pickups) with pickups as (collectible index, player index, score)"""
+        if self.sock is None:
+            self.connect()
+        self.sock.sendall(encode_move(x, y))
+        _, ok, x, y, count = MOVE_RESULT_RECORD.unpack(self.recv_exact(MOVE_RESULT_RECORD.size))
+        pickups = [PICKUP_RECORD.unpack(self.recv_exact(PICKUP_RECORD.size))[1:] for _ in range(count)]
+        return bool(ok), x, y, pickups
+
+    def positions(self):
+        """Returns (version, [(player index, x, y), ...])"""
+        if self.sock is None:
+            self.connect()
+        self.sock.sendall(SNAPSHOT_REQUEST_RECORD.pack(SNAPSHOT_REQUEST))
+        _, version, count = POSITIONS_HEADER.unpack(self.recv_exact(POSITIONS_HEADER.size))
+        data = self.recv_exact(POSITION_ENTRY.size * count)
+        return version, [POSITION_ENTRY.unpack_from(data, i * POSITION_ENTRY.size) for i in range(count)]
@@ -2,6 +2,9 @@ import pygame
 import sys
 import io
 import socket
+import threading
+import queue
+import time
 import logging
 import json
 import base64
@@ -9,6 +12,9 @@ import math
 import random
 import string
 import urllib.parse
+from http_client import HttpClientInterface
+from maze_grid import MazeGrid
+import maze_udp
 
 # Initialize Pygame
 pygame.init()
@@ -20,6 +26,13 @@ pygame.display.set_caption("Escape The Maze")
 clock = pygame.time.Clock()
 FPS = 60
 
+# Send the local player's moves as maze-binary records instead of JSON POSTs
+BINARY_MOVES = False
+
+# Send held directions and take positions over UDP when the server offers it
+# (maze_server.py --udp-port); HTTP stays for joining, resets and stats
+UDP_INPUTS = True
+
 # Enhanced Colors
 COLORS = {
     'BLACK': (0, 0, 0),
@@ -83,140 +96,151 @@ class ParticleSystem:
                 pygame.draw.circle(surface, particle['color'][:3], 
                                  (int(particle['x']), int(particle['y'])), size)
 
-class HttpClientInterface:
-    def __init__(self, player_id='1', player_name='Player', server_address=('localhost', 55556)):
-        self.player_id = player_id
-        self.player_name = player_name
-        self.server_address = server_address
-
-    def send_http_request(self, method, path, data=None, params=None):
-        """Send HTTP request to server"""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(5.0)
-        
-        try:
-            sock.connect(self.server_address)
-            
-            # Build URL with parameters
-            url = path
-            if params:
-                query_string = urllib.parse.urlencode(params)
-                url = f"{path}?{query_string}"
-            
-            # Build HTTP request
-            if method == 'GET':
-                request = f"GET {url} HTTP/1.0\r\n"
-                request += f"Host: {self.server_address[0]}:{self.server_address[1]}\r\n"
-                request += "Connection: close\r\n"
-                request += "\r\n"
-            elif method == 'POST':
-                body = ""
-                if data:
-                    body = json.dumps(data)
-                
-                request = f"POST {url} HTTP/1.0\r\n"
-                request += f"Host: {self.server_address[0]}:{self.server_address[1]}\r\n"
-                request += "Content-Type: application/json\r\n"
-                request += f"Content-Length: {len(body)}\r\n"
-                request += "Connection: close\r\n"
-                request += "\r\n"
-                request += body
-            
-            sock.sendall(request.encode())
-            
-            # Receive response
-            response = b""
-            while True:
-                data = sock.recv(1024)
-                if not data:
-                    break
-                response += data
-            
-            # Parse HTTP response
-            response_str = response.decode()
-            if "\r\n\r\n" in response_str:
-                headers, body = response_str.split("\r\n\r\n", 1)
-                
-                # Parse status line
-                status_line = headers.split('\r\n')[0]
-                status_code = int(status_line.split()[1])
-                
-                if body.strip():
-                    try:
-                        result = json.loads(body)
-                        return result
-                    except json.JSONDecodeError:
-                        return {'status': 'ERROR', 'message': 'Invalid JSON response'}
-                else:
-                    return {'status': 'ERROR', 'message': 'Empty response'}
-            else:
-                return {'status': 'ERROR', 'message': 'Invalid HTTP response'}
-                
-        except socket.timeout:
-            return {'status': 'ERROR', 'message': 'Connection timeout'}
-        except ConnectionRefusedError:
-            return {'status': 'ERROR', 'message': 'Server not running'}
-        except Exception as e:
-            return {'status': 'ERROR', 'message': str(e)}
-        finally:
-            sock.close()
-
-    def add_player(self):
-        data = {
-            'player_id': self.player_id,
-            'player_name': self.player_name
-        }
-        return self.send_http_request('POST', '/api/player/add', data)
-
-    def get_players_face(self):
-        params = {'id': self.player_id}
-        result = self.send_http_request('GET', '/api/player/face', params=params)
-        if result['status'] == 'OK':
-            return result['face']
-        return None
-
-    def get_all_players(self):
-        result = self.send_http_request('GET', '/api/players')
-        if result['status'] == 'OK':
-            return result['players']
-        return []
+class GameStateStream(threading.Thread):
+    """Subscribes once to the server's /api/stream and queues pushed events
 
-    def set_location(self, x, y):
-        data = {
-            'player_id': self.player_id,
-            'x': x,
-            'y': y
-        }
-        result = self.send_http_request('POST', '/api/player/move', data)
-        return result['status'] == 'OK'
-
-    def get_location(self, player_id=None):
-        if player_id is None:
-            player_id = self.player_id
-        params = {'id': player_id}
-        result = self.send_http_request('GET', '/api/player/location', params=params)
-        if result['status'] == 'OK':
-            location = result['location'].split(',')
-            return (int(location[0]), int(location[1]))
-        return None
+    The socket is read on this background thread; the game loop drains
+    `events` every frame so all pygame work stays on the main thread.
+    """
+    def __init__(self, server_address, room=None):
+        self.server_address = server_address
+        self.room = room
+        self.events = queue.Queue()
+        self.connected = False
+        self.running = True
+        self.sock = None
+        threading.Thread.__init__(self, daemon=True)
+
+    def stop(self):
+        self.running = False
+        if self.sock:
+            try:
+                # shutdown() also wakes the recv() blocked on the stream thread
+                self.sock.shutdown(socket.SHUT_RDWR)
+                self.sock.close()
+            except OSError:
+                pass
 
-    def get_game_state(self):
-        result = self.send_http_request('GET', '/api/gamestate')
-        if result['status'] == 'OK':
-            return result['game_state']
-        return None
+    def run(self):
+        while self.running:
+            try:
+                self.listen()
+            except OSError as e:
+                logging.warning(f"Game stream disconnected: {e}")
+            self.connected = False
+            if self.running:
+                time.sleep(1)  # Reconnect; the game polls meanwhile
+
+    def listen(self):
+        self.sock = socket.create_connection(self.server_address, timeout=30)
+        query = f"?room={urllib.parse.quote(self.room)}" if self.room else ""
+        request = f"GET /api/stream{query} HTTP/1.1\r\n"
+        request += f"Host: {self.server_address[0]}:{self.server_address[1]}\r\n"
+        request += "Accept: text/event-stream\r\n"
+        request += "\r\n"
+        self.sock.sendall(request.encode())
+
+        buffer = b""
+        while b"\r\n\r\n" not in buffer:
+            data = self.sock.recv(4096)
+            if not data:
+                return
+            buffer += data
+        headers, buffer = buffer.split(b"\r\n\r\n", 1)
+        if b" 200 " not in headers.split(b"\r\n")[0]:
+            return
+        self.connected = True
+
+        event, data_lines = 'message', []
+        while self.running:
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                line = line.decode().rstrip('\r')
+                if line == '':
+                    if data_lines:
+                        self.events.put((event, json.loads('\n'.join(data_lines))))
+                    event, data_lines = 'message', []
+                elif line.startswith('event:'):
+                    event = line[6:].strip()
+                elif line.startswith('data:'):
+                    data_lines.append(line[5:].strip())
+                # Lines starting with ':' are heartbeats
+
+            data = self.sock.recv(4096)
+            if not data:
+                return
+            buffer += data
+
+class InputSender(threading.Thread):
+    """Sends direction changes to /api/player/input on a background thread
+
+    The game loop only calls send(); it never waits for the server. Positions
+    come back through the stream as 'tick' events.
+    """
+    def __init__(self, player_id, player_name, server_address, room=None):
+        self.client = HttpClientInterface(player_id, player_name, server_address, room=room)
+        self.inputs = queue.Queue()
+        self.last_input = (0, 0)
+        threading.Thread.__init__(self, daemon=True)
+
+    def send(self, dx, dy):
+        """Queue a direction if it differs from the last one; the server holds it until the next"""
+        if (dx, dy) != self.last_input:
+            self.last_input = (dx, dy)
+            self.inputs.put((dx, dy))
+
+    def stop(self):
+        self.inputs.put(None)
 
-    def reset_game(self):
-        return self.send_http_request('POST', '/api/game/reset')
+    def run(self):
+        while True:
+            direction = self.inputs.get()
+            if direction is None:
+                break
+            if not self.client.send_input(*direction):
+                logging.warning(f"Input {direction} was not accepted")
+        self.client.close()
+
+class UdpInputSender:
+    """InputSender over the UDP channel: no thread, no waiting, no retries
+
+    A lost datagram is covered by resending the held direction every
+    resend_interval seconds; the server drops the ones that arrive late.
+    Position pushes collect in channel.positions (see Game.apply_udp_positions).
+    A session the server dropped is joined again through rejoin(token).
+    """
+    resend_interval = 0.1
+
+    def __init__(self, token, server_address, rejoin=None):
+        self.channel = maze_udp.UdpChannel(token, server_address, rejoin=rejoin)
+        self.last_input = (0, 0)
+        self.last_send = 0
+
+    def start(self):
+        self.channel.ping()  # Ask for the first position push right away
+
+    def send(self, dx, dy):
+        now = time.time()
+        if (dx, dy) != self.last_input or now - self.last_send > self.resend_interval:
+            self.last_input = (dx, dy)
+            self.last_send = now
+            self.channel.send_input(dx, dy)
+
+    def stop(self):
+        self.channel.close()
+
+    def join(self, timeout=None):
+        pass
 
 class MazeRenderer:
-    def __init__(self, game_state):
-        self.maze = game_state['maze']
-        self.maze_width = game_state['maze_width']
-        self.maze_height = game_state['maze_height']
-        self.cell_size = game_state['cell_size']
-        self.start_pos = game_state['start_pos']
-        self.end_pos = game_state['end_pos']
+    def __init__(self, maze_info, game_state):
+        self.maze_info = maze_info
+        self.maze = MazeGrid.from_maze_info(maze_info)
+        self.maze_width = maze_info['maze_width']
+        self.maze_height = maze_info['maze_height']
+        self.cell_size = maze_info['cell_size']
+        self.start_pos = maze_info['start_pos']
+        self.end_pos = maze_info['end_pos']
         self.collectibles = game_state.get('collectibles', [])
         self.animation_offset = 0
 
@@ -229,7 +253,7 @@ class MazeRenderer:
                 rect = pygame.Rect(x * self.cell_size, y * self.cell_size, 
                                  self.cell_size, self.cell_size)
                 
-                if self.maze[y][x] == 1:  # Wall
+                if self.maze.is_wall(x, y):  # Wall
                     # Gradient effect for walls
                     base_color = COLORS['DARK_GRAY']
                     highlight = tuple(min(255, c + 20) for c in base_color)
@@ -318,16 +342,25 @@ class MazeRenderer:
                 pygame.draw.polygon(surface, COLORS['ORANGE'], star_points, 2)
 
 class Player:
-    def __init__(self, player_id, player_name="Player", is_local=False, server_address=('localhost', 55556)):
+    def __init__(self, player_id, player_name="Player", is_local=False, server_address=('localhost', 55556),
+                 room=None, client=None):
         self.player_id = player_id
         self.player_name = player_name
         self.is_local = is_local
         self.x = 30
         self.y = 30
         self.speed = 5
-        self.client_interface = HttpClientInterface(player_id, player_name, server_address)
+        # Only the local player gets a connection of its own, for its moves;
+        # remote players just fetch their avatar through the game's client
+        if is_local:
+            self.client_interface = HttpClientInterface(player_id, player_name, server_address,
+                                                        use_binary=BINARY_MOVES, room=room)
+        else:
+            self.client_interface = client
         self.trail = []  # For movement trail effect
         self.last_move_time = 0
+        # UDP session offered by the server on join (token, port), None without one
+        self.udp_session = None
         
         # Get player avatar from server
         face_data = None
@@ -336,8 +369,10 @@ class Player:
                 result = self.client_interface.add_player()
                 if result['status'] != 'OK':
                     print(f"Warning: Could not add player to server: {result['message']}")
+                elif result.get('udp_port'):
+                    self.udp_session = (result['token'], result['udp_port'])
             
-            face_data = self.client_interface.get_players_face()
+            face_data = self.client_interface.get_players_face(player_id)
         except Exception as e:
             print(f"Warning: Could not get player avatar: {e}")
         
@@ -367,50 +402,79 @@ class Player:
         return image
 
     def move(self, keys, maze_renderer, particle_system):
-        """Process player movement input"""
-        if not self.is_local:
-            pos = self.client_interface.get_location()
-            if pos:
-                old_x, old_y = self.x, self.y
-                self.x, self.y = pos
-
-                if old_x != self.x or old_y != self.y:
-                    self.add_trail_particle(old_x + 14, old_y + 14, particle_system)
+        """Process the local player's movement input"""
+        dx, dy = self.input_direction(keys)
+        dx *= self.speed
+        dy *= self.speed
+
+        if not dx and not dy:
             return
-        
-        # Handle player movement
-        new_x, new_y = self.x, self.y
-        moved = False
 
-        # Check x-direction (left/right)
-        proposed_x = new_x
+        if self.client_interface.binary_channel:
+            moved = self.move_by_axis(dx, dy, particle_system)
+        else:
+            moved = self.move_batched(dx, dy, particle_system)
+
+        if moved:
+            self.last_move_time = pygame.time.get_ticks()
+
+    @staticmethod
+    def input_direction(keys):
+        """Held arrow/WASD keys as a direction, each axis -1, 0 or 1"""
+        dx = 0
         if keys[pygame.K_LEFT] or keys[pygame.K_a]:
-            proposed_x -= self.speed
+            dx -= 1
         if keys[pygame.K_RIGHT] or keys[pygame.K_d]:
-            proposed_x += self.speed
+            dx += 1
 
-        # Send x movement separately to server to test if it's valid
-        if proposed_x != self.x:
-            if self.client_interface.set_location(proposed_x, self.y):
-                self.add_trail_particle(self.x + 14, self.y + 14, particle_system)
-                self.x = proposed_x
-                moved = True
-
-        # Check y-direction (up/down)
-        proposed_y = new_y
+        dy = 0
         if keys[pygame.K_UP] or keys[pygame.K_w]:
-            proposed_y -= self.speed
+            dy -= 1
         if keys[pygame.K_DOWN] or keys[pygame.K_s]:
-            proposed_y += self.speed
+            dy += 1
+        return dx, dy
 
-        if proposed_y != self.y:
-            if self.client_interface.set_location(self.x, proposed_y):
-                self.add_trail_particle(self.x + 14, self.y + 14, particle_system)
-                self.y = proposed_y
-                moved = True
+    def move_by_axis(self, dx, dy, particle_system):
+        """One absolute move per axis, each validated by the server before the next"""
+        moved = False
 
-        if moved:
-            self.last_move_time = pygame.time.get_ticks()
+        # Send x movement separately to server to test if it's valid
+        if dx and self.client_interface.set_location(self.x + dx, self.y):
+            self.add_trail_particle(self.x + 14, self.y + 14, particle_system)
+            self.x += dx
+            moved = True
+
+        if dy and self.client_interface.set_location(self.x, self.y + dy):
+            self.add_trail_particle(self.x + 14, self.y + 14, particle_system)
+            self.y += dy
+            moved = True
+
+        return moved
+
+    def move_batched(self, dx, dy, particle_system):
+        """Both axis steps in one /api/batch round-trip; the server applies them in order"""
+        moved = []
+
+        def apply(result):
+            if result['status'] == 'OK':
+                self.add_trail_particle(self.x + 14, self.y + 14, particle_system)
+                self.x, self.y = result['x'], result['y']
+                moved.append(True)
+
+        client = self.client_interface
+        client.begin_batch()
+        if dx:
+            client.queue_request('POST', '/api/player/move', {'player_id': self.player_id, 'dx': dx}, callback=apply)
+        if dy:
+            client.queue_request('POST', '/api/player/move', {'player_id': self.player_id, 'dy': dy}, callback=apply)
+        client.flush_batch()
+        return bool(moved)
+
+    def set_position(self, x, y, particle_system):
+        """Apply a server-pushed position"""
+        if (x, y) != (self.x, self.y):
+            self.add_trail_particle(self.x + 14, self.y + 14, particle_system)
+            self.x, self.y = x, y
 
     def add_trail_particle(self, x, y, particle_system):
         """Add trail particle effect"""
@@ -443,11 +507,12 @@ class Game:
     def __init__(self):
         self.player_id = self.generate_unique_id()
         self.player_name = self.input_player_name()
-        self.server_address = self.input_server_address()
+        self.server_address, self.room = self.input_server_address()
 
         self.current_player = None
         self.other_players = {}
         self.maze_renderer = None
+        self.maze_info = None
         self.winner = None
         self.game_state = None
         self.particle_system = ParticleSystem()
@@ -458,6 +523,14 @@ class Game:
         self.font_tiny = pygame.font.Font(None, 18)
 
         self.connection_error = None
+        self.client = HttpClientInterface(self.player_id, self.player_name, self.server_address, room=self.room)
+        self.stream = GameStateStream(self.server_address, self.room)
+        # Set when the server runs its own movement ticks, see initialize_game
+        self.input_sender = None
+        # Game version of the newest UDP position push applied; older pushed
+        # positions (stream events included) must not move players back
+        self.udp_version = -1
+        self.round_clock_start = time.time()
         self.ui_animations = {'score_pulse': 0, 'winner_glow': 0}
 
         if not self.initialize_game():
@@ -519,7 +592,7 @@ class Game:
         text = 'localhost:55556'
 
         instructions = font.render("Enter game room", True, COLORS['WHITE'])
-        instructions2 = pygame.font.Font(None, 24).render("Press Enter for default (localhost:55556)", True, COLORS['TEXT_SECONDARY'])
+        instructions2 = pygame.font.Font(None, 24).render("Press Enter for default (localhost:55556), add /name for a room", True, COLORS['TEXT_SECONDARY'])
         running = True
 
         while running:
@@ -534,13 +607,16 @@ class Game:
                 elif event.type == pygame.KEYDOWN:
                     if active:
                         if event.key == pygame.K_RETURN:
-                            if ':' in text:
-                                host, port = text.split(':', 1)
+                            # host:port/room, the room part is optional
+                            address, _, room = text.partition('/')
+                            room = room.strip() or None
+                            if ':' in address:
+                                host, port = address.split(':', 1)
                                 try:
-                                    return (host.strip(), int(port.strip()))
+                                    return (host.strip(), int(port.strip())), room
                                 except ValueError:
                                     pass
-                            return ('localhost', 55556)
+                            return ('localhost', 55556), room
                         elif event.key == pygame.K_BACKSPACE:
                             text = text[:-1]
                         elif len(text) < 50:
@@ -564,12 +640,33 @@ class Game:
     def initialize_game(self):
         """Initialize game with enhanced error handling"""
         try:
-            self.current_player = Player(self.player_id, self.player_name, is_local=True, server_address=self.server_address)
+            if self.room:
+                result = self.client.create_room()
+                if result['status'] != 'OK':
+                    self.connection_error = f"Could not join room {self.room}: {result['message']}"
+                    return False
+
+            self.current_player = Player(self.player_id, self.player_name, is_local=True,
+                                         server_address=self.server_address, room=self.room)
             
             if not self.update_game_state():
                 self.connection_error = "Failed to get game state from server"
                 return False
 
+            # Push channel: while it is connected the game stops polling
+            self.stream.start()
+
+            # A ticking server moves players itself: send held directions and
+            # take positions from the stream instead of proposing each step
+            if self.client.get_tick_rate():
+                udp_session = self.current_player.udp_session
+                if UDP_INPUTS and udp_session:
+                    token, udp_port = udp_session
+                    self.input_sender = UdpInputSender(token, (self.server_address[0], udp_port),
+                                                       rejoin=self.client.add_player)
+                else:
+                    self.input_sender = InputSender(self.player_id, self.player_name, self.server_address, self.room)
+                self.input_sender.start()
             return True
             
         except Exception as e:
@@ -579,10 +676,23 @@ class Game:
     def update_game_state(self):
         """Update game state with enhanced data"""
         try:
-            client = HttpClientInterface(self.player_id, self.player_name, self.server_address)
-            self.game_state = client.get_game_state()
-            if not self.game_state:
+            since = self.game_state.get('version') if self.game_state else None
+            game_state = self.client.get_game_state(since)
+            if not game_state:
                 return False
+            if game_state.get('delta'):
+                return self.apply_game_state_delta(game_state)
+            return self.apply_game_state(game_state)
+            
+        except Exception as e:
+            logging.warning(f"Failed to update game state: {e}")
+            return False
+
+    def apply_game_state(self, game_state):
+        """Replace the local view with a full game state snapshot"""
+        try:
+            self.game_state = game_state
+            self.round_clock_start = time.time() - game_state.get('game_time', 0)
 
             # Check if the game was reset
             previous_round = getattr(self, 'current_round', 0)
@@ -590,16 +700,25 @@ class Game:
             game_was_reset = current_round > previous_round
             self.current_round = current_round
 
-            self.maze_renderer = MazeRenderer(self.game_state)
+            # The maze only changes between rounds, fetch it when the round does
+            if not self.maze_info or self.maze_info['round_number'] != current_round:
+                maze_info = self.client.get_maze()
+                if not maze_info:
+                    return False
+                self.maze_info = maze_info
+
+            # Collectible flags from the state plus their layout from the maze
+            for flags, layout in zip(self.game_state['collectibles'], self.maze_info['collectibles']):
+                flags.update(layout)
+
+            if self.maze_renderer and self.maze_renderer.maze_info is self.maze_info:
+                # Same round: keep the renderer and its decoded maze
+                self.maze_renderer.collectibles = self.game_state.get('collectibles', [])
+            else:
+                self.maze_renderer = MazeRenderer(self.maze_info, self.game_state)
             
             # Update other players with enhanced info
-            all_players = client.get_all_players()
-            if all_players:
-                for player_id in all_players:
-                    if player_id != self.player_id and player_id not in self.other_players:
-                        player_info = self.game_state.get('player_info', {}).get(player_id, {})
-                        player_name = player_info.get('name', f'Player {player_id}')
-                        self.other_players[player_id] = Player(player_id, player_name, is_local=False, server_address=self.server_address)
+            self.add_new_players()
             
             # If game was reset, sync player positions
             if game_was_reset and self.maze_renderer:
@@ -611,9 +730,9 @@ class Game:
                     self.current_player.y = start_y
                 
                 for player_id, player in self.other_players.items():
-                    server_pos = player.client_interface.get_location(player_id)
+                    server_pos = self.game_state['players'].get(player_id)
                     if server_pos:
-                        player.x, player.y = server_pos
+                        player.x, player.y = server_pos['x'], server_pos['y']
                     else:
                         player.x, player.y = start_x, start_y
             
@@ -621,9 +740,121 @@ class Game:
             return True
             
         except Exception as e:
-            logging.warning(f"Failed to update game state: {e}")
+            logging.warning(f"Failed to apply game state: {e}")
+            return False
+
+    def add_new_players(self):
+        for player_id in list(self.game_state.get('players', {}).keys()):
+            if player_id != self.player_id and player_id not in self.other_players:
+                player_info = self.game_state.get('player_info', {}).get(player_id, {})
+                player_name = player_info.get('name', f'Player {player_id}')
+                self.other_players[player_id] = Player(player_id, player_name, is_local=False,
+                                                       server_address=self.server_address, room=self.room,
+                                                       client=self.client)
+
+    def apply_game_state_delta(self, delta):
+        """Merge the changes returned by /api/gamestate?since=<version>"""
+        try:
+            self.game_state['players'].update(delta['players'])
+            self.game_state['player_info'].update(delta['player_info'])
+            self.game_state['player_stats'].update(delta['player_stats'])
+            for index, collectible in delta['collectibles'].items():
+                self.game_state['collectibles'][int(index)].update(collectible)
+            for key in ('winner', 'round_number', 'game_time', 'version'):
+                self.game_state[key] = delta[key]
+            self.round_clock_start = time.time() - delta['game_time']
+            self.winner = delta['winner']
+
+            self.add_new_players()
+            for player_id, pos in delta['players'].items():
+                if player_id in self.other_players:
+                    self.other_players[player_id].set_position(pos['x'], pos['y'], self.particle_system)
+            return True
+
+        except Exception as e:
+            logging.warning(f"Failed to apply game state delta: {e}")
             return False
 
+    def poll_other_players(self):
+        """Fallback while the stream is down: every remote position in one batch request"""
+        def apply(player, result):
+            if result['status'] == 'OK':
+                x, y = result['location'].split(',')
+                player.set_position(int(x), int(y), self.particle_system)
+
+        self.client.begin_batch()
+        for player_id, player in self.other_players.items():
+            self.client.queue_request('GET', '/api/player/location', params={'id': player_id},
+                                      callback=lambda result, player=player: apply(player, result))
+        self.client.flush_batch()
+
+    def apply_udp_positions(self):
+        """Apply the newest position push received on the UDP channel"""
+        channel = self.input_sender.channel
+        if not channel.poll() or not self.game_state or channel.positions_version <= self.udp_version:
+            return
+        self.udp_version = channel.positions_version
+        by_index = {info['index']: player_id for player_id, info in self.game_state['player_info'].items()}
+        for index, (x, y) in channel.positions.items():
+            player_id = by_index.get(index)
+            if player_id is None:
+                continue  # Joined after our last state, the 'join' event fetches it
+            self.game_state['players'][player_id] = {'x': x, 'y': y}
+            if player_id == self.player_id and self.current_player:
+                self.current_player.set_position(x, y, self.particle_system)
+            elif player_id in self.other_players:
+                self.other_players[player_id].set_position(x, y, self.particle_system)
+
+    def apply_stream_events(self):
+        """Apply every event pushed by the server since the last frame"""
+        while True:
+            try:
+                event, data = self.stream.events.get_nowait()
+            except queue.Empty:
+                return
+
+            if (event != 'state' and self.game_state and
+                    data['version'] <= self.game_state.get('version', 0)):
+                continue  # Already included in a state fetched since
+
+            if event == 'state':
+                self.apply_game_state(data)
+            elif event in ('join', 'reset'):
+                # Rare events that change players or the maze: fetch the changes
+                # once (a reset makes the server answer with a full state)
+                self.update_game_state()
+                continue
+            elif not self.game_state:
+                continue
+            elif event == 'move':
+                player_id = data['player_id']
+                if player_id in self.game_state['player_stats']:
+                    self.game_state['player_stats'][player_id]['total_moves'] = data['total_moves']
+                if data['version'] > self.udp_version:  # Else UDP already brought a newer position
+                    self.game_state['players'][player_id] = {'x': data['x'], 'y': data['y']}
+                    if player_id in self.other_players:
+                        self.other_players[player_id].set_position(data['x'], data['y'], self.particle_system)
+            elif event == 'tick':
+                for player_id, (x, y, total_moves) in data['positions'].items():
+                    if player_id in self.game_state['player_stats']:
+                        self.game_state['player_stats'][player_id]['total_moves'] = total_moves
+                    if data['version'] <= self.udp_version:
+                        continue
+                    self.game_state['players'][player_id] = {'x': x, 'y': y}
+                    if player_id == self.player_id and self.current_player:
+                        self.current_player.set_position(x, y, self.particle_system)
+                    elif player_id in self.other_players:
+                        self.other_players[player_id].set_position(x, y, self.particle_system)
+            elif event == 'collect':
+                # The renderer shares this list, so the item disappears immediately
+                self.game_state['collectibles'][data['index']]['collected'] = True
+                self.game_state['player_stats'][data['player_id']] = data['stats']
+            elif event == 'winner':
+                self.winner = data['player_id']
+                self.game_state['winner'] = data['player_id']
+                self.game_state['player_stats'][data['player_id']] = data['stats']
+            self.game_state['version'] = data['version']
+
     def draw_enhanced_ui(self, surface):
         """Draw enhanced UI with animations and better layout"""
         self.ui_animations['score_pulse'] += 0.1
@@ -649,7 +880,8 @@ class Game:
         # Game info
         if self.game_state:
             round_text = self.font_medium.render(f"Round: {self.game_state.get('round_number', 1)}", True, COLORS['INFO'])
-            time_text = self.font_medium.render(f"Time: {self.game_state.get('game_time', 0)}s", True, COLORS['INFO'])
+            game_time = int(time.time() - self.round_clock_start)
+            time_text = self.font_medium.render(f"Time: {game_time}s", True, COLORS['INFO'])
             surface.blit(round_text, (WIDTH - 340, y_offset))
             surface.blit(time_text, (WIDTH - 340, y_offset + 30))
             y_offset += 80
@@ -755,8 +987,7 @@ class Game:
 
     def handle_reset(self):
         """Reset game with visual feedback"""
-        client = HttpClientInterface(self.player_id, self.player_name, self.server_address)
-        result = client.reset_game()
+        result = self.client.reset_game()
         if result['status'] == 'OK':
             self.winner = None
             self.update_game_state()
@@ -770,9 +1001,9 @@ class Game:
 
                 # Syncs other players
                 for player_id, player in self.other_players.items():
-                    server_pos = player.client_interface.get_location(player_id)
+                    server_pos = self.game_state['players'].get(player_id)
                     if server_pos:
-                        player.x, player.y = server_pos
+                        player.x, player.y = server_pos['x'], server_pos['y']
                     else:
                         player.x, player.y = start_x, start_y
 
@@ -813,19 +1044,31 @@ class Game:
 
             keys = pygame.key.get_pressed()
 
-            # Update game state
-            if current_time - last_update > 1000:
+            # Update game state: pushed events while the stream is up,
+            # polling only as a fallback while it is down
+            self.apply_stream_events()
+            if isinstance(self.input_sender, UdpInputSender):
+                self.apply_udp_positions()
+            if not self.stream.connected and current_time - last_update > 1000:
                 self.update_game_state()
                 last_update = current_time
 
             # Update particles
             self.particle_system.update()
 
-            # Move players
+            # Move players: held directions while the server ticks and the
+            # stream delivers the results, validated steps otherwise
             if self.maze_renderer and self.current_player and not self.winner:
-                self.current_player.move(keys, self.maze_renderer, self.particle_system)
-                for player in self.other_players.values():
-                    player.move(keys, self.maze_renderer, self.particle_system)
+                if self.input_sender and self.stream.connected:
+                    self.input_sender.send(*self.current_player.input_direction(keys))
+                else:
+                    if self.input_sender:
+                        self.input_sender.send(0, 0)
+                    self.current_player.move(keys, self.maze_renderer, self.particle_system)
+                if not self.stream.connected:
+                    self.poll_other_players()
+            elif self.input_sender:
+                self.input_sender.send(0, 0)
 
             # Draw everything
             screen.fill(COLORS['BACKGROUND'])
@@ -847,6 +1090,12 @@ class Game:
             pygame.display.flip()
             clock.tick(FPS)
 
+        self.stream.stop()
+        if self.input_sender:
+            self.input_sender.send(0, 0)  # Don't leave the player walking
+            self.input_sender.stop()
+            self.input_sender.join(1)
+        self.client.close()
         pygame.quit()
         sys.exit()
 
@@ -1,19 +1,42 @@
 import base64
+import functools
 import random
+import secrets
 import time
+import threading
+from collections import deque, namedtuple
 from io import BytesIO
 import logging
 from PIL import Image, ImageDraw, ImageFont
 
+from maze_grid import ENCODING, MazeGrid
+from maze_metrics import timed
+
 # Configure logging
 logging.basicConfig(level=logging.WARNING)
 
+def locked(method):
+    """Run a MazeGame method while holding its writer lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+# Immutable view of a game, published by every change (see MazeGame.publish).
+# The dicts and tuples it holds are never modified after publication, so any
+# number of readers can use a snapshot without locking; unchanged parts are
+# shared between consecutive snapshots (copy-on-write).
+GameSnapshot = namedtuple('GameSnapshot', [
+    'version', 'base_version', 'players', 'player_info', 'player_stats',
+    'collectibles', 'winner', 'round_number', 'game_start_time', 'maze_info'])
+
 class MazeGame:
-    def __init__(self):
-        # Maze dimensions (must be odd numbers for proper maze generation)
-        self.maze_width = 21
-        self.maze_height = 15
-        self.cell_size = 30
+    def __init__(self, width=21, height=15, cell_size=30):
+        # Maze dimensions in cells (odd, see check_dimensions) and pixels per cell
+        self.maze_width, self.maze_height, self.cell_size = self.check_dimensions(width, height, cell_size)
+        # Half the player's 28 px box, smaller in cells too narrow for it
+        self.player_radius = min(14, (self.cell_size - 1) // 2)
         
         # Game state
         self.players = {}
@@ -24,6 +47,39 @@ class MazeGame:
         self.game_start_time = time.time()
         self.round_number = 1
         
+        # Callbacks notified of every state change, see add_listener
+        self.listeners = []
+        
+        # State version, bumped on every change. The change log lets
+        # get_game_state_delta() answer "what changed since version N"; a
+        # client older than the log or than the last reset gets a full state.
+        # One (version, event, player ids, collectible index) entry per version
+        self.version = 0
+        self.base_version = 0
+        self.max_change_log = 1024
+        self.changes = deque(maxlen=self.max_change_log)
+        
+        # Encoded representations filled by the server: maze and avatars
+        # (cleared on reset) and the current gamestate (dropped on any change)
+        self.cache = {}
+        self.cache_lock = threading.Lock()
+        
+        # Held by every method that changes the game (add_player, move_player,
+        # tick, reset_game); readers use self.snapshot instead. Reentrant
+        # because moves notify and tick moves
+        self.lock = threading.RLock()
+        
+        # Server-side movement, advanced by tick(): queued directional inputs
+        # per player, the direction each player is currently holding, and how
+        # far a held direction moves a player (same pace as the 60 fps client)
+        self.max_queued_inputs = 8
+        self.player_inputs = {}
+        self.held_inputs = {}
+        self.player_speed = 5
+        self.steps_per_second = 60
+        self.step_accumulator = 0.0
+        self.tick_number = 0
+        
         # Generate maze
         self.maze = self.generate_maze()
         self.start_pos = (1, 1)  # Top-left corner
@@ -41,52 +97,35 @@ class MazeGame:
         
         # Power-ups and collectibles
         self.collectibles = self.generate_collectibles()
+        
+        self.snapshot = self.build_snapshot()
+
+    @staticmethod
+    def check_dimensions(width=21, height=15, cell_size=30):
+        """(width, height, cell_size) as ints; ValueError unless a maze can be built with them"""
+        width, height, cell_size = int(width), int(height), int(cell_size)
+        if width < 5 or height < 5 or width % 2 == 0 or height % 2 == 0:
+            raise ValueError("Maze width and height must be odd numbers of at least 5")
+        if cell_size < 4:
+            raise ValueError("Cell size must be at least 4 pixels")
+        return width, height, cell_size
 
     def generate_maze(self):
-        """Generate a random maze using recursive backtracking"""
-        # Initialize maze with all walls
-        maze = [[1 for _ in range(self.maze_width)] for _ in range(self.maze_height)]
-        
-        def carve_path(x, y):
-            maze[y][x] = 0  # Mark as path
-            
-            # Randomize directions
-            directions = [(0, 2), (2, 0), (0, -2), (-2, 0)]
-            random.shuffle(directions)
-            
-            for dx, dy in directions:
-                nx, ny = x + dx, y + dy
-                if (0 < nx < self.maze_width-1 and 0 < ny < self.maze_height-1 and 
-                    maze[ny][nx] == 1):
-                    # Carve wall between current and next cell
-                    maze[y + dy//2][x + dx//2] = 0
-                    carve_path(nx, ny)
-        
-        # Start carving from (1,1)
-        carve_path(1, 1)
+        """Generate a random maze (depth-first backtracking, see MazeGrid.generate)"""
+        maze = MazeGrid.generate(self.maze_width, self.maze_height)
         
         # Ensure start and end are clear
-        maze[1][1] = 0
-        maze[self.maze_height-2][self.maze_width-2] = 0
+        maze.set_open(1, 1)
+        maze.set_open(self.maze_width-2, self.maze_height-2)
         
         return maze
 
     def generate_collectibles(self):
         """Generate collectible items in the maze"""
         collectibles = []
-        empty_cells = []
-        
-        # Find all empty cells except start and end
-        for y in range(self.maze_height):
-            for x in range(self.maze_width):
-                if (self.maze[y][x] == 0 and 
-                    (x, y) != self.start_pos and 
-                    (x, y) != self.end_pos):
-                    empty_cells.append((x, y))
         
-        # Place 5-8 collectibles randomly
-        num_collectibles = min(random.randint(5, 8), len(empty_cells))
-        selected_cells = random.sample(empty_cells, num_collectibles)
+        # Place 5-8 collectibles randomly on empty cells except start and end
+        selected_cells = self.maze.random_open_cells(random.randint(5, 8), exclude=(self.start_pos, self.end_pos))
         
         for x, y in selected_cells:
             collectible_type = random.choice(['coin', 'gem', 'star'])
@@ -100,30 +139,39 @@ class MazeGame:
         
         return collectibles
 
+    @timed('add_player')
+    @locked
     def add_player(self, player_id, player_name="Unknown"):
-        """Add a new player to the game"""
-        if player_id not in self.players:
-            color_index = len(self.players) % len(self.player_colors)
-            self.players[player_id] = {
-                'name': player_name,
-                'color': self.player_colors[color_index],
-                'avatar': self.generate_player_avatar(self.player_colors[color_index], player_name)
-            }
-            # Place player at start position
-            self.player_positions[player_id] = {
-                'x': self.start_pos[0] * self.cell_size,
-                'y': self.start_pos[1] * self.cell_size
-            }
-            # Initialize player stats
-            self.player_stats[player_id] = {
-                'score': 0,
-                'wins': 0,
-                'games_played': 0,
-                'collectibles_collected': 0,
-                'total_moves': 0,
-                'join_time': time.time()
-            }
-            logging.warning(f"Player {player_id} ({player_name}) added to game")
+        """Add a new player to the game, False if player_id is already playing"""
+        if player_id in self.players:
+            return False
+        color_index = len(self.players) % len(self.player_colors)
+        self.players[player_id] = {
+            'index': len(self.players),  # Small stable id for binary records
+            'name': player_name,
+            'color': self.player_colors[color_index],
+            'avatar': self.generate_player_avatar(self.player_colors[color_index], player_name),
+            # Authenticates the player's datagrams on the UDP channel (maze_udp.py)
+            'token': secrets.token_hex(8)
+        }
+        # Place player at start position
+        self.player_positions[player_id] = {
+            'x': self.start_pos[0] * self.cell_size,
+            'y': self.start_pos[1] * self.cell_size
+        }
+        self.player_inputs[player_id] = deque(maxlen=self.max_queued_inputs)
+        # Initialize player stats
+        self.player_stats[player_id] = {
+            'score': 0,
+            'wins': 0,
+            'games_played': 0,
+            'collectibles_collected': 0,
+            'total_moves': 0,
+            'join_time': time.time()
+        }
+        logging.warning(f"Player {player_id} ({player_name}) added to game")
+        self.notify('join', {'player_id': player_id, 'name': player_name})
+        return True
 
     def generate_player_avatar(self, color, name):
         """Generate a more attractive avatar for the player"""
@@ -176,40 +224,22 @@ class MazeGame:
         return img_str
 
     def is_valid_position(self, x, y):
-        """Check if the player's full bounding circle is within valid maze paths"""
-        # Radius player circle of 14 pixels (from player image size 28x28)
-        radius = 14
-
-        # 9 points: center + 4 sides + 4 corners
-        edge_points = [
-            (x + radius, y + radius),              # Center
-            (x, y + radius),                       # Left
-            (x + 2 * radius, y + radius),          # Right
-            (x + radius, y),                       # Top
-            (x + radius, y + 2 * radius),          # Bottom
-            (x, y),                                # Top-left corner
-            (x + 2 * radius, y),                   # Top-right corner
-            (x, y + 2 * radius),                   # Bottom-left corner
-            (x + 2 * radius, y + 2 * radius),      # Bottom-right corner
-        ]
-
-        for px, py in edge_points:
-            maze_x = px // self.cell_size
-            maze_y = py // self.cell_size
-
-            # Check bounds
-            if (maze_x < 0 or maze_x >= self.maze_width or 
-                maze_y < 0 or maze_y >= self.maze_height):
-                return False
-
-            # Check wall
-            if self.maze[maze_y][maze_x] != 0:
-                return False
+        """Check if the player's full bounding box is within valid maze paths"""
+        # The box spans 2 * player_radius + 1 pixels, less than a cell, so it
+        # touches at most two columns and two rows of cells
+        size = 2 * self.player_radius
+        cell_size = self.cell_size
+        return self.maze.area_open(x // cell_size, y // cell_size,
+                                   (x + size) // cell_size, (y + size) // cell_size)
 
-        return True
+    @timed('move_player')
+    @locked
+    def move_player(self, player_id, new_x, new_y, notify_move=True):
+        """Move player if the new position is valid
 
-    def move_player(self, player_id, new_x, new_y):
-        """Move player if the new position is valid"""
+        tick() passes notify_move=False and reports all of a tick's moves as
+        one 'tick' event instead.
+        """
         if player_id not in self.player_positions:
             return False
             
@@ -223,6 +253,13 @@ class MazeGame:
             # Count moves
             if old_x != new_x or old_y != new_y:
                 self.player_stats[player_id]['total_moves'] += 1
+                if notify_move:
+                    self.notify('move', {
+                        'player_id': player_id,
+                        'x': new_x,
+                        'y': new_y,
+                        'total_moves': self.player_stats[player_id]['total_moves']
+                    })
             
             # Check for collectibles
             self.check_collectibles(player_id, new_x, new_y)
@@ -235,16 +272,70 @@ class MazeGame:
                 self.player_stats[player_id]['wins'] += 1
                 self.player_stats[player_id]['score'] += 100  # Bonus for winning
                 logging.warning(f"Player {player_id} won the game!")
+                self.notify('winner', {'player_id': player_id, 'stats': self.player_stats[player_id]})
             
             return True
         return False
 
+    @locked
+    def move_player_by(self, player_id, dx, dy):
+        """Move player by a step from its current position, atomically with respect to other moves"""
+        if player_id not in self.player_positions:
+            return False
+        pos = self.player_positions[player_id]
+        return self.move_player(player_id, pos['x'] + dx, pos['y'] + dy)
+
+    def queue_input(self, player_id, dx, dy):
+        """Queue a direction (each axis -1, 0 or 1) for the next ticks; (0, 0) stops the player"""
+        if player_id not in self.player_inputs:
+            return False
+        dx = max(-1, min(1, int(dx)))
+        dy = max(-1, min(1, int(dy)))
+        self.player_inputs[player_id].append((dx, dy))
+        return True
+
+    @locked
+    def tick(self, dt):
+        """Advance the simulation by dt seconds
+
+        Every player takes the next queued input (one per tick, so short taps
+        are not lost) as its held direction and moves player_speed pixels per
+        step, x then y, through move_player so walls, collectibles and the
+        win check behave exactly as for direct moves. All position changes
+        are published as one 'tick' event.
+        """
+        self.step_accumulator += dt * self.steps_per_second
+        steps = int(self.step_accumulator)
+        self.step_accumulator -= steps
+        self.tick_number += 1
+
+        moved = {}
+        for player_id, queued in list(self.player_inputs.items()):
+            if queued:
+                self.held_inputs[player_id] = queued.popleft()
+            dx, dy = self.held_inputs.get(player_id, (0, 0))
+            if not (dx or dy) or self.winner:
+                continue
+
+            pos = self.player_positions[player_id]
+            start = (pos['x'], pos['y'])
+            for _ in range(steps):
+                if dx:
+                    self.move_player(player_id, pos['x'] + dx * self.player_speed, pos['y'], notify_move=False)
+                if dy:
+                    self.move_player(player_id, pos['x'], pos['y'] + dy * self.player_speed, notify_move=False)
+            if (pos['x'], pos['y']) != start:
+                moved[player_id] = [pos['x'], pos['y'], self.player_stats[player_id]['total_moves']]
+
+        if moved:
+            self.notify('tick', {'tick': self.tick_number, 'positions': moved})
+
     def check_collectibles(self, player_id, x, y):
         """Check if player collected any items"""
         maze_x = x // self.cell_size
         maze_y = y // self.cell_size
         
-        for collectible in self.collectibles:
+        for index, collectible in enumerate(self.collectibles):
             if (not collectible['collected'] and 
                 collectible['x'] == maze_x and 
                 collectible['y'] == maze_y):
@@ -252,25 +343,157 @@ class MazeGame:
                 collectible['collected_by'] = player_id
                 self.player_stats[player_id]['score'] += collectible['value']
                 self.player_stats[player_id]['collectibles_collected'] += 1
+                self.notify('collect', {
+                    'index': index,
+                    'player_id': player_id,
+                    'stats': self.player_stats[player_id]
+                })
 
-    def get_game_state(self):
-        """Get current game state for clients"""
+    def build_maze_info(self):
+        """Static data for the current round: maze layout and where collectibles lie"""
         return {
-            'maze': self.maze,
+            'maze': self.maze.encode(),
+            'maze_encoding': ENCODING,
             'maze_width': self.maze_width,
             'maze_height': self.maze_height,
             'cell_size': self.cell_size,
-            'players': self.player_positions,
-            'player_info': self.players,
-            'player_stats': self.player_stats,
-            'collectibles': self.collectibles,
             'start_pos': self.start_pos,
             'end_pos': self.end_pos,
-            'winner': self.winner,
-            'round_number': self.round_number,
-            'game_time': int(time.time() - self.game_start_time)
+            'collectibles': [
+                {'x': c['x'], 'y': c['y'], 'type': c['type'], 'value': c['value']}
+                for c in self.collectibles
+            ],
+            'round_number': self.round_number
+        }
+
+    def build_player_info(self, player_id):
+        info = self.players[player_id]
+        return {'name': info['name'], 'color': info['color'], 'index': info['index']}
+
+    @staticmethod
+    def get_collectible_flags(collectible):
+        return {'collected': collectible['collected'], 'collected_by': collectible.get('collected_by')}
+
+    def build_snapshot(self):
+        """Full snapshot of the live state; only called with the lock held (or before sharing)"""
+        return GameSnapshot(
+            version=self.version,
+            base_version=self.base_version,
+            players={pid: dict(pos) for pid, pos in self.player_positions.items()},
+            player_info={pid: self.build_player_info(pid) for pid in self.players},
+            player_stats={pid: dict(stats) for pid, stats in self.player_stats.items()},
+            collectibles=tuple(self.get_collectible_flags(c) for c in self.collectibles),
+            winner=self.winner,
+            round_number=self.round_number,
+            game_start_time=self.game_start_time,
+            maze_info=self.build_maze_info()
+        )
+
+    def publish(self, event, data):
+        """Replace self.snapshot after a change, copying only what the event touched"""
+        if event == 'reset':
+            self.snapshot = self.build_snapshot()
+            return
+
+        old = self.snapshot
+        if event == 'tick':
+            changed = list(data['positions'])
+        elif data.get('player_id') is not None:
+            changed = [data['player_id']]
+        else:
+            changed = []
+        players = dict(old.players)
+        player_stats = dict(old.player_stats)
+        for player_id in changed:
+            players[player_id] = dict(self.player_positions[player_id])
+            player_stats[player_id] = dict(self.player_stats[player_id])
+
+        player_info = old.player_info
+        if event == 'join':
+            player_info = dict(player_info)
+            player_info[data['player_id']] = self.build_player_info(data['player_id'])
+
+        collectibles = old.collectibles
+        if data.get('index') is not None:
+            collectibles = list(collectibles)
+            collectibles[data['index']] = self.get_collectible_flags(self.collectibles[data['index']])
+            collectibles = tuple(collectibles)
+
+        self.snapshot = old._replace(version=self.version, players=players, player_info=player_info,
+                                     player_stats=player_stats, collectibles=collectibles, winner=self.winner)
+
+    # Readers: lock-free, everything comes from one snapshot
+
+    def get_maze_info(self):
+        return self.snapshot.maze_info
+
+    def get_player_info(self, player_id):
+        """Player name, color and index; the avatar is served separately as /api/player/face"""
+        return self.snapshot.player_info[player_id]
+
+    def get_player_ids(self):
+        return list(self.snapshot.player_info)
+
+    def get_session_token(self, player_id):
+        """Hex session token of a player, None for an unknown player"""
+        info = self.players.get(player_id)
+        return info['token'] if info else None
+
+    def get_player_position(self, player_id):
+        """{'x': ..., 'y': ...} or None for an unknown player"""
+        return self.snapshot.players.get(player_id)
+
+    @timed('get_game_state')
+    def get_game_state(self):
+        """Get current game state for clients (dynamic part only, see get_maze_info)"""
+        snapshot = self.snapshot
+        return {
+            'players': snapshot.players,
+            'player_info': snapshot.player_info,
+            'player_stats': snapshot.player_stats,
+            'collectibles': snapshot.collectibles,
+            'winner': snapshot.winner,
+            'round_number': snapshot.round_number,
+            'game_time': int(time.time() - snapshot.game_start_time),
+            'version': snapshot.version
+        }
+
+    def get_game_state_delta(self, since):
+        """Only what changed after version `since`, or the full state if that is no longer known"""
+        snapshot = self.snapshot
+        # Entries newer than the snapshot are left for the next poll
+        changes = [change for change in list(self.changes) if change[0] <= snapshot.version]
+        if (since < snapshot.base_version or since > snapshot.version or
+                (changes and since < changes[0][0] - 1)):
+            return self.get_game_state()
+
+        changed_players = set()
+        joined_players = set()
+        changed_collectibles = set()
+        for version, event, player_ids, index in reversed(changes):
+            if version <= since:
+                break
+            changed_players.update(player_ids)
+            if event == 'join':
+                joined_players.update(player_ids)
+            if index is not None:
+                changed_collectibles.add(index)
+
+        return {
+            'delta': True,
+            'since': since,
+            'version': snapshot.version,
+            'players': {pid: snapshot.players[pid] for pid in changed_players},
+            'player_info': {pid: snapshot.player_info[pid] for pid in joined_players},
+            'player_stats': {pid: snapshot.player_stats[pid] for pid in changed_players},
+            'collectibles': {index: snapshot.collectibles[index] for index in changed_collectibles},
+            'winner': snapshot.winner,
+            'round_number': snapshot.round_number,
+            'game_time': int(time.time() - snapshot.game_start_time)
         }
 
+    @timed('reset_game')
+    @locked
     def reset_game(self):
         """Reset game for a new round"""
         self.winner = None
@@ -278,11 +501,94 @@ class MazeGame:
         self.collectibles = self.generate_collectibles()
         self.game_start_time = time.time()
         self.round_number += 1
+        self.cache.clear()
         
-        # Reset player positions but keep stats
+        # Reset player positions but keep stats; inputs queued for the old
+        # maze are dropped, held directions carry over
+        for queued in self.player_inputs.values():
+            queued.clear()
         for player_id in self.player_positions:
             self.player_positions[player_id] = {
                 'x': self.start_pos[0] * self.cell_size,
                 'y': self.start_pos[1] * self.cell_size
             }
             self.player_stats[player_id]['games_played'] += 1
+        
+        self.notify('reset', {'round_number': self.round_number})
+
+    def add_listener(self, callback):
+        """Register callback(event, data), called on join, move, tick, collect, winner and reset"""
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def notify(self, event, data):
+        """Bump the state version, log the change, publish a snapshot and tell every listener
+
+        Called by writers, so always with the lock held.
+        """
+        self.version += 1
+        data['version'] = self.version
+        if event == 'reset':
+            self.base_version = self.version
+            self.changes.clear()
+        elif event == 'tick':
+            self.changes.append((self.version, event, tuple(data['positions']), None))
+        else:
+            player_id = data.get('player_id')
+            self.changes.append((self.version, event, () if player_id is None else (player_id,), data.get('index')))
+        self.publish(event, data)
+        self.cache.pop('gamestate', None)
+
+        for callback in list(self.listeners):
+            try:
+                callback(event, data)
+            except Exception as e:
+                logging.warning(f"Listener error on {event}: {e}")
+
+
+class SimulationLoop(threading.Thread):
+    """Fixed-timestep driver calling tick() on every registered game tick_rate times a second"""
+    def __init__(self, tick_rate=30):
+        self.tick_rate = tick_rate
+        self.games = []
+        self.games_lock = threading.Lock()
+        self.running = True
+        # After falling this many ticks behind (a stall, a suspended process)
+        # skip ahead instead of running a burst of catch-up ticks
+        self.max_lag_ticks = 5
+        threading.Thread.__init__(self, daemon=True)
+
+    def add_game(self, game):
+        with self.games_lock:
+            if game not in self.games:
+                self.games.append(game)
+
+    def remove_game(self, game):
+        with self.games_lock:
+            if game in self.games:
+                self.games.remove(game)
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        interval = 1.0 / self.tick_rate
+        next_tick = time.perf_counter()
+        while self.running:
+            with self.games_lock:
+                games = list(self.games)
+            for game in games:
+                try:
+                    game.tick(interval)
+                except Exception as e:
+                    logging.warning(f"Simulation tick failed: {e}")
+
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -interval * self.max_lag_ticks:
+                next_tick = time.perf_counter()
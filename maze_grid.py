@@ -0,0 +1,174 @@
+import base64
+import random
+
+# Maze layout storage. A MazeGrid keeps one bit per cell (1 = WALL), row by
+# row in one bytearray; every row starts on a byte boundary and bit x & 7 of
+# the row's byte x >> 3 is cell x (least significant bit first), with unused
+# padding bits 0. A 1001x1001 maze takes 126 KB instead of ~8 MB as a list
+# of lists of ints. The same bytes, base64 encoded, are the "bits" wire form
+# of the maze (see encode and from_maze_info).
+WALL = 1
+PATH = 0
+ENCODING = 'bits'
+
+# Rows are packed and unpacked through their text form: b'0'/b'1' per cell,
+# which int(..., 2) and format() convert to and from an int in C
+CELL_CHARS = bytes.maketrans(b'\x00\x01', b'01')
+CHAR_CELLS = bytes.maketrans(b'01', b'\x00\x01')
+
+
+class MazeGrid:
+    """Maze cells of a width x height maze; everything outside the grid counts as wall"""
+    __slots__ = ('width', 'height', 'stride', 'cells')
+
+    def __init__(self, width, height, cells=None):
+        self.width = width
+        self.height = height
+        self.stride = (width + 7) >> 3  # Bytes per row
+        if cells is None:
+            cells = self.pack_row(bytes([WALL]) * width) * height
+        elif len(cells) != self.stride * height:
+            raise ValueError("Maze data of {} bytes does not fit {}x{} cells".format(len(cells), width, height))
+        self.cells = bytearray(cells)
+
+    @classmethod
+    def generate(cls, width, height, rng=random):
+        """Random maze by depth-first backtracking, with an explicit stack
+
+        Same kind of maze as the recursive carve_path it replaces: paths
+        on odd coordinates, carved from (1, 1), one route between any two
+        cells. Carves a byte per cell, flat indexes, and packs the result;
+        `todo` marks the odd cells not yet carved and ends with two rows of
+        zeros, so the neighbour checks need no bounds tests (indexes past
+        either end land in them).
+        """
+        cells = bytearray([WALL]) * (width * height)
+        todo = bytearray(width * height + 2 * width)
+        for y in range(1, height - 1, 2):
+            todo[y * width + 1:(y + 1) * width - 1:2] = b'\x01' * len(range(1, width - 1, 2))
+
+        start = width + 1
+        todo[start] = 0
+        cells[start] = PATH
+        stack = [start]
+        step = 2 * width
+        randrange = rng.randrange
+        while stack:
+            i = stack[-1]
+            options = [n for n in (i + 2, i - 2, i + step, i - step) if todo[n]]
+            if not options:
+                stack.pop()
+                continue
+            n = options[randrange(len(options))] if len(options) > 1 else options[0]
+            todo[n] = 0
+            cells[(i + n) >> 1] = PATH
+            cells[n] = PATH
+            stack.append(n)
+        return cls.from_bytes(width, height, cells)
+
+    @classmethod
+    def from_bytes(cls, width, height, cells):
+        """Grid of a byte (WALL or PATH) per cell, row by row"""
+        pack_row = cls.pack_row
+        return cls(width, height, b''.join(pack_row(cells[y * width:(y + 1) * width]) for y in range(height)))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Grid of a list of rows of WALL/PATH ints, the JSON form of the maze"""
+        return cls.from_bytes(len(rows[0]) if rows else 0, len(rows), b''.join(bytes(row) for row in rows))
+
+    @classmethod
+    def from_maze_info(cls, maze_info):
+        """Grid of a maze_info dict in either wire form: 'bits' (maze_encoding) or rows"""
+        if maze_info.get('maze_encoding') == ENCODING:
+            return cls(maze_info['maze_width'], maze_info['maze_height'], base64.b64decode(maze_info['maze']))
+        return cls.from_rows(maze_info['maze'])
+
+    @staticmethod
+    def pack_row(row):
+        """Packed bytes of a row given as a byte per cell"""
+        if not row:
+            return b''
+        return int(bytes(row).translate(CELL_CHARS)[::-1], 2).to_bytes((len(row) + 7) >> 3, 'little')
+
+    def row_cells(self, y):
+        """Row y as a byte (WALL or PATH) per cell"""
+        start = y * self.stride
+        value = int.from_bytes(self.cells[start:start + self.stride], 'little')
+        return format(value, '0{}b'.format(self.width))[::-1].encode().translate(CHAR_CELLS)
+
+    def is_wall(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.cells[y * self.stride + (x >> 3)] >> (x & 7) & 1 == WALL
+        return True
+
+    def is_open(self, x, y):
+        return not self.is_wall(x, y)
+
+    def set_open(self, x, y):
+        self.cells[y * self.stride + (x >> 3)] &= ~(1 << (x & 7)) & 0xFF
+
+    def area_open(self, x0, y0, x1, y1):
+        """True if every cell from (x0, y0) to (x1, y1) inclusive is inside the grid and a path"""
+        if x0 < 0 or y0 < 0 or x1 >= self.width or y1 >= self.height:
+            return False
+        cells = self.cells
+        stride = self.stride
+        first = x0 >> 3
+        last = (x1 >> 3) + 1
+        shift = x0 & 7
+        mask = (1 << (x1 - x0 + 1)) - 1
+        for y in range(y0, y1 + 1):
+            row = y * stride
+            if int.from_bytes(cells[row + first:row + last], 'little') >> shift & mask:
+                return False
+        return True
+
+    def random_open_cells(self, count, exclude=(), rng=random):
+        """Up to `count` distinct random path cells, none of them in exclude
+
+        Picks random cells and keeps the open ones, which stays cheap on
+        mazes of millions of cells (about half of a maze is path); falls
+        back to listing every path cell when that is not finding enough.
+        """
+        exclude = set(exclude)
+        chosen = []
+        seen = set()
+        for _ in range(count * 20):
+            if len(chosen) == count:
+                break
+            cell = (rng.randrange(self.width), rng.randrange(self.height))
+            if cell in seen or cell in exclude or self.is_wall(*cell):
+                continue
+            seen.add(cell)
+            chosen.append(cell)
+        if len(chosen) == count:
+            return chosen
+        candidates = [cell for cell in self.open_cells() if cell not in exclude]
+        return rng.sample(candidates, min(count, len(candidates)))
+
+    def open_cells(self):
+        """(x, y) of every path cell, row by row"""
+        for y in range(self.height):
+            row = self.row_cells(y)
+            x = row.find(PATH)
+            while x >= 0:
+                yield x, y
+                x = row.find(PATH, x + 1)
+
+    def rows(self):
+        """Cells as a list of rows of ints, the JSON form of the maze"""
+        return [list(self.row_cells(y)) for y in range(self.height)]
+
+    def encode(self):
+        """Packed cells in base64, the "bits" JSON form of the maze"""
+        return base64.b64encode(self.cells).decode('ascii')
+
+
+def maze_info_as(maze_info, encoding):
+    """MazeGame's maze_info as served for `encoding`: as is for ENCODING, else the list of rows older clients read"""
+    if encoding == ENCODING:
+        return maze_info
+    maze_info = dict(maze_info, maze=MazeGrid.from_maze_info(maze_info).rows())
+    maze_info.pop('maze_encoding', None)
+    return maze_info
@@ -0,0 +1,189 @@
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+# Server logging off the request path (maze_server.py --access-sample,
+# --log-rate-limit). Request threads only put records on a bounded queue;
+# one listener thread formats them and writes stderr. Records are grouped in
+# categories (a record's `category` attribute, else its logger name):
+#
+#   access      one structured (JSON) record per sampled request
+#   connection  connects, rejections and client errors
+#   <logger>    everything else (the game and room messages log on "root")
+#
+# Each category has a sample rate and a records-per-second limit. ERROR and
+# above are never sampled out or limited.
+ACCESS_LOGGER = 'maze.access'
+CONNECTION_LOGGER = 'maze.connection'
+
+
+class LogSampler:
+    """Per-category sampling (every Nth) and token bucket rate limits"""
+    def __init__(self, rates=None, limits=None):
+        self.every = {}
+        self.counters = {}
+        for category, rate in (rates or {}).items():
+            self.set_rate(category, rate)
+        self.limits = dict(limits or {})
+        self.default_limit = self.limits.pop('*', None)
+        # category -> [tokens, last refill time, suppressed since last record]
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def set_rate(self, category, rate):
+        """Keep a `rate` fraction of the category (0 keeps none, 1 all)"""
+        self.every[category] = 0 if rate <= 0 else max(1, round(1 / min(rate, 1.0)))
+
+    def rate(self, category):
+        every = self.every.get(category, 1)
+        return 1.0 / every if every else 0.0
+
+    def sampled(self, category):
+        """True for the records to keep; a counter, no random numbers or locks"""
+        every = self.every.get(category, 1)
+        if every == 1:
+            return True
+        if not every:
+            return False
+        count = self.counters.get(category, 0) + 1
+        self.counters[category] = count
+        return count % every == 0
+
+    def allow(self, category):
+        """(allowed, suppressed count to report) under the category's rate limit"""
+        limit = self.limits.get(category, self.default_limit)
+        if not limit:
+            return True, 0
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(category)
+            if bucket is None:
+                bucket = self.buckets[category] = [float(limit), now, 0]
+            bucket[0] = min(float(limit), bucket[0] + (now - bucket[1]) * limit)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False, 0
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+            return True, suppressed
+
+
+class RateLimitFilter(logging.Filter):
+    """Drops records over their category's limit before they are queued"""
+    def __init__(self, sampler):
+        logging.Filter.__init__(self)
+        self.sampler = sampler
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR:
+            return True
+        allowed, suppressed = self.sampler.allow(getattr(record, 'category', record.name))
+        if allowed and suppressed:
+            message = record.getMessage()
+            if getattr(record, 'category', None) == 'access':
+                # Keep structured records valid JSON
+                record.msg = '{}, "suppressed": {}}}'.format(message[:-1], suppressed)
+            else:
+                record.msg = "{} [{} similar records suppressed]".format(message, suppressed)
+            record.args = None
+        return allowed
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that counts and drops records when the queue is full instead of blocking"""
+    def __init__(self, log_queue):
+        logging.handlers.QueueHandler.__init__(self, log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class AccessLog:
+    """Structured access records, sampled before anything is built
+
+    Request loops call sampled() once per request (a counter increment) and
+    only build and log the record when it returns True.
+    """
+    def __init__(self, sampler):
+        self.sampler = sampler
+        self.logger = logging.getLogger(ACCESS_LOGGER)
+
+    def sampled(self):
+        return self.sampler.sampled('access')
+
+    def record(self, client, request_line, response, started, engine=None):
+        """Log one request: response is what was sent (bytes or buffers), started its perf_counter()"""
+        if isinstance(response, (bytes, bytearray)):
+            head, size = response, len(response)
+        else:
+            head = response[0]
+            size = sum(getattr(part, 'length', None) or len(part) for part in response)
+        parts = request_line.split(" ")
+        fields = {
+            'ts': round(time.time(), 3),
+            'client': '{}:{}'.format(*client[:2]) if client else None,
+            'method': parts[0],
+            'path': parts[1] if len(parts) > 1 else '',
+            'status': int(head[9:12]) if head[9:12].isdigit() else 0,
+            'bytes': size,
+            'ms': round((time.perf_counter() - started) * 1000, 3),
+            'sample': self.sampler.rate('access'),
+        }
+        if engine:
+            fields['engine'] = engine
+        self.logger.info(json.dumps(fields), extra={'category': 'access'})
+
+
+class CategoryAdapter(logging.LoggerAdapter):
+    """Logger whose records carry a category and go through its sampling"""
+    def __init__(self, logger, category):
+        logging.LoggerAdapter.__init__(self, logger, {'category': category})
+        self.category = category
+
+    def log(self, level, msg, *args, **kwargs):
+        if level >= logging.ERROR or sampler.sampled(self.category):
+            logging.LoggerAdapter.log(self, level, msg, *args, **kwargs)
+
+    def process(self, msg, kwargs):
+        kwargs['extra'] = self.extra
+        return msg, kwargs
+
+
+sampler = LogSampler()
+access_log = AccessLog(sampler)
+connection_log = CategoryAdapter(logging.getLogger(CONNECTION_LOGGER), 'connection')
+
+
+def setup(access_sample=1.0, connection_sample=1.0, rate_limit=0, queue_size=10000):
+    """Route all logging through a queue drained by a background thread
+
+    rate_limit caps records per second in every category (0: no limit).
+    Returns the QueueListener; call it in each process (after fork).
+    """
+    sampler.set_rate('access', access_sample)
+    sampler.set_rate('connection', connection_sample)
+    sampler.default_limit = rate_limit or None
+
+    root = logging.getLogger()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(levelname)s:%(name)s:%(message)s'))
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter(sampler))
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    logging.getLogger(ACCESS_LOGGER).setLevel(logging.INFO)
+    logging.getLogger(CONNECTION_LOGGER).setLevel(logging.INFO)
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
@@ -0,0 +1,317 @@
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left
+
+from http_server import FileBody
+
+# Request and game counters served at GET /api/metrics, as Prometheus text
+# (the default) or JSON (?format=json or Accept: application/json).
+#
+# Request loops call record_request() once per handled request, after the
+# response was written; MazeGame's move_player, get_game_state, reset_game
+# and add_player are wrapped with timed(). Both only take a lock, bump a few
+# integers and bisect a tuple: a few microseconds per request. Every process
+# keeps its own numbers: in pre-fork mode each worker answers for itself and
+# labels its output with worker="<index>".
+
+# Latency buckets: four per doubling from 10 us to ~47 s (upper bounds, in
+# seconds); quantiles are interpolated inside a bucket, so p50/p95/p99 are
+# off by a few percent at most
+BUCKET_BOUNDS = tuple(1e-5 * 2 ** (i / 4) for i in range(89))
+# Only every doubling is exported to Prometheus, a finer histogram there
+# would mostly be empty series
+EXPORTED_BUCKETS = tuple(range(0, len(BUCKET_BOUNDS), 4))
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Requests outside /api/ are static files, reported as one endpoint; after
+# max_endpoints distinct paths the rest count as "other" so clients cannot
+# grow the table without bound
+STATIC_ENDPOINT = 'static'
+OTHER_ENDPOINT = 'other'
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'DELETE', 'OPTIONS', 'PATCH'))
+
+
+ERROR_STATUS_DIGITS = (b'4', b'5')
+
+
+class Histogram:
+    """Counts of observations per logarithmic bucket (BUCKET_BOUNDS), plus their count and sum"""
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)  # The last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Estimated q-quantile in seconds (0.0 without observations)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                if i == len(BUCKET_BOUNDS):
+                    return BUCKET_BOUNDS[-1]
+                lower = BUCKET_BOUNDS[i - 1] if i else 0.0
+                return lower + (BUCKET_BOUNDS[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return BUCKET_BOUNDS[-1]
+
+    def cumulative_buckets(self):
+        """[(upper bound, observations <= it)] at the exported bounds, +Inf last"""
+        buckets = []
+        cumulative = 0
+        exported = set(EXPORTED_BUCKETS)
+        for i, count in enumerate(self.counts[:-1]):
+            cumulative += count
+            if i in exported:
+                buckets.append((BUCKET_BOUNDS[i], cumulative))
+        buckets.append((float('inf'), self.count))
+        return buckets
+
+    def summary(self):
+        summary = {'count': self.count, 'sum': round(self.sum, 6)}
+        for q in QUANTILES:
+            summary['p{:g}'.format(q * 100)] = round(self.quantile(q), 6)
+        return summary
+
+
+class EndpointStats:
+    __slots__ = ('requests', 'errors', 'bytes_in', 'bytes_out', 'latency')
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0       # Answered with a 4xx or 5xx status
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency = Histogram()
+
+
+class CallStats:
+    __slots__ = ('calls', 'errors', 'latency')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0       # Raised an exception
+        self.latency = Histogram()
+
+
+class Metrics:
+    """All counters of one process"""
+    max_endpoints = 64
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.endpoints = {}           # (method, endpoint) -> EndpointStats
+        self.keys = {}                # request line -> (method, endpoint), see endpoint()
+        self.calls = {}               # game method name -> CallStats
+        self.connections_open = 0
+        self.connections_total = 0
+        self.rejected_requests = 0    # Unparseable, answered by the request parser
+        self.labels = {}              # Added to every Prometheus series, e.g. worker
+
+    def connection_opened(self):
+        with self.lock:
+            self.connections_open += 1
+            self.connections_total += 1
+
+    def connection_closed(self):
+        with self.lock:
+            self.connections_open -= 1
+
+    def request_rejected(self):
+        with self.lock:
+            self.rejected_requests += 1
+
+    def endpoint(self, request_line):
+        """(method, endpoint) a request line is counted under"""
+        key = self.keys.get(request_line)
+        if key is not None:
+            return key
+        parts = request_line.split(' ', 2)
+        method = parts[0] if parts[0] in METHODS else 'OTHER'
+        path = parts[1].split('?', 1)[0] if len(parts) > 1 else ''
+        if not path.startswith('/api/'):
+            path = STATIC_ENDPOINT
+        key = (method, path)
+        if key not in self.endpoints and len(self.endpoints) >= self.max_endpoints:
+            key = (method, OTHER_ENDPOINT)
+        if len(self.keys) < 4096:
+            # Clients repeat the same few request lines
+            self.keys[request_line] = key
+        return key
+
+    def record_request(self, request, response, started):
+        """Count one handled request; response as sent, started its perf_counter()"""
+        elapsed = time.perf_counter() - started
+        if isinstance(response, bytes):
+            size = len(response)
+            error = response[9:10] in ERROR_STATUS_DIGITS
+        else:
+            # Buffers: head, then bytes or a FileBody
+            size = 0
+            for part in response:
+                size += part.length if isinstance(part, FileBody) else len(part)
+            error = response[0][9:10] in ERROR_STATUS_DIGITS
+        key = self.endpoint(request.request_line)
+        with self.lock:
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = EndpointStats()
+            stats.requests += 1
+            stats.errors += error
+            stats.bytes_in += len(request.raw) if request.raw else 0
+            stats.bytes_out += size
+            stats.latency.observe(elapsed)
+
+    def record_call(self, name, elapsed, error=False):
+        with self.lock:
+            stats = self.calls.get(name)
+            if stats is None:
+                stats = self.calls[name] = CallStats()
+            stats.calls += 1
+            stats.errors += error
+            stats.latency.observe(elapsed)
+
+    def to_dict(self):
+        with self.lock:
+            endpoints = {'{} {}'.format(*key): {
+                'requests': stats.requests,
+                'errors': stats.errors,
+                'bytes_in': stats.bytes_in,
+                'bytes_out': stats.bytes_out,
+                'latency': stats.latency.summary(),
+            } for key, stats in sorted(self.endpoints.items())}
+            calls = {name: {
+                'calls': stats.calls,
+                'errors': stats.errors,
+                'latency': stats.latency.summary(),
+            } for name, stats in sorted(self.calls.items())}
+            return {
+                'uptime': round(time.time() - self.started, 3),
+                'labels': dict(self.labels),
+                'connections': {'open': self.connections_open, 'total': self.connections_total},
+                'rejected_requests': self.rejected_requests,
+                'requests': sum(stats.requests for stats in self.endpoints.values()),
+                'bytes_in': sum(stats.bytes_in for stats in self.endpoints.values()),
+                'bytes_out': sum(stats.bytes_out for stats in self.endpoints.values()),
+                'endpoints': endpoints,
+                'game': calls,
+            }
+
+    def to_json(self):
+        return json.dumps({'status': 'OK', 'metrics': self.to_dict()})
+
+    def to_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        constant = ''.join(',{}="{}"'.format(name, escape(value)) for name, value in self.labels.items())
+
+        def header(name, kind, text):
+            lines.append('# HELP {} {}'.format(name, text))
+            lines.append('# TYPE {} {}'.format(name, kind))
+
+        def sample(name, labels, value):
+            label_text = (','.join('{}="{}"'.format(k, escape(v)) for k, v in labels) + constant).lstrip(',')
+            if label_text:
+                name = '{}{{{}}}'.format(name, label_text)
+            lines.append('{} {}'.format(name, format_value(value)))
+
+        def histogram(name, labels, latency):
+            for bound, count in latency.cumulative_buckets():
+                sample(name + '_bucket', labels + (('le', format_value(bound)),), count)
+            sample(name + '_sum', labels, latency.sum)
+            sample(name + '_count', labels, latency.count)
+
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+            calls = sorted(self.calls.items())
+
+            header('maze_uptime_seconds', 'gauge', 'Seconds since the process started')
+            sample('maze_uptime_seconds', (), round(time.time() - self.started, 3))
+            header('maze_connections_in_flight', 'gauge', 'Open client connections')
+            sample('maze_connections_in_flight', (), self.connections_open)
+            header('maze_connections_total', 'counter', 'Accepted client connections')
+            sample('maze_connections_total', (), self.connections_total)
+            header('maze_rejected_requests_total', 'counter', 'Requests the parser answered with an error')
+            sample('maze_rejected_requests_total', (), self.rejected_requests)
+
+            for name, kind, text, field in (
+                    ('maze_requests_total', 'counter', 'Handled requests', 'requests'),
+                    ('maze_request_errors_total', 'counter', 'Requests answered with a 4xx or 5xx status',
+                     'errors'),
+                    ('maze_received_bytes_total', 'counter', 'Request bytes received', 'bytes_in'),
+                    ('maze_sent_bytes_total', 'counter', 'Response bytes sent', 'bytes_out')):
+                header(name, kind, text)
+                for (method, endpoint), stats in endpoints:
+                    sample(name, (('method', method), ('endpoint', endpoint)), getattr(stats, field))
+
+            header('maze_request_duration_seconds', 'histogram', 'Time to handle and write a request')
+            for (method, endpoint), stats in endpoints:
+                histogram('maze_request_duration_seconds', (('method', method), ('endpoint', endpoint)),
+                          stats.latency)
+            header('maze_request_duration_quantile_seconds', 'gauge',
+                   'Request duration quantiles estimated from the full resolution histogram')
+            for (method, endpoint), stats in endpoints:
+                for q in QUANTILES:
+                    sample('maze_request_duration_quantile_seconds',
+                           (('method', method), ('endpoint', endpoint), ('quantile', format_value(q))),
+                           stats.latency.quantile(q))
+
+            header('maze_game_calls_total', 'counter', 'MazeGame method calls')
+            for name, stats in calls:
+                sample('maze_game_calls_total', (('method', name),), stats.calls)
+            header('maze_game_call_errors_total', 'counter', 'MazeGame method calls that raised')
+            for name, stats in calls:
+                sample('maze_game_call_errors_total', (('method', name),), stats.errors)
+            header('maze_game_call_duration_seconds', 'histogram', 'MazeGame method duration, lock wait included')
+            for name, stats in calls:
+                histogram('maze_game_call_duration_seconds', (('method', name),), stats.latency)
+            header('maze_game_call_duration_quantile_seconds', 'gauge',
+                   'MazeGame method duration quantiles estimated from the full resolution histogram')
+            for name, stats in calls:
+                for q in QUANTILES:
+                    sample('maze_game_call_duration_quantile_seconds',
+                           (('method', name), ('quantile', format_value(q))), stats.latency.quantile(q))
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(round(value, 9))
+    return str(value)
+
+
+metrics = Metrics()
+
+
+def timed(name):
+    """Decorator counting calls, exceptions and duration of a function as `name`"""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except Exception:
+                metrics.record_call(name, time.perf_counter() - started, True)
+                raise
+            metrics.record_call(name, time.perf_counter() - started)
+            return result
+        return wrapper
+    return decorate
@@ -0,0 +1,232 @@
+import collections
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+
+# On-demand profiling of a live server, behind the admin endpoints of
+# maze_server.py (loopback clients, or --admin-token):
+#
+#   SamplingProfiler  a thread that snapshots the request threads' Python
+#                     stacks (sys._current_frames) a few hundred times a
+#                     second for a bounded window. Nothing runs on the
+#                     request threads, so the cost is the sampler's own
+#                     GIL time. Output: collapsed stacks, one
+#                     "thread;outer;...;inner count" line each, ready for
+#                     flamegraph.pl or speedscope, and a top-N table.
+#   RequestProfiler   cProfile around every Nth request, results merged
+#                     into one pstats table. Only one request is profiled
+#                     at a time; the others run untouched.
+
+# Threads with a `busy` attribute (pool workers) say themselves whether they
+# are serving a request. For the others, leaf frames in these modules mean
+# the thread is waiting for work, not running. Stacks of idle threads are
+# left out unless idle stacks are asked for.
+IDLE_MODULES = ('threading.py', 'queue.py', 'selectors.py')
+
+
+def frame_label(code):
+    return '{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+def function_label(function):
+    """pstats (file, line, name) key as frame_label() prints it"""
+    filename, line, name = function
+    if filename == '~':
+        return name  # Built-in
+    return '{} ({}:{})'.format(name, os.path.basename(filename), line)
+
+
+class SamplingProfiler:
+    """Samples the stacks of the request threads for at most max_duration seconds
+
+    Request threads are the ones whose class is in thread_types (set by
+    maze_server.py; empty samples every thread). include_idle samples all
+    threads, waiting ones included.
+    """
+    max_duration = 60
+    min_interval = 0.001
+    thread_types = ()
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.interval = 0.0
+        self.include_idle = False
+        self.started = None
+        self.stopped = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, duration=10.0, interval=0.005, include_idle=False):
+        """Begin a new window (the previous result is dropped), False if one is running"""
+        with self.lock:
+            if self.running:
+                return False
+            self.stacks = collections.Counter()
+            self.samples = 0
+            self.interval = max(self.min_interval, float(interval))
+            self.include_idle = include_idle
+            self.started = time.time()
+            self.stopped = None
+            self.stop_event = threading.Event()
+            duration = min(max(float(duration), 0.0), self.max_duration)
+            self.thread = threading.Thread(target=self.run, args=(duration,), daemon=True)
+            self.thread.start()
+            return True
+
+    def stop(self):
+        """End the window early; the samples taken so far stay available"""
+        thread = self.thread
+        self.stop_event.set()
+        if thread is not None:
+            thread.join()
+
+    def run(self, duration):
+        own = threading.get_ident()
+        deadline = time.perf_counter() + duration
+        while not self.stop_event.wait(self.interval) and time.perf_counter() < deadline:
+            self.sample(own)
+        self.stopped = time.time()
+
+    def sample(self, own):
+        threads = {thread.ident: thread for thread in threading.enumerate()}
+        frames = sys._current_frames()
+        for ident, frame in frames.items():
+            if ident == own:
+                continue
+            thread = threads.get(ident)
+            if not self.include_idle:
+                if self.thread_types and not isinstance(thread, self.thread_types):
+                    continue
+                busy = getattr(thread, 'busy', None)
+                if busy is None:
+                    busy = os.path.basename(frame.f_code.co_filename) not in IDLE_MODULES
+                if not busy:
+                    continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(type(thread).__name__ if thread else 'Thread')
+            stack.reverse()
+            self.stacks[';'.join(stack)] += 1
+        self.samples += 1
+
+    def collapsed(self):
+        """Collapsed stacks, the input format of flamegraph.pl"""
+        stacks = self.stacks.copy()
+        return ''.join('{} {}\n'.format(stack, count) for stack, count in stacks.most_common())
+
+    def top(self, limit=20):
+        """Functions with the most samples: self (leaf) and total (anywhere on the stack)"""
+        stacks = self.stacks.copy()
+        own = collections.Counter()
+        total = collections.Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(';')[1:]  # Without the thread name
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+        stack_samples = sum(stacks.values()) or 1
+        return [{'function': label, 'self': own[label], 'total': count,
+                 'self_percent': round(100.0 * own[label] / stack_samples, 2),
+                 'total_percent': round(100.0 * count / stack_samples, 2)}
+                for label, count in sorted(total.items(), key=lambda item: (-own[item[0]], -item[1]))[:limit]]
+
+    def to_dict(self, limit=20):
+        end = self.stopped or time.time()
+        return {
+            'running': self.running,
+            'started': self.started,
+            'duration': round(end - self.started, 3) if self.started else 0.0,
+            'interval': self.interval,
+            'samples': self.samples,
+            'include_idle': self.include_idle,
+            'top': self.top(limit),
+        }
+
+
+class RequestProfiler:
+    """cProfile every Nth request until `limit` requests were profiled"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = threading.Lock()  # Held while a request is being profiled
+        self.every = 0
+        self.limit = 0
+        self.counter = 0
+        self.profiled = 0
+        self.stats = None
+
+    def configure(self, every, limit=1000):
+        """Profile every Nth request from now on (0 turns it off); clears earlier results"""
+        with self.lock:
+            self.every = max(0, int(every))
+            self.limit = max(1, int(limit))
+            self.counter = 0
+            self.profiled = 0
+            self.stats = None
+
+    def begin(self):
+        """A running cProfile.Profile if this request is to be profiled, else None"""
+        every = self.every
+        if not every:
+            return None
+        self.counter += 1
+        if self.counter % every or not self.active.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def end(self, profile):
+        profile.disable()
+        self.active.release()
+        with self.lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+            self.profiled += 1
+            if self.profiled >= self.limit:
+                self.every = 0
+
+    def top(self, limit=20, sort='cumulative'):
+        """[{function, calls, tottime, cumtime}] of the merged profiles, `sort` by cumtime or tottime"""
+        with self.lock:
+            if self.stats is None:
+                return []
+            rows = [(function, nc, tt, ct) for function, (cc, nc, tt, ct, callers) in self.stats.stats.items()]
+        index = 2 if sort == 'tottime' else 3
+        rows.sort(key=lambda row: row[index], reverse=True)
+        return [{'function': function_label(function), 'calls': calls,
+                 'tottime': round(tottime, 6), 'cumtime': round(cumtime, 6)}
+                for function, calls, tottime, cumtime in rows[:limit]]
+
+    def text(self, limit=20, sort='cumulative'):
+        """pstats' own print_stats() table"""
+        with self.lock:
+            if self.stats is None:
+                return ''
+            out = io.StringIO()
+            self.stats.stream = out
+            self.stats.sort_stats('tottime' if sort == 'tottime' else 'cumulative').print_stats(limit)
+            return out.getvalue()
+
+    def to_dict(self, limit=20, sort='cumulative'):
+        return {'every': self.every, 'limit': self.limit, 'profiled': self.profiled,
+                'top': self.top(limit, sort)}
+
+
+sampler = SamplingProfiler()
+request_profiler = RequestProfiler()
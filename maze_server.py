@@ -1,24 +1,495 @@
 from socket import *
 import socket
 import threading
+import argparse
+import asyncio
+import multiprocessing
+import queue
 import time
 import sys
 import logging
 import json
+import math
 import urllib.parse
-from http_server import HttpServer
-from maze_game import MazeGame
+import hashlib
+import hmac
+import ipaddress
+import re
+import secrets
+import selectors
+from http_server import HttpServer, StaticFiles, RequestError, RequestParser, join_buffers, send_buffers, write_buffers
+from maze_game import MazeGame, SimulationLoop
+import maze_binary
+import maze_grid
+import maze_log
+import maze_metrics
+import maze_profiler
+import maze_shard
+import maze_udp
 
-# Configure logging
+# Configure logging; main() moves it off the request path, see maze_log.py
 logging.basicConfig(level=logging.WARNING)
+access_log = maze_log.access_log
+connection_log = maze_log.connection_log
+metrics = maze_metrics.metrics
 
-# Global game instance
+# Game of the default room, served when a request names no room
 game = MazeGame()
 
+class SocketStreamSink:
+    """Stream subscriber on a client socket (threaded engine), written without blocking
+
+    What the socket does not take right away waits in `pending` and goes out
+    before the next event; like AsyncStreamSink, a subscriber that falls
+    max_buffered bytes behind is dropped, so a slow reader never holds up
+    the broadcaster thread and the other subscribers of the room.
+    """
+    max_buffered = 1024 * 1024
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.connection.setblocking(False)
+        self.pending = b''
+
+    def send(self, data):
+        pending = self.pending + data
+        if len(pending) > self.max_buffered:
+            return False
+        try:
+            sent = self.connection.send(pending)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            return False
+        self.pending = pending[sent:]
+        return True
+
+    def close(self):
+        try:
+            self.connection.close()
+        except OSError:
+            pass
+
+class AsyncStreamSink:
+    """Stream subscriber on an asyncio StreamWriter, written to from the broadcaster thread"""
+    # Drop subscribers that stop reading instead of buffering for them forever
+    max_buffered = 1024 * 1024
+
+    def __init__(self, loop, writer):
+        self.loop = loop
+        self.writer = writer
+
+    def send(self, data):
+        if self.writer.is_closing() or self.writer.transport.get_write_buffer_size() > self.max_buffered:
+            return False
+        try:
+            self.loop.call_soon_threadsafe(self.writer.write, data)
+            return True
+        except RuntimeError:  # Event loop already closed
+            return False
+
+    def close(self):
+        try:
+            self.loop.call_soon_threadsafe(self.writer.close)
+        except RuntimeError:
+            pass
+
+class GameStream(threading.Thread):
+    """Server-Sent Events broadcaster for /api/stream
+
+    Game listeners only format and enqueue events; this single thread writes
+    them to every subscribed connection, so streaming clients hold neither a
+    pool worker nor a request slot.
+    """
+    heartbeat_interval = 15
+
+    def __init__(self, game):
+        self.game = game
+        self.events = queue.Queue()
+        self.sinks = []
+        self.lock = threading.Lock()
+        threading.Thread.__init__(self, daemon=True)
+        game.add_listener(self.on_game_event)
+
+    @staticmethod
+    def format_event(event, data):
+        return "event: {}\ndata: {}\n\n".format(event, json.dumps(data)).encode()
+
+    def on_game_event(self, event, data):
+        # Nobody to send it to: rooms without subscribers must not queue up
+        # events that nothing drains
+        if not self.sinks:
+            return
+        # Format right away: data holds live game dicts that keep changing
+        self.events.put((None, self.format_event(event, data)))
+
+    def subscribe(self, sink):
+        """Start streaming to sink, beginning with a full game state snapshot"""
+        # Under the game's lock no event can fall between the snapshot and
+        # the sink joining (listeners are called with it held)
+        with self.game.lock:
+            snapshot = self.format_event('state', self.game.get_game_state())
+            with self.lock:
+                if not self.is_alive():
+                    self.start()
+                self.sinks.append(sink)
+            self.events.put((sink, snapshot))
+
+    def unsubscribe(self, sink):
+        with self.lock:
+            if sink not in self.sinks:
+                return
+            self.sinks.remove(sink)
+        sink.close()
+
+    def close(self):
+        """Stop listening to the game, end the thread and drop every subscriber"""
+        self.game.remove_listener(self.on_game_event)
+        self.events.put((None, None))
+        with self.lock:
+            sinks, self.sinks = self.sinks, []
+        for sink in sinks:
+            sink.close()
+
+    def run(self):
+        while True:
+            try:
+                target, data = self.events.get(timeout=self.heartbeat_interval)
+            except queue.Empty:
+                # SSE comment line, keeps proxies from timing out and finds dead sockets
+                target, data = None, b": ping\n\n"
+            if data is None:
+                return
+
+            with self.lock:
+                sinks = [target] if target is not None else list(self.sinks)
+            for sink in sinks:
+                if not sink.send(data):
+                    self.unsubscribe(sink)
+
+class SelectorThread(threading.Thread):
+    """One thread watching many sockets of the threaded engine for incoming data
+
+    Workers hand sockets over with add(); the thread registers them itself
+    (woken up through a socket pair) and calls ready() when one has data.
+    A socket with nothing to read for idle_timeout seconds is expire()d.
+    """
+    idle_timeout = 15
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.added = queue.Queue()
+        self.wakeup_recv, self.wakeup_send = socket.socketpair()
+        self.wakeup_recv.setblocking(False)
+        self.wakeup_send.setblocking(False)
+        self.selector.register(self.wakeup_recv, selectors.EVENT_READ, None)
+        self.lock = threading.Lock()
+        threading.Thread.__init__(self, daemon=True)
+
+    def add(self, connection, data):
+        """Watch connection from now on; ready() and expire() get data along with it"""
+        with self.lock:
+            if not self.is_alive():
+                self.start()
+        self.added.put((connection, data))
+        try:
+            self.wakeup_send.send(b'\0')
+        except BlockingIOError:
+            pass  # Already a wakeup pending
+
+    def run(self):
+        while True:
+            for key, _ in self.selector.select(timeout=1):
+                if key.data is None:
+                    self.register_added()
+                    continue
+                try:
+                    self.ready(key.fileobj, key.data)
+                except Exception as e:
+                    # One broken connection must not end the thread serving all the others
+                    connection_log.warning("Client error: %s", e)
+                    self.close(key.fileobj)
+            self.expire_idle()
+
+    def register_added(self):
+        try:
+            while self.wakeup_recv.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while not self.added.empty():
+            connection, data = self.added.get()
+            connection.setblocking(False)
+            # [data, last activity]
+            self.selector.register(connection, selectors.EVENT_READ, [data, time.monotonic()])
+
+    def expire_idle(self):
+        deadline = time.monotonic() - self.idle_timeout
+        idle = [(key.fileobj, key.data[0]) for key in list(self.selector.get_map().values())
+                if key.data is not None and key.data[1] < deadline]
+        for connection, data in idle:
+            self.selector.unregister(connection)
+            self.expire(connection, data)
+
+    def ready(self, connection, state):
+        raise NotImplementedError
+
+    def expire(self, connection, data):
+        connection.close()
+
+    def close(self, connection):
+        try:
+            self.selector.unregister(connection)
+        except (KeyError, ValueError):
+            pass  # Already handed back
+        connection.close()
+
+class BinarySessions(SelectorThread):
+    """maze-binary connections of the threaded engine, all served by one selector thread
+
+    An upgraded connection leaves its pool worker, as a stream subscriber
+    does: a player moving every frame is never idle, so it would otherwise
+    hold a worker for the whole session. Records are small and answered
+    right away; a client that stops reading its replies, or sends nothing for
+    idle_timeout seconds, is disconnected.
+    """
+    def ready(self, connection, state):
+        try:
+            data = connection.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self.close(connection)
+            return
+        state[1] = time.monotonic()
+        try:
+            replies = state[0].feed(data)
+            if replies and connection.send(replies) < len(replies):
+                raise BlockingIOError("replies left unread")
+        except (OSError, maze_binary.ProtocolError) as e:
+            connection_log.info("Binary session closed: %s", e)
+            self.close(connection)
+
+binary_sessions = BinarySessions()
+
+class KeepAliveParking(SelectorThread):
+    """Keep-alive connections of the threaded engine waiting for their next request
+
+    A worker that runs out of buffered requests parks the connection here
+    instead of blocking in recv(), and is free for the next one right away.
+    Once data arrives the connection goes back into the pool's queue; when
+    the queue is full it is turned away with a 503, like a new connection.
+    Connections quiet for the keep-alive timeout are closed.
+    """
+    def __init__(self, connections, reject, idle_timeout):
+        SelectorThread.__init__(self)
+        self.connections = connections
+        self.reject = reject
+        self.idle_timeout = idle_timeout
+
+    def ready(self, connection, state):
+        self.selector.unregister(connection)
+        client = state[0]
+        try:
+            self.connections.put_nowait((connection, client.address, client))
+        except queue.Full:
+            self.reject(connection, client.address)
+            client.close()
+
+    def expire(self, connection, client):
+        client.close()
+
+class Room:
+    """One match: a MazeGame, its event stream and when a request last used it"""
+    def __init__(self, room_id, game=None):
+        self.room_id = room_id
+        self.game = game if game is not None else MazeGame()
+        self.stream = GameStream(self.game)
+        self.last_used = time.time()
+
+    def is_idle(self, now, idle_timeout):
+        return now - self.last_used > idle_timeout and not self.stream.sinks
+
+    def close(self):
+        self.stream.close()
+
+class RoomRegistry:
+    """Rooms by id, selected with the `room` parameter of every /api call
+
+    The default room always exists. Other rooms are created by
+    POST /api/room/create and removed once nobody has used them (no request
+    and no stream subscriber) for idle_timeout seconds; collection runs at
+    most every gc_interval seconds, piggybacked on lookups.
+    """
+    default_room = 'default'
+    room_id_pattern = re.compile(r'^[A-Za-z0-9_-]{1,32}$')
+
+    def __init__(self, default_game, max_rooms=1000, idle_timeout=600, gc_interval=30):
+        # MazeGame arguments (width, height, cell_size) of rooms created
+        # without their own, and the largest side a request may ask for
+        self.maze_options = {}
+        self.max_maze_side = 101
+        self.max_rooms = max_rooms
+        self.idle_timeout = idle_timeout
+        self.gc_interval = gc_interval
+        self.rooms = {self.default_room: Room(self.default_room, default_game)}
+        self.lock = threading.Lock()
+        self.simulation = None
+        self.last_gc = time.time()
+        # Pre-fork mode: predicate telling whether this process owns a room id
+        self.owns = None
+
+    def get(self, room_id):
+        """Room by id (None if unknown), marking it as used"""
+        room = self.rooms.get(room_id)
+        if room is not None:
+            room.last_used = time.time()
+        if time.time() - self.last_gc > self.gc_interval:
+            self.collect_garbage()
+        return room
+
+    def is_owned(self, room_id):
+        """Whether this process serves room_id (always, unless in pre-fork mode)"""
+        return not self.owns or self.owns(room_id)
+
+    def create(self, room_id=None, maze_options=None):
+        """Returns (room, created); an existing id is returned as is, None when full
+        or when the id belongs to another worker process
+
+        maze_options override maze_options of the registry for a new room;
+        MazeGame raises ValueError for unusable ones.
+        """
+        if room_id is not None and not self.is_owned(str(room_id)):
+            return None, False
+        with self.lock:
+            room = self.rooms.get(room_id) if room_id is not None else None
+            if room is not None:
+                room.last_used = time.time()
+                return room, False
+            if len(self.rooms) >= self.max_rooms:
+                return None, False
+        # Built outside the lock: a big maze takes a while to generate
+        game = MazeGame(**dict(self.maze_options, **(maze_options or {})))
+        with self.lock:
+            if room_id is None:
+                room_id = secrets.token_hex(4)
+                while room_id in self.rooms or (self.owns and not self.owns(room_id)):
+                    room_id = secrets.token_hex(4)
+            room = self.rooms.get(room_id)
+            if room is not None:
+                room.last_used = time.time()
+                return room, False
+            if len(self.rooms) >= self.max_rooms:
+                return None, False
+            room = self.rooms[room_id] = Room(room_id, game)
+            if self.simulation:
+                self.simulation.add_game(room.game)
+        logging.warning(f"Room {room_id} created")
+        return room, True
+
+    def remove(self, room_id):
+        if room_id == self.default_room:
+            return False
+        with self.lock:
+            room = self.rooms.pop(room_id, None)
+        if room is None:
+            return False
+        if self.simulation:
+            self.simulation.remove_game(room.game)
+        room.close()
+        logging.warning(f"Room {room_id} removed")
+        return True
+
+    def collect_garbage(self):
+        now = time.time()
+        self.last_gc = now
+        idle = [room_id for room_id, room in list(self.rooms.items())
+                if room_id != self.default_room and room.is_idle(now, self.idle_timeout)]
+        for room_id in idle:
+            self.remove(room_id)
+        return idle
+
+    def attach_simulation(self, simulation):
+        """Let simulation tick every current and future room"""
+        with self.lock:
+            self.simulation = simulation
+            for room in self.rooms.values():
+                simulation.add_game(room.game)
+
+    def list_rooms(self):
+        now = time.time()
+        return [{
+            'room': room_id,
+            'players': len(room.game.snapshot.players),
+            'round_number': room.game.snapshot.round_number,
+            'maze_width': room.game.maze_width,
+            'maze_height': room.game.maze_height,
+            'winner': room.game.snapshot.winner,
+            'subscribers': len(room.stream.sinks),
+            'idle': int(now - room.last_used)
+        } for room_id, room in list(self.rooms.items()) if not self.owns or self.owns(room_id)]
+
+rooms = RoomRegistry(game)
+
+# Pre-fork mode only: room ownership across worker processes, see maze_shard.py
+shards = None
+
+# Fixed-timestep movement driven by /api/player/input, see start_simulation
+simulation = None
+
+def start_simulation(tick_rate):
+    global simulation
+    simulation = SimulationLoop(tick_rate)
+    rooms.attach_simulation(simulation)
+    simulation.start()
+
+# Optional UDP channel for moves and position pushes (--udp-port), see maze_udp.py
+udp_server = None
+
+def start_udp(port):
+    global udp_server
+    udp_server = maze_udp.UdpGameServer(port, rooms)
+    try:
+        udp_server.bind()
+    except OSError as e:
+        print_bind_error(port, e)
+        sys.exit(1)
+    udp_server.start()
+
 class MazeHttpServer(HttpServer):
+    # Upper bound on operations in one /api/batch request
+    max_batch_operations = 64
+    # /api/admin/* answers loopback clients, and anyone sending this token
+    # in the X-Admin-Token header when set (--admin-token)
+    admin_token = None
+
     def __init__(self):
         super().__init__()
-        self.game = game
+        self.rooms = rooms
+        # Room named by the current request, see select_room
+        self.room = rooms.get(RoomRegistry.default_room)
+        self.game = self.room.game
+        # Set to the room's GameStream when the last request asked for
+        # /api/stream; the connection handler then hands the socket over to it
+        self.stream_requested = None
+        # Set by a successful maze-binary upgrade, see maze_binary.py
+        self.binary_session = None
+        # Peer address of the connection, set by the connection handler
+        self.client_address = None
+        # Pre-fork mode: True on connections from the other workers' private
+        # port, the only place a request counts as already forwarded
+        self.forwarded = False
+
+    def handle_request(self, request):
+        profile = maze_profiler.request_profiler.begin()
+        if profile is None:
+            return super().handle_request(request)
+        try:
+            return super().handle_request(request)
+        finally:
+            maze_profiler.request_profiler.end(profile)
 
     def http_get(self, object_address, headers):
         """Handle GET requests for maze game"""
@@ -31,34 +502,64 @@ class MazeHttpServer(HttpServer):
                 path = object_address
                 params = {}
 
-            # API endpoints
-            if path == '/api/status':
-                return self.create_json_response({'status': 'OK', 'message': 'Maze server running'})
+            if path.startswith('/api/admin/'):
+                return self.admin_get(path, params, headers)
+
+            if path.startswith('/api/') and not self.select_room(params.get('room', [''])[0]):
+                # Any worker answers status and rooms, also for a room another one owns
+                if not (shards and path.encode() in maze_shard.LOCAL_PATHS):
+                    return self.create_json_response({'status': 'ERROR', 'message': 'Room not found'}, 404)
+
+            # Endpoints answered with more than a plain JSON body
+            if path == '/api/rooms' and shards and not self.forwarded:
+                room_list = self.rooms.list_rooms() + maze_shard.fetch_peer_rooms(shards)
+                return self.create_json_response({'status': 'OK', 'rooms': room_list})
             
-            elif path == '/api/players':
-                players = list(self.game.players.keys())
-                return self.create_json_response({'status': 'OK', 'players': players})
+            elif path == '/api/maze':
+                maze_info = self.game.get_maze_info()
+                # Rows by default for older clients; ?encoding=bits is the packed grid
+                encoding = params.get('encoding', ['rows'])[0]
+                return self.cached_json_response(
+                    ('maze', maze_info['round_number'], encoding == maze_grid.ENCODING), headers,
+                    lambda: {'status': 'OK', 'maze': maze_grid.maze_info_as(maze_info, encoding)})
             
-            elif path == '/api/player/face':
-                player_id = params.get('id', [''])[0]
-                if player_id and player_id in self.game.players:
-                    face = self.game.players[player_id]['avatar']
-                    return self.create_json_response({'status': 'OK', 'face': face})
-                else:
-                    return self.create_json_response({'status': 'ERROR', 'message': 'Player not found'}, 404)
+            elif path == '/api/player/face' and params.get('id', [''])[0] in self.game.players:
+                player_id = params['id'][0]
+                face = self.game.players[player_id]['avatar']
+                return self.cached_json_response(('face', player_id), headers,
+                                                 lambda: {'status': 'OK', 'face': face})
+            
+            elif path == '/api/gamestate' and not params.get('since', [''])[0]:
+                return self.gamestate_response()
             
-            elif path == '/api/player/location':
+            elif path == '/api/binary':
                 player_id = params.get('id', [''])[0]
-                if player_id and player_id in self.game.player_positions:
-                    pos = self.game.player_positions[player_id]
-                    location = f"{pos['x']},{pos['y']}"
-                    return self.create_json_response({'status': 'OK', 'location': location})
-                else:
+                if self.get_header(headers, 'Upgrade').lower() != maze_binary.PROTOCOL:
+                    return self.create_json_response(
+                        {'status': 'ERROR', 'message': f'Upgrade: {maze_binary.PROTOCOL} required'},
+                        426, 'Upgrade Required')
+                if player_id not in self.game.players:
                     return self.create_json_response({'status': 'ERROR', 'message': 'Player not found'}, 404)
+                self.binary_session = maze_binary.BinarySession(self.game, player_id)
+                return self.upgrade_response(maze_binary.PROTOCOL)
             
-            elif path == '/api/gamestate':
-                game_state = self.game.get_game_state()
-                return self.create_json_response({'status': 'OK', 'game_state': game_state})
+            elif path == '/api/metrics':
+                # Prometheus text unless JSON is asked for
+                if (params.get('format', [''])[0] == 'json' or
+                        'application/json' in self.get_header(headers, 'Accept')):
+                    return self.body_response(200, 'OK', metrics.to_json().encode(),
+                                              {'Content-Type': 'application/json'})
+                return self.body_response(200, 'OK', metrics.to_prometheus().encode(),
+                                          {'Content-Type': 'text/plain; version=0.0.4'})
+            
+            elif path == '/api/stream':
+                self.stream_requested = self.room.stream
+                return self.stream_response({'Content-Type': 'text/event-stream',
+                                             'Cache-Control': 'no-cache'})
+            
+            elif path.startswith('/api/'):
+                code, payload = self.api_get(path, params)
+                return self.create_json_response(payload, code)
             
             else:
                 # Default file serving
@@ -68,6 +569,186 @@ class MazeHttpServer(HttpServer):
             logging.error(f"Error in GET request: {e}")
             return self.create_json_response({'status': 'ERROR', 'message': str(e)}, 500)
 
+    def api_get(self, path, params):
+        """JSON GET endpoints, returns (status code, payload)"""
+        if path == '/api/status':
+            tick_rate = simulation.tick_rate if simulation else 0
+            payload = {'status': 'OK', 'message': 'Maze server running', 'tick_rate': tick_rate}
+            if shards:
+                payload['worker'] = shards.index
+            return 200, payload
+        
+        elif path == '/api/rooms':
+            return 200, {'status': 'OK', 'rooms': self.rooms.list_rooms()}
+        
+        elif path == '/api/players':
+            players = self.game.get_player_ids()
+            return 200, {'status': 'OK', 'players': players}
+        
+        elif path == '/api/maze':
+            encoding = params.get('encoding', ['rows'])[0]
+            return 200, {'status': 'OK', 'maze': maze_grid.maze_info_as(self.game.get_maze_info(), encoding)}
+        
+        elif path == '/api/player/face':
+            player_id = params.get('id', [''])[0]
+            if player_id and player_id in self.game.players:
+                return 200, {'status': 'OK', 'face': self.game.players[player_id]['avatar']}
+            else:
+                return 404, {'status': 'ERROR', 'message': 'Player not found'}
+        
+        elif path == '/api/player/location':
+            player_id = params.get('id', [''])[0]
+            pos = self.game.get_player_position(player_id)
+            if pos:
+                location = f"{pos['x']},{pos['y']}"
+                return 200, {'status': 'OK', 'location': location}
+            else:
+                return 404, {'status': 'ERROR', 'message': 'Player not found'}
+        
+        elif path == '/api/gamestate':
+            since = params.get('since', [''])[0]
+            if since:
+                try:
+                    since = int(since)
+                except ValueError:
+                    return 400, {'status': 'ERROR', 'message': 'since must be a state version number'}
+                game_state = self.game.get_game_state_delta(since)
+            else:
+                game_state = self.game.get_game_state()
+            return 200, {'status': 'OK', 'game_state': game_state}
+        
+        else:
+            return 404, {'status': 'ERROR', 'message': 'Unknown endpoint'}
+
+    def generates_maze(self, request):
+        """Whether request may build a maze (new room, reset), which takes a while for big ones"""
+        method, _, rest = request.request_line.partition(' ')
+        path = rest.split(' ', 1)[0].partition('?')[0]
+        if method != 'POST':
+            return False
+        if path == '/api/batch':
+            return '/api/game/reset' in request.body
+        return path in ('/api/room/create', '/api/game/reset')
+
+    def admin_allowed(self, headers):
+        """Loopback clients, or a matching X-Admin-Token when --admin-token is set"""
+        token = self.get_header(headers, 'X-Admin-Token')
+        if token and self.admin_token:
+            return hmac.compare_digest(token.encode(), self.admin_token.encode())
+        if self.forwarded or not self.client_address:
+            return False
+        try:
+            return ipaddress.ip_address(self.client_address[0]).is_loopback
+        except ValueError:
+            return False
+
+    def admin_get(self, path, params, headers):
+        """Profiler results: sampling window (/api/admin/profile) and per-request cProfile"""
+        if not self.admin_allowed(headers):
+            return self.create_json_response({'status': 'ERROR', 'message': 'Forbidden'}, 403, 'Forbidden')
+        try:
+            top = self.admin_number(params, 'top', 20)
+        except ValueError as e:
+            return self.create_json_response({'status': 'ERROR', 'message': str(e)}, 400)
+        output = params.get('format', ['json'])[0]
+        if path == '/api/admin/profile':
+            if output == 'collapsed':
+                return self.body_response(200, 'OK', maze_profiler.sampler.collapsed().encode(),
+                                          {'Content-Type': 'text/plain; charset=utf-8'})
+            return self.create_json_response({'status': 'OK', 'profile': maze_profiler.sampler.to_dict(top)})
+        elif path == '/api/admin/profile/requests':
+            sort = params.get('sort', ['cumulative'])[0]
+            if output == 'text':
+                return self.body_response(200, 'OK', maze_profiler.request_profiler.text(top, sort).encode(),
+                                          {'Content-Type': 'text/plain; charset=utf-8'})
+            return self.create_json_response({'status': 'OK',
+                                              'profile': maze_profiler.request_profiler.to_dict(top, sort)})
+        return self.create_json_response({'status': 'ERROR', 'message': 'Unknown endpoint'}, 404)
+
+    def admin_post(self, path, data, headers):
+        """Start/stop the sampling profiler, switch per-request cProfile on or off"""
+        if not self.admin_allowed(headers):
+            return self.create_json_response({'status': 'ERROR', 'message': 'Forbidden'}, 403, 'Forbidden')
+        sampler = maze_profiler.sampler
+        try:
+            if path == '/api/admin/profile/start':
+                duration = self.admin_number(data, 'duration', 10.0)
+                interval = self.admin_number(data, 'interval', 0.005)
+                if not sampler.start(duration, interval, bool(data.get('idle'))):
+                    return self.create_json_response({'status': 'ERROR', 'message': 'Profiler already running'},
+                                                     409, 'Conflict')
+                return self.create_json_response({'status': 'OK', 'profile': sampler.to_dict(0)})
+            elif path == '/api/admin/profile/stop':
+                top = self.admin_number(data, 'top', 20)
+                sampler.stop()
+                return self.create_json_response({'status': 'OK', 'profile': sampler.to_dict(top)})
+            elif path == '/api/admin/profile/requests':
+                maze_profiler.request_profiler.configure(self.admin_number(data, 'every', 0),
+                                                         self.admin_number(data, 'limit', 1000))
+                return self.create_json_response({'status': 'OK',
+                                                  'profile': maze_profiler.request_profiler.to_dict(0)})
+        except ValueError as e:
+            return self.create_json_response({'status': 'ERROR', 'message': str(e)}, 400)
+        return self.create_json_response({'status': 'ERROR', 'message': 'Unknown endpoint'}, 404)
+
+    @staticmethod
+    def admin_number(source, name, default):
+        """Numeric admin parameter from a query dict or JSON body, of default's type; ValueError if unusable"""
+        value = source.get(name, default)
+        if isinstance(value, list):  # Query string values
+            value = value[0]
+        kind = 'an integer' if isinstance(default, int) else 'a number'
+        try:
+            value = type(default)(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'{name} must be {kind}')
+        if not math.isfinite(value):
+            raise ValueError(f'{name} must be {kind}')
+        return value
+
+    def select_room(self, room_id):
+        """Point self.game at the named room (the default one if empty), False if unknown"""
+        room_id = room_id or RoomRegistry.default_room
+        # Pre-fork mode: another worker's room is never served here, even
+        # when a request for it arrives unforwarded
+        if not self.rooms.is_owned(room_id):
+            return False
+        room = self.rooms.get(room_id)
+        if room is None:
+            return False
+        self.room = room
+        self.game = room.game
+        return True
+
+    def gamestate_response(self):
+        """Full /api/gamestate response, encoded (and compressed) once per state version and shared by all pollers"""
+        # Read the version before building: a change racing with the encode
+        # then only makes the cached bytes newer than their key, never older
+        snapshot = self.game.snapshot
+        key = (snapshot.version, int(time.time() - snapshot.game_start_time))
+        variant = (self.keep_alive, self.keep_alive_timeout, self.keep_alive_max, self.content_encoding)
+        with self.game.cache_lock:
+            cached = self.game.cache.get('gamestate')
+            if cached is None or cached[0] != key:
+                body = json.dumps({'status': 'OK', 'game_state': self.game.get_game_state()}).encode()
+                cached = (key, body, {}, {})
+                self.game.cache['gamestate'] = cached
+            _, body, responses, compressed = cached
+            if variant not in responses:
+                responses[variant] = self.response_buffers(200, 'OK', body, {'Content-Type': 'application/json'},
+                                                           compressed)
+            return responses[variant]
+
+    def cached_json_response(self, key, request_headers, build):
+        """JSON resource that only changes on reset or join: encoded and hashed once, then 200/304"""
+        cached = self.game.cache.get(key)
+        if cached is None:
+            body = json.dumps(build()).encode()
+            etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+            cached = self.game.cache[key] = (etag, body, {})
+        etag, body, compressed = cached
+        return self.etag_response(etag, body, {'Content-Type': 'application/json'}, request_headers, compressed)
+
     def http_post(self, object_address, headers, body):
         """Handle POST requests for maze game"""
         try:
@@ -76,36 +757,24 @@ class MazeHttpServer(HttpServer):
                 data = json.loads(body)
             else:
                 data = {}
+            if not isinstance(data, dict):
+                return self.create_json_response({'status': 'ERROR', 'message': 'JSON body must be an object'}, 400)
 
-            if object_address == '/api/player/add':
-                player_id = data.get('player_id', '')
-                player_name = data.get('player_name', 'Unknown')
-                
-                if not player_id:
-                    return self.create_json_response({'status': 'ERROR', 'message': 'Player ID required'}, 400)
-                
-                self.game.add_player(player_id, player_name)
-                return self.create_json_response({'status': 'OK', 'message': 'Player added'})
-            
-            elif object_address == '/api/player/move':
-                player_id = data.get('player_id', '')
-                x = data.get('x', 0)
-                y = data.get('y', 0)
-                
-                if not player_id:
-                    return self.create_json_response({'status': 'ERROR', 'message': 'Player ID required'}, 400)
-                
-                if self.game.move_player(player_id, x, y):
-                    return self.create_json_response({'status': 'OK', 'message': 'Position updated'})
-                else:
-                    return self.create_json_response({'status': 'ERROR', 'message': 'Invalid position'}, 400)
-            
-            elif object_address == '/api/game/reset':
-                self.game.reset_game()
-                return self.create_json_response({'status': 'OK', 'message': 'Game reset'})
-            
+            path, _, query_string = object_address.partition('?')
+            params = urllib.parse.parse_qs(query_string)
+            if path.startswith('/api/admin/'):
+                return self.admin_post(path, data, headers)
+            if path == '/api/room/create':
+                code, payload = self.api_create_room(data.get('room') or params.get('room', [None])[0], data)
+                return self.create_json_response(payload, code)
+            if not self.select_room(params.get('room', [''])[0] or data.get('room', '')):
+                return self.create_json_response({'status': 'ERROR', 'message': 'Room not found'}, 404)
+
+            if path == '/api/batch':
+                code, payload = self.api_batch(data)
             else:
-                return self.create_json_response({'status': 'ERROR', 'message': 'Unknown endpoint'}, 404)
+                code, payload = self.api_post(path, data)
+            return self.create_json_response(payload, code)
                 
         except json.JSONDecodeError:
             return self.create_json_response({'status': 'ERROR', 'message': 'Invalid JSON'}, 400)
@@ -113,96 +782,701 @@ class MazeHttpServer(HttpServer):
             logging.error(f"Error in POST request: {e}")
             return self.create_json_response({'status': 'ERROR', 'message': str(e)}, 500)
 
-class ProcessTheClient(threading.Thread):
-    def __init__(self, connection, address):
+    def api_post(self, path, data):
+        """JSON POST endpoints, returns (status code, payload)"""
+        if path == '/api/player/add':
+            player_id = data.get('player_id', '')
+            player_name = data.get('player_name', 'Unknown')
+            
+            if not player_id:
+                return 400, {'status': 'ERROR', 'message': 'Player ID required'}
+            
+            created = self.game.add_player(player_id, player_name)
+            token = self.game.get_session_token(player_id)
+            # Player ids are public (/api/players): the UDP session token of an
+            # existing player only goes to whoever already holds it
+            if not created and not hmac.compare_digest(str(data.get('token', '')).encode(), token.encode()):
+                return 409, {'status': 'ERROR', 'message': 'Player ID already in use'}
+            payload = {'status': 'OK', 'message': 'Player added' if created else 'Player rejoined', 'token': token}
+            if udp_server:
+                udp_server.register(self.room, player_id, token)
+                payload['udp_port'] = udp_server.port
+            return 200, payload
+        
+        elif path == '/api/player/move':
+            player_id = data.get('player_id', '')
+            
+            if not player_id:
+                return 400, {'status': 'ERROR', 'message': 'Player ID required'}
+            if self.game.get_player_position(player_id) is None:
+                return 404, {'status': 'ERROR', 'message': 'Player not found'}
+            
+            # Either an absolute position or a step (dx/dy) from the server's position
+            if 'dx' in data or 'dy' in data:
+                moved = self.game.move_player_by(player_id, data.get('dx', 0), data.get('dy', 0))
+            else:
+                moved = self.game.move_player(player_id, data.get('x', 0), data.get('y', 0))
+            
+            pos = self.game.get_player_position(player_id)
+            if moved:
+                return 200, {'status': 'OK', 'message': 'Position updated', 'x': pos['x'], 'y': pos['y']}
+            else:
+                return 400, {'status': 'ERROR', 'message': 'Invalid position', 'x': pos['x'], 'y': pos['y']}
+        
+        elif path == '/api/player/input':
+            player_id = data.get('player_id', '')
+            
+            if not player_id:
+                return 400, {'status': 'ERROR', 'message': 'Player ID required'}
+            if simulation is None:
+                return 409, {'status': 'ERROR', 'message': 'Simulation disabled, use /api/player/move'}
+            if not self.game.queue_input(player_id, data.get('dx', 0), data.get('dy', 0)):
+                return 404, {'status': 'ERROR', 'message': 'Player not found'}
+            # Applied by the next tick, the result arrives as a 'tick' event
+            return 202, {'status': 'OK', 'message': 'Input queued'}
+        
+        elif path == '/api/game/reset':
+            self.game.reset_game()
+            return 200, {'status': 'OK', 'message': 'Game reset'}
+        
+        else:
+            return 404, {'status': 'ERROR', 'message': 'Unknown endpoint'}
+
+    def api_create_room(self, room_id, data=None):
+        """Create a room (a random id if none is given); creating an existing one just returns it
+
+        width, height and cell_size in the body size the new room's maze,
+        the server's --maze-* options otherwise.
+        """
+        if room_id is not None and not RoomRegistry.room_id_pattern.match(str(room_id)):
+            return 400, {'status': 'ERROR', 'message': 'Room id must be 1-32 letters, digits, _ or -'}
+        maze_options = {key: (data or {})[key] for key in ('width', 'height', 'cell_size') if key in (data or {})}
+        try:
+            width, height, _ = MazeGame.check_dimensions(**dict(self.rooms.maze_options, **maze_options))
+        except (TypeError, ValueError) as e:
+            return 400, {'status': 'ERROR', 'message': str(e)}
+        if max(width, height) > self.rooms.max_maze_side:
+            return 400, {'status': 'ERROR',
+                         'message': f'Maze sides are limited to {self.rooms.max_maze_side} cells'}
+        if room_id is not None and not self.rooms.is_owned(str(room_id)):
+            return 421, {'status': 'ERROR', 'message': 'Room belongs to another worker'}
+        room, created = self.rooms.create(room_id, maze_options)
+        if room is None:
+            return 503, {'status': 'ERROR', 'message': 'Room limit reached'}
+        return 200, {'status': 'OK', 'room': room.room_id, 'created': created,
+                     'maze_width': room.game.maze_width, 'maze_height': room.game.maze_height}
+
+    def api_batch(self, data):
+        """Run an ordered list of API operations and return every result in one response
+
+        Body: {"operations": [{"method": "POST", "path": "/api/player/move",
+        "body": {...}}, {"method": "GET", "path": "/api/player/location",
+        "params": {"id": "..."}}, ...]}. Operations run in order; a failing
+        one does not stop the rest.
+        """
+        operations = data.get('operations')
+        if not isinstance(operations, list):
+            return 400, {'status': 'ERROR', 'message': 'operations list required'}
+        if len(operations) > self.max_batch_operations:
+            return 413, {'status': 'ERROR',
+                         'message': f'At most {self.max_batch_operations} operations per batch'}
+
+        results = []
+        for operation in operations:
+            if not isinstance(operation, dict):
+                results.append({'status': 'ERROR', 'message': 'Operation must be an object', 'code': 400})
+                continue
+            method = str(operation.get('method', 'GET')).upper()
+            path = str(operation.get('path', ''))
+            params = operation.get('params', {})
+            body = operation.get('body', {})
+            try:
+                if path == '/api/batch':
+                    code, payload = 400, {'status': 'ERROR', 'message': 'Nested batch not allowed'}
+                elif not isinstance(params, dict) or not isinstance(body, dict):
+                    code, payload = 400, {'status': 'ERROR', 'message': 'params and body must be objects'}
+                elif method == 'GET':
+                    code, payload = self.api_get(path, {k: [str(v)] for k, v in params.items()})
+                elif method == 'POST':
+                    code, payload = self.api_post(path, body)
+                else:
+                    code, payload = 400, {'status': 'ERROR', 'message': 'Bad method'}
+            except Exception as e:
+                logging.error(f"Error in batch operation {path}: {e}")
+                code, payload = 500, {'status': 'ERROR', 'message': str(e)}
+            payload['code'] = code
+            results.append(payload)
+        return 200, {'status': 'OK', 'results': results}
+
+class ClientConnection:
+    """A threaded-engine client connection and the request state it keeps between workers
+
+    An idle keep-alive connection waits for its next request in
+    KeepAliveParking rather than in a worker, so the next request on it may
+    be served by any worker of the pool.
+    """
+    def __init__(self, connection, address, keep_alive_timeout, max_requests, forwarded=False):
         self.connection = connection
         self.address = address
-        threading.Thread.__init__(self)
+        self.parser = RequestParser()
+        self.maze_server = MazeHttpServer()
+        self.maze_server.keep_alive_timeout = keep_alive_timeout
+        self.maze_server.keep_alive_max = max_requests
+        self.maze_server.client_address = address
+        self.maze_server.forwarded = forwarded
+        self.handled = 0
+        self.peers = maze_shard.PeerConnections(shards) if shards else None
+        metrics.connection_opened()
+
+    def close(self, close_socket=True):
+        if self.peers:
+            self.peers.close()
+        if close_socket:
+            self.connection.close()
+        metrics.connection_closed()
+
+class ProcessTheClient(threading.Thread):
+    """Pool worker: serves queued connections for the server's lifetime
+
+    A worker serves whatever requests a connection has ready, then parks it
+    and moves on: it never waits for a client to send its next request.
+    """
+    # Persistent connection limits: seconds a connection may sit idle between
+    # requests and the number of requests served before it is closed
+    keep_alive_timeout = 15
+    max_requests = 100
+    # Forwarded upgrades and streams piped on threads of their own; past
+    # this many the worker pipes the connection itself
+    max_pipes = 256
+    pipe_slots = threading.BoundedSemaphore(max_pipes)
+
+    def __init__(self, connections, parking, forwarded=False):
+        self.connections = connections
+        self.parking = parking
+        # True while serving a connection, for the sampling profiler
+        self.busy = False
+        # Serves the private port other workers forward requests to
+        self.forwarded = forwarded
+        self.connection = None
+        self.address = None
+        threading.Thread.__init__(self, daemon=True)
 
     def run(self):
-        rcv = ""
-        maze_server = MazeHttpServer()
-        
+        while True:
+            self.connection, self.address, client = self.connections.get()
+            self.busy = True
+            try:
+                if client is None:
+                    client = ClientConnection(self.connection, self.address, self.keep_alive_timeout,
+                                              self.max_requests, self.forwarded)
+                self.handle(client)
+            finally:
+                self.busy = False
+                self.connection = None
+                self.address = None
+
+    def handle(self, client):
+        parser = client.parser
+        maze_server = client.maze_server
+        parked = False
+        handed_off = False
+
         try:
             while True:
-                data = self.connection.recv(1024)
-                if data:
-                    d = data.decode()
-                    rcv = rcv + d
-                    
-                    # Check if we have complete HTTP request
-                    if "\r\n\r\n" in rcv:
-                        logging.warning("Request from client: {}".format(rcv.split('\r\n')[0]))
-                        hasil = maze_server.proses(rcv)
-                        logging.warning("Response sent to client")
-                        self.connection.sendall(hasil)
-                        rcv = ""
+                # Serve every complete (possibly pipelined) request already buffered
+                try:
+                    request = parser.next_request()
+                except RequestError as e:
+                    metrics.request_rejected()
+                    self.connection.sendall(maze_server.request_error_response(e))
+                    break
+                if request is None:
+                    # Take only what has already arrived; a client that has
+                    # nothing more to say waits in the parking selector
+                    self.connection.setblocking(False)
+                    try:
+                        data = self.connection.recv(4096)
+                    except BlockingIOError:
+                        self.parking.add(self.connection, client)
+                        parked = True
                         break
-                else:
+                    self.connection.settimeout(self.keep_alive_timeout)
+                    if not data:
+                        break
+                    parser.feed(data)
+                    continue
+
+                client.handled += 1
+                owner = shards.route(request.raw) if shards and not maze_server.forwarded else None
+                if owner is not None:
+                    # Room owned by another worker process: relay its answer
+                    try:
+                        hasil, peer, open_ended, close = client.peers.forward(owner, request.raw)
+                    except OSError as e:
+                        logging.warning(f"Forward to worker {owner} failed: {e}")
+                        send_buffers(self.connection, maze_server.create_json_response(
+                            {'status': 'ERROR', 'message': 'Room worker unavailable'}, 502, 'Bad Gateway'))
+                        break
+                    self.connection.sendall(hasil)
+                    if open_ended:
+                        # Upgrades and streams: piped on a thread of their own
+                        # while slots are left, by this worker otherwise
+                        if self.pipe_slots.acquire(blocking=False):
+                            threading.Thread(target=self.pipe, args=(self.connection, peer, parser.rest()),
+                                             daemon=True).start()
+                            handed_off = True
+                        else:
+                            maze_shard.pipe(self.connection, peer, parser.rest())
+                        break
+                    if close:
+                        break
+                    continue
+
+                maze_server.allow_keep_alive = client.handled < self.max_requests
+                started = time.perf_counter()
+                hasil = maze_server.handle_request(request)
+                send_buffers(self.connection, hasil)
+                metrics.record_request(request, hasil, started)
+                if access_log.sampled():
+                    access_log.record(self.address, request.request_line, hasil, started, 'threaded')
+                if maze_server.binary_session:
+                    # Records that came with the upgrade, then the selector
+                    # thread serves the connection so the worker is free again
+                    replies = maze_server.binary_session.feed(parser.rest())
+                    if replies:
+                        self.connection.sendall(replies)
+                    binary_sessions.add(self.connection, maze_server.binary_session)
+                    handed_off = True
+                    break
+                if maze_server.stream_requested:
+                    # The broadcaster owns the socket from here on
+                    maze_server.stream_requested.subscribe(SocketStreamSink(self.connection))
+                    handed_off = True
+                    break
+                if not maze_server.keep_alive:
                     break
         except Exception as e:
-            logging.warning(f"Client error: {e}")
+            connection_log.warning("Client error: %s", e)
         finally:
-            self.connection.close()
+            if not parked:
+                client.close(close_socket=not handed_off)
+
+    def pipe(self, connection, peer, pending):
+        try:
+            maze_shard.pipe(connection, peer, pending)
+        finally:
+            self.pipe_slots.release()
+
+def print_banner(port, engine):
+    if shards and shards.index:
+        return  # Pre-fork: worker 0 speaks for all of them
+    logging.warning(f"Maze HTTP server started on port {port} ({engine} engine)")
+    print(f"Maze HTTP Server running on port {port} ({engine} engine)")
+    print("Game endpoints available:")
+    print(f"   GET  http://localhost:{port}/api/status")
+    print(f"   GET  http://localhost:{port}/api/rooms")
+    print(f"   POST http://localhost:{port}/api/room/create")
+    print(f"   GET  http://localhost:{port}/api/maze")
+    print(f"   GET  http://localhost:{port}/api/gamestate")
+    print(f"   GET  http://localhost:{port}/api/stream  (Server-Sent Events)")
+    print(f"   GET  http://localhost:{port}/api/metrics  (Prometheus text, ?format=json)")
+    print(f"   POST http://localhost:{port}/api/admin/profile/start  (profiler, local or --admin-token)")
+    print(f"   POST http://localhost:{port}/api/player/add")
+    print(f"   POST http://localhost:{port}/api/player/move")
+    print("   (every /api call takes ?room=<id>, default room if omitted)")
+    print(f"   GET  http://localhost:{port}/<file>  (from {HttpServer.static_files.root})")
+    if shards:
+        print(f"{shards.count} worker processes, rooms forwarded over ports "
+              f"{shards.base_port}-{shards.base_port + shards.count - 1}")
+    if simulation:
+        print(f"   POST http://localhost:{port}/api/player/input  ({simulation.tick_rate} Hz ticks)")
+    if udp_server:
+        ports = f"{udp_server.port}-{udp_server.port + shards.count - 1}" if shards else udp_server.port
+        print(f"   UDP  moves, inputs and position pushes on port {ports} (token from /api/player/add)")
+
+def print_bind_error(port, e):
+    if e.errno == 98:  # Address already in use
+        print(f"ERROR: Port {port} is already in use!")
+        print("\nSolutions:")
+        print(f"1. Kill existing server: sudo lsof -i :{port}")
+        print("2. Wait a few minutes and try again")
+        print("3. Use different port")
+    else:
+        print(f"Server error: {e}")
+
+def listen_socket(host, port, backlog, reuse_port=False):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
 
 class MazeServer(threading.Thread):
-    def __init__(self, port=55556):
+    def __init__(self, port=55556, workers=32, queue_size=64, backlog=128, reuse_port=False, shard_port=None):
         self.port = port
-        self.the_clients = []
-        self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.backlog = backlog
+        # Pre-fork mode: share the public port with the other worker
+        # processes and accept forwarded requests on a private one
+        self.reuse_port = reuse_port
+        self.shard_port = shard_port
+        # Accepted connections wait here for one of the fixed pool workers;
+        # when it is full new connections are turned away with a 503
+        self.connections = queue.Queue(maxsize=queue_size)
+        self.parking = KeepAliveParking(self.connections, self.reject, ProcessTheClient.keep_alive_timeout)
+        self.the_clients = [ProcessTheClient(self.connections, self.parking) for _ in range(workers)]
+        # Requests forwarded by the other workers get a pool of their own. A
+        # forwarded connection lives as long as the client connection behind
+        # it; in the public pool, two workers whose pools filled up with
+        # connections forwarding to each other would each wait for the other.
+        # Every public worker may hold one connection to each peer.
+        self.peer_connections = queue.Queue(maxsize=queue_size) if shard_port else None
+        peer_workers = workers * max(1, shards.count - 1) if shard_port and shards else workers
+        self.peer_parking = KeepAliveParking(self.peer_connections, self.reject,
+                                             ProcessTheClient.keep_alive_timeout) if shard_port else None
+        self.peer_clients = [ProcessTheClient(self.peer_connections, self.peer_parking, forwarded=True)
+                             for _ in range(peer_workers)] if shard_port else []
+        self.busy_response = join_buffers(MazeHttpServer().create_json_response(
+            {'status': 'ERROR', 'message': 'Server busy, try again'}, 503, 'Service Unavailable'))
         threading.Thread.__init__(self)
 
     def run(self):
         try:
-            self.my_socket.bind(('0.0.0.0', self.port))
-            self.my_socket.listen(10)
-            logging.warning(f"Maze HTTP server started on port {self.port}")
-            print(f"Maze HTTP Server running on port {self.port}")
-            print("Game endpoints available:")
-            print(f"   GET  http://localhost:{self.port}/api/status")
-            print(f"   GET  http://localhost:{self.port}/api/gamestate")
-            print(f"   POST http://localhost:{self.port}/api/player/add")
-            print(f"   POST http://localhost:{self.port}/api/player/move")
+            self.my_socket = listen_socket('0.0.0.0', self.port, self.backlog, self.reuse_port)
+            if self.shard_port:
+                shard_socket = listen_socket('127.0.0.1', self.shard_port, self.backlog)
+            print_banner(self.port, 'threaded')
         except OSError as e:
-            if e.errno == 98:  # Address already in use
-                print(f"ERROR: Port {self.port} is already in use!")
-                print("\nSolutions:")
-                print(f"1. Kill existing server: sudo lsof -i :{self.port}")
-                print("2. Wait a few minutes and try again")
-                print("3. Use different port")
-                return
-            else:
-                print(f"Server error: {e}")
-                return
-        
+            print_bind_error(self.port, e)
+            return
+
+        for clt in self.the_clients + self.peer_clients:
+            clt.start()
+        if self.shard_port:
+            threading.Thread(target=self.accept_loop, args=(shard_socket, self.peer_connections),
+                             daemon=True).start()
+        self.accept_loop(self.my_socket, self.connections)
+
+    def accept_loop(self, listener, connections):
         while True:
             try:
-                self.connection, self.client_address = self.my_socket.accept()
-                logging.warning("Connection from {}".format(self.client_address))
-                
-                clt = ProcessTheClient(self.connection, self.client_address)
-                clt.start()
-                self.the_clients.append(clt)
+                connection, client_address = listener.accept()
+                connection_log.info("Connection from %s", client_address)
+
+                try:
+                    connections.put_nowait((connection, client_address, None))
+                except queue.Full:
+                    self.reject(connection, client_address)
             except Exception as e:
                 logging.warning(f"Accept error: {e}")
 
+    def reject(self, connection, client_address):
+        """Answer an overflow connection with 503 without blocking the accept loop"""
+        connection_log.warning("Server busy, rejecting %s", client_address)
+        try:
+            connection.setblocking(False)
+            connection.send(self.busy_response)
+            connection.shutdown(socket.SHUT_WR)
+            # Drain whatever request already arrived so close() does not send RST
+            connection.recv(65536)
+        except OSError:
+            pass
+        finally:
+            connection.close()
+
+class AsyncMazeServer(threading.Thread):
+    """Event loop engine: every connection is a coroutine on one thread"""
+    keep_alive_timeout = ProcessTheClient.keep_alive_timeout
+    max_requests = ProcessTheClient.max_requests
+
+    def __init__(self, port=55556, backlog=128, reuse_port=False, shard_port=None):
+        self.port = port
+        self.backlog = backlog
+        self.reuse_port = reuse_port
+        self.shard_port = shard_port
+        threading.Thread.__init__(self)
+
+    def run(self):
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        try:
+            server = await asyncio.start_server(self.handle_client, '0.0.0.0', self.port,
+                                                reuse_address=True, reuse_port=self.reuse_port or None,
+                                                backlog=self.backlog)
+            if self.shard_port:
+                await asyncio.start_server(self.handle_peer, '127.0.0.1', self.shard_port,
+                                           reuse_address=True, backlog=self.backlog)
+        except OSError as e:
+            print_bind_error(self.port, e)
+            return
+        print_banner(self.port, 'asyncio')
+
+        async with server:
+            await server.serve_forever()
+
+    async def handle_peer(self, reader, writer):
+        """Connection on the private port, from another worker forwarding requests"""
+        await self.handle_client(reader, writer, forwarded=True)
+
+    async def handle_client(self, reader, writer, forwarded=False):
+        """Same request loop as ProcessTheClient.run, with awaits instead of blocking calls"""
+        connection_log.info("Connection from %s", writer.get_extra_info('peername'))
+        parser = RequestParser()
+        maze_server = MazeHttpServer()
+        maze_server.keep_alive_timeout = self.keep_alive_timeout
+        maze_server.keep_alive_max = self.max_requests
+        handled = 0
+        maze_server.client_address = writer.get_extra_info('peername')
+        maze_server.forwarded = forwarded
+        peers = maze_shard.AsyncPeerConnections(shards) if shards else None
+        metrics.connection_opened()
+
+        try:
+            while True:
+                try:
+                    request = parser.next_request()
+                except RequestError as e:
+                    metrics.request_rejected()
+                    writer.write(maze_server.request_error_response(e))
+                    await writer.drain()
+                    break
+                if request is None:
+                    try:
+                        data = await asyncio.wait_for(reader.read(4096), self.keep_alive_timeout)
+                    except asyncio.TimeoutError:
+                        break  # Idle connection
+                    if not data:
+                        break
+                    parser.feed(data)
+                    continue
+
+                handled += 1
+                owner = shards.route(request.raw) if shards and not forwarded else None
+                if owner is not None:
+                    try:
+                        hasil, peer, open_ended, close = await peers.forward(owner, request.raw)
+                    except (OSError, asyncio.TimeoutError) as e:
+                        logging.warning(f"Forward to worker {owner} failed: {e}")
+                        await write_buffers(writer, maze_server.create_json_response(
+                            {'status': 'ERROR', 'message': 'Room worker unavailable'}, 502, 'Bad Gateway'))
+                        break
+                    writer.write(hasil)
+                    await writer.drain()
+                    if open_ended:
+                        await maze_shard.async_pipe((reader, writer), peer, parser.rest())
+                        break
+                    if close:
+                        break
+                    continue
+
+                maze_server.allow_keep_alive = handled < self.max_requests
+                started = time.perf_counter()
+                if maze_server.generates_maze(request):
+                    # Generating a big maze would stall every connection on the loop
+                    hasil = await asyncio.get_running_loop().run_in_executor(None, maze_server.handle_request,
+                                                                             request)
+                else:
+                    hasil = maze_server.handle_request(request)
+                await write_buffers(writer, hasil)
+                metrics.record_request(request, hasil, started)
+                if access_log.sampled():
+                    access_log.record(writer.get_extra_info('peername'), request.request_line, hasil, started,
+                                      'asyncio')
+                if maze_server.binary_session:
+                    await self.serve_binary(maze_server.binary_session, parser.rest(), reader, writer)
+                    break
+                if maze_server.stream_requested:
+                    room_stream = maze_server.stream_requested
+                    sink = AsyncStreamSink(asyncio.get_running_loop(), writer)
+                    room_stream.subscribe(sink)
+                    # Hold the connection until the subscriber goes away
+                    while await reader.read(4096):
+                        pass
+                    room_stream.unsubscribe(sink)
+                    break
+                if not maze_server.keep_alive:
+                    break
+        except Exception as e:
+            connection_log.warning("Client error: %s", e)
+        finally:
+            if peers:
+                peers.close()
+            writer.close()
+            metrics.connection_closed()
+
+    async def serve_binary(self, session, data, reader, writer):
+        while True:
+            if data:
+                replies = session.feed(data)
+                if replies:
+                    writer.write(replies)
+                    await writer.drain()
+            try:
+                data = await asyncio.wait_for(reader.read(4096), self.keep_alive_timeout)
+            except asyncio.TimeoutError:
+                return
+            if not data:
+                return
+
+ENGINES = {
+    'threaded': MazeServer,
+    'asyncio': AsyncMazeServer,
+}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Maze game HTTP server")
+    parser.add_argument('port', nargs='?', type=int, default=55556,
+                        help="TCP port to listen on (default: 55556)")
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='threaded',
+                        help="connection handling engine (default: threaded)")
+    parser.add_argument('--workers', type=int, default=32,
+                        help="threaded engine: fixed number of worker threads (default: 32)")
+    parser.add_argument('--queue-size', type=int, default=64,
+                        help="threaded engine: accepted connections waiting for a worker "
+                             "before new ones get 503 (default: 64)")
+    parser.add_argument('--backlog', type=int, default=128,
+                        help="listen() backlog (default: 128)")
+    parser.add_argument('--tick-rate', type=int, default=30,
+                        help="server movement ticks per second for /api/player/input, "
+                             "0 disables the simulation (default: 30)")
+    parser.add_argument('--processes', type=int, default=1,
+                        help="pre-fork worker processes sharing the port through SO_REUSEPORT; "
+                             "each room lives in one of them (default: 1)")
+    parser.add_argument('--shard-port', type=int, default=None,
+                        help="first private port workers use to forward requests for rooms "
+                             "they do not own, one per worker (default: port + 1000)")
+    parser.add_argument('--static-root', default='static',
+                        help="directory served for GET paths outside /api (default: ./static)")
+    parser.add_argument('--access-sample', type=float, default=0.01,
+                        help="fraction of requests written to the access log (default: 0.01)")
+    parser.add_argument('--connection-sample', type=float, default=0.01,
+                        help="fraction of connects logged (default: 0.01)")
+    parser.add_argument('--log-rate-limit', type=int, default=100,
+                        help="most log records per second in each category, 0 for no limit (default: 100)")
+    parser.add_argument('--udp-port', type=int, default=0,
+                        help="also take moves and push positions over UDP on this port; "
+                             "pre-fork worker i uses port + i (default: 0, disabled)")
+    parser.add_argument('--maze-width', type=int, default=21,
+                        help="maze width in cells, odd, for the default room and rooms created "
+                             "without one (default: 21)")
+    parser.add_argument('--maze-height', type=int, default=15,
+                        help="maze height in cells, odd (default: 15)")
+    parser.add_argument('--cell-size', type=int, default=30,
+                        help="pixels per maze cell (default: 30)")
+    parser.add_argument('--max-maze-size', type=int, default=101,
+                        help="largest width or height POST /api/room/create may ask for; bigger mazes "
+                             "take seconds to generate, raise it to allow them (default: 101)")
+    parser.add_argument('--admin-token', default=None,
+                        help="also accept /api/admin requests (profiler) from other hosts "
+                             "when they send this X-Admin-Token (default: loopback only)")
+    args = parser.parse_args(argv)
+    try:
+        MazeGame.check_dimensions(args.maze_width, args.maze_height, args.cell_size)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.shard_port is None:
+        args.shard_port = args.port + 1000
+    return args
+
+def build_server(args, reuse_port=False, shard_port=None):
+    if args.engine == 'threaded':
+        return MazeServer(args.port, args.workers, args.queue_size, args.backlog, reuse_port, shard_port)
+    return ENGINES[args.engine](args.port, args.backlog, reuse_port, shard_port)
+
+def configure_mazes(args):
+    """Maze size of the default room and of rooms created without their own (--maze-*)"""
+    rooms.maze_options = {'width': args.maze_width, 'height': args.maze_height, 'cell_size': args.cell_size}
+    rooms.max_maze_side = max(args.max_maze_size, args.maze_width, args.maze_height)
+    room = rooms.rooms[RoomRegistry.default_room]
+    if (room.game.maze_width, room.game.maze_height, room.game.cell_size) != (
+            args.maze_width, args.maze_height, args.cell_size):
+        room.close()
+        rooms.rooms[RoomRegistry.default_room] = Room(RoomRegistry.default_room, MazeGame(**rooms.maze_options))
+
+# Threads the sampling profiler looks at (/api/admin/profile/start)
+maze_profiler.SamplingProfiler.thread_types = (ProcessTheClient, AsyncMazeServer)
+
+def setup_logging(args):
+    maze_log.setup(args.access_sample, args.connection_sample, args.log_rate_limit)
+
+def run_worker(index, args):
+    """Body of pre-fork worker process `index`: serve the port, own a share of the rooms"""
+    global shards
+    setup_logging(args)  # The listener thread does not survive the fork
+    shards = maze_shard.ShardMap(args.processes, index, args.shard_port, RoomRegistry.default_room)
+    metrics.labels['worker'] = str(index)
+    rooms.owns = shards.is_local
+    if args.tick_rate > 0:
+        start_simulation(args.tick_rate)
+    if args.udp_port:
+        start_udp(args.udp_port + index)  # Players learn their room owner's port on join
+
+    svr = build_server(args, reuse_port=True, shard_port=shards.peer_address(index)[1])
+    svr.start()
+    try:
+        svr.join()
+    except KeyboardInterrupt:
+        return
+    sys.exit(1)  # The server thread only returns when it could not bind
+
+def run_prefork(args):
+    """Start the worker processes and restart any that dies (its rooms start over)"""
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        print("ERROR: --processes needs SO_REUSEPORT, not available on this platform")
+        sys.exit(1)
+
+    context = multiprocessing.get_context('fork')
+    workers = {}
+
+    def spawn(index):
+        workers[index] = context.Process(target=run_worker, args=(index, args), daemon=True)
+        workers[index].start()
+
+    for index in range(args.processes):
+        spawn(index)
+    try:
+        while True:
+            time.sleep(1)
+            for index, worker in list(workers.items()):
+                if worker.is_alive():
+                    continue
+                if worker.exitcode == 1:
+                    print(f"Worker {index} could not start, stopping")
+                    raise KeyboardInterrupt
+                logging.warning(f"Worker {index} exited ({worker.exitcode}), restarting it")
+                spawn(index)
+    except KeyboardInterrupt:
+        for worker in workers.values():
+            worker.terminate()
+        for worker in workers.values():
+            worker.join()
+        raise
+
 def main():
-    if len(sys.argv) > 1:
-        port = int(sys.argv[1])
-    else:
-        port = 55556
+    args = parse_args()
+    HttpServer.static_files = StaticFiles(args.static_root)
+    MazeHttpServer.admin_token = args.admin_token
+    configure_mazes(args)
         
     print("=" * 60)
     print("    🎮 MAZE GAME SERVER")
     print("=" * 60)
     
-    svr = MazeServer(port)
-    svr.start()
-    
     try:
-        while True:
-            time.sleep(1)
+        if args.processes > 1:
+            run_prefork(args)
+        else:
+            setup_logging(args)
+            if args.tick_rate > 0:
+                start_simulation(args.tick_rate)
+            if args.udp_port:
+                start_udp(args.udp_port)
+            svr = build_server(args)
+            svr.start()
+            while True:
+                time.sleep(1)
     except KeyboardInterrupt:
         logging.warning("Server shutting down...")
         print("\n👋 Server shutting down...")
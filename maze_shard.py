@@ -0,0 +1,293 @@
+import asyncio
+import json
+import logging
+import selectors
+import socket
+import urllib.parse
+import zlib
+
+# Pre-fork mode (maze_server.py --processes N): N worker processes accept on
+# the same public port through SO_REUSEPORT, and each room lives in exactly
+# one of them. A worker that receives a request for a room it does not own
+# forwards it, unchanged apart from the header below, to the owner's private
+# port and relays the response; upgrades and event streams are piped both
+# ways for as long as they last. Requests count as forwarded because they
+# arrive on the private port; the header is informational, and a copy sent
+# by a client is replaced.
+FORWARDED_HEADER = 'X-Maze-Forwarded'
+
+# Endpoints any worker answers itself (rooms is merged from all of them,
+# metrics are the answering worker's own)
+LOCAL_PATHS = (b'/api/status', b'/api/rooms', b'/api/metrics')
+# Admin endpoints act on the process that receives them, never forwarded
+ADMIN_PREFIX = b'/api/admin/'
+
+
+class ShardMap:
+    """Which worker process owns which room
+
+    Rooms are assigned by a stable hash of their id, so every worker agrees on
+    the owner without talking to the others. Worker i also listens on
+    host:base_port + i for requests forwarded by its peers.
+    """
+    def __init__(self, count, index, base_port, default_room='default', host='127.0.0.1'):
+        self.count = count
+        self.index = index
+        self.base_port = base_port
+        self.default_room = default_room
+        self.host = host
+
+    def owner(self, room_id):
+        return zlib.crc32(room_id.encode()) % self.count
+
+    def is_local(self, room_id):
+        return self.owner(room_id) == self.index
+
+    def peer_address(self, index):
+        return (self.host, self.base_port + index)
+
+    def peers(self):
+        return [i for i in range(self.count) if i != self.index]
+
+    def route(self, request):
+        """Index of the worker that must serve this raw request, None when it is this one
+
+        Only for requests from the public port: a forwarded one (private
+        port) is always served where it arrives. A client sending the
+        forwarded header itself gets no say in that.
+        """
+        head, _, body = request.partition(b"\r\n\r\n")
+        lines = head.split(b"\r\n")
+        parts = lines[0].split(b" ")
+        if len(parts) < 2:
+            return None
+        path, _, query = parts[1].partition(b"?")
+        if not path.startswith(b"/api/") or path in LOCAL_PATHS or path.startswith(ADMIN_PREFIX):
+            return None
+
+        room = urllib.parse.parse_qs(query.decode(errors='replace')).get('room', [''])[0]
+        if not room and b'"room"' in body:
+            try:
+                data = json.loads(body)
+            except ValueError:
+                data = None
+            if isinstance(data, dict):
+                room = str(data.get('room') or '')
+        if not room:
+            if path == b"/api/room/create":
+                return None  # New room with a random id, picked among our own
+            room = self.default_room
+
+        owner = self.owner(room)
+        return None if owner == self.index else owner
+
+
+def mark_forwarded(request):
+    head, separator, body = request.partition(b"\r\n\r\n")
+    lines = head.split(b"\r\n")
+    marker = FORWARDED_HEADER.lower().encode() + b":"
+    lines = [lines[0], FORWARDED_HEADER.encode() + b": 1"] + [
+        line for line in lines[1:] if not line.lower().startswith(marker)]
+    return b"\r\n".join(lines) + separator + body
+
+
+def extract_response(buffer):
+    """Split one response off buffer: (response or None, rest, open_ended, close)
+
+    open_ended responses (101 upgrades, event streams without Content-Length)
+    have no end; the caller pipes the connection from then on.
+    """
+    end = buffer.find(b"\r\n\r\n")
+    if end < 0:
+        return None, buffer, False, False
+    lines = buffer[:end].split(b"\r\n")
+    status = lines[0].split(b" ")
+    length = None
+    close = False
+    for line in lines[1:]:
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        if name == b"content-length":
+            length = int(value)
+        elif name == b"connection":
+            close = b"close" in value.lower()
+    if length is None or (len(status) > 1 and status[1] == b"101"):
+        return buffer, b"", True, close
+    total = end + 4 + length
+    if len(buffer) < total:
+        return None, buffer, False, False
+    return buffer[:total], buffer[total:], False, close
+
+
+class PeerConnections:
+    """Blocking connections from one client connection to the workers owning its rooms"""
+    timeout = 10
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.socks = {}
+
+    def forward(self, owner, request):
+        """Send request to worker `owner`, returns (response, peer socket, open_ended, close)
+
+        An idle kept-alive peer connection may have been closed in the
+        meantime, so a failure on a reused one is retried once on a new one.
+        """
+        request = mark_forwarded(request)
+        while True:
+            sock = self.socks.get(owner)
+            reused = sock is not None
+            if sock is None:
+                sock = self.socks[owner] = socket.create_connection(
+                    self.shards.peer_address(owner), timeout=self.timeout)
+            try:
+                sock.sendall(request)
+                buffer = b""
+                while True:
+                    response, buffer, open_ended, close = extract_response(buffer)
+                    if response is not None:
+                        break
+                    data = sock.recv(65536)
+                    if not data:
+                        raise ConnectionError("Peer worker closed the connection")
+                    buffer += data
+            except OSError:
+                self.drop(owner)
+                if reused:
+                    continue
+                raise
+            if open_ended:
+                self.socks.pop(owner)  # Handed to pipe()
+            elif close:
+                self.drop(owner)
+            return response, sock, open_ended, close
+
+    def drop(self, owner):
+        sock = self.socks.pop(owner, None)
+        if sock is not None:
+            sock.close()
+
+    def close(self):
+        for owner in list(self.socks):
+            self.drop(owner)
+
+
+def pipe(client, peer, pending=b""):
+    """Relay bytes both ways between two blocking sockets until either side closes"""
+    selector = selectors.DefaultSelector()
+    try:
+        if pending:
+            peer.sendall(pending)
+        client.settimeout(None)
+        peer.settimeout(None)
+        selector.register(client, selectors.EVENT_READ, peer)
+        selector.register(peer, selectors.EVENT_READ, client)
+        while True:
+            for key, _ in selector.select():
+                data = key.fileobj.recv(65536)
+                if not data:
+                    return
+                key.data.sendall(data)
+    except OSError as e:
+        logging.warning(f"Forwarded connection ended: {e}")
+    finally:
+        selector.close()
+        client.close()
+        peer.close()
+
+
+class AsyncPeerConnections:
+    """PeerConnections for the asyncio engine"""
+    timeout = PeerConnections.timeout
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.streams = {}
+
+    async def forward(self, owner, request):
+        """Returns (response, (reader, writer), open_ended, close)"""
+        request = mark_forwarded(request)
+        while True:
+            streams = self.streams.get(owner)
+            reused = streams is not None
+            if streams is None:
+                streams = self.streams[owner] = await asyncio.wait_for(
+                    asyncio.open_connection(*self.shards.peer_address(owner)), self.timeout)
+            reader, writer = streams
+            try:
+                writer.write(request)
+                await writer.drain()
+                buffer = b""
+                while True:
+                    response, buffer, open_ended, close = extract_response(buffer)
+                    if response is not None:
+                        break
+                    data = await asyncio.wait_for(reader.read(65536), self.timeout)
+                    if not data:
+                        raise ConnectionError("Peer worker closed the connection")
+                    buffer += data
+            except (OSError, asyncio.TimeoutError):
+                self.drop(owner)
+                if reused:
+                    continue
+                raise
+            if open_ended:
+                self.streams.pop(owner)
+            elif close:
+                self.drop(owner)
+            return response, streams, open_ended, close
+
+    def drop(self, owner):
+        streams = self.streams.pop(owner, None)
+        if streams is not None:
+            streams[1].close()
+
+    def close(self):
+        for owner in list(self.streams):
+            self.drop(owner)
+
+
+async def async_pipe(client, peer, pending=b""):
+    """Relay both ways between two (reader, writer) pairs until either side closes"""
+    async def copy(reader, writer):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    return
+                writer.write(data)
+                await writer.drain()
+        except OSError:
+            return
+
+    if pending:
+        peer[1].write(pending)
+    tasks = [asyncio.ensure_future(copy(client[0], peer[1])),
+             asyncio.ensure_future(copy(peer[0], client[1]))]
+    await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in tasks:
+        task.cancel()
+    peer[1].close()
+
+
+def fetch_peer_rooms(shards):
+    """GET /api/rooms from every other worker (blocking, short-lived connections)"""
+    room_list = []
+    request = mark_forwarded(b"GET /api/rooms HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+    for index in shards.peers():
+        try:
+            with socket.create_connection(shards.peer_address(index), timeout=PeerConnections.timeout) as sock:
+                sock.sendall(request)
+                buffer = b""
+                while True:
+                    response, buffer, _, _ = extract_response(buffer)
+                    if response is not None:
+                        break
+                    data = sock.recv(65536)
+                    if not data:
+                        raise ConnectionError("Peer worker closed the connection")
+                    buffer += data
+            room_list.extend(json.loads(response.partition(b"\r\n\r\n")[2])['rooms'])
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Could not list rooms of worker {index}: {e}")
+    return room_list
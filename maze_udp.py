@@ -0,0 +1,369 @@
+import heapq
+import logging
+import random
+import socket
+import struct
+import threading
+import time
+
+import maze_binary
+
+# Optional UDP channel for the latency critical traffic (maze_server.py
+# --udp-port). POST /api/player/add returns a session token and the UDP port;
+# every datagram from the client then starts with
+#
+#     type (B), token (8 bytes), sequence number (I)
+#
+# in network byte order. Datagrams may be lost, duplicated or reordered:
+# the server ignores any packet whose sequence number is not newer than the
+# last one it accepted from that session, and the client ignores acks and
+# position snapshots older than what it already has. Join, reset and stats
+# stay on HTTP.
+
+# Client -> server
+MOVE = 0x01     # x, y: absolute position, validated like /api/player/move
+INPUT = 0x02    # dx, dy: held direction for the server simulation (--tick-rate)
+PING = 0x03     # asks for a snapshot now and keeps position pushes coming
+
+# Server -> client
+MOVE_ACK = 0x81                       # sequence number of the move, ok, authoritative x, y
+POSITIONS = maze_binary.POSITIONS     # same record as maze-binary: version, count, entries
+ERROR = 0x8F                          # sequence number, error code
+
+HEADER = struct.Struct('!B8sI')
+MOVE_PAYLOAD = struct.Struct('!ii')
+INPUT_PAYLOAD = struct.Struct('!bb')
+MOVE_ACK_RECORD = struct.Struct('!BIBii')
+ERROR_RECORD = struct.Struct('!BIB')
+
+ERROR_UNKNOWN_SESSION = 1
+ERROR_BAD_PACKET = 2
+
+TOKEN_BYTES = 8
+# Stay under common path MTUs; bigger snapshots are split over several datagrams
+MAX_DATAGRAM = 1200
+MAX_POSITIONS = (MAX_DATAGRAM - maze_binary.POSITIONS_HEADER.size) // maze_binary.POSITION_ENTRY.size
+
+
+def is_newer(seq, last):
+    """Sequence number comparison that survives the 32-bit wrap-around"""
+    return last is None or 0 < ((seq - last) & 0xFFFFFFFF) < 0x80000000
+
+
+def encode_header(packet_type, token, seq):
+    return HEADER.pack(packet_type, token, seq & 0xFFFFFFFF)
+
+
+def encode_positions(snapshot):
+    """POSITIONS datagrams for a game snapshot, split to fit MAX_DATAGRAM"""
+    entries = [(snapshot.player_info[pid]['index'], pos['x'], pos['y'])
+               for pid, pos in snapshot.players.items()]
+    return [maze_binary.encode_positions(snapshot.version, entries[i:i + MAX_POSITIONS])
+            for i in range(0, max(len(entries), 1), MAX_POSITIONS)]
+
+
+class UdpSession:
+    def __init__(self, token, room, player_id):
+        self.token = token
+        self.room = room
+        self.player_id = player_id
+        self.address = None
+        self.last_seq = None
+        self.last_seen = time.time()  # Registration counts, the client has session_timeout to start
+        self.sent_version = None
+
+
+class UdpGameServer(threading.Thread):
+    """UDP endpoint next to the HTTP server: moves and inputs in, acks and position pushes out
+
+    Sessions are registered by the HTTP handler when a player joins. A
+    session that sent anything in the last session_timeout seconds receives
+    a POSITIONS snapshot of its room whenever the room's state changes (at
+    most push_rate times a second). Sessions silent for longer than that, or
+    whose room was removed, are dropped; clients resend their held input
+    several times a second, so only departed players go quiet that long.
+    """
+    session_timeout = 10
+    push_rate = 30
+
+    def __init__(self, port, rooms, link=None):
+        self.port = port
+        self.rooms = rooms
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Anything with sendto(), e.g. a LossyLink to test under bad conditions
+        self.link = link or self.sock
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.stale_packets = 0
+        threading.Thread.__init__(self, daemon=True)
+
+    def register(self, room, player_id, token):
+        """Accept datagrams carrying token (hex, as returned to the client) for player_id in room"""
+        token = bytes.fromhex(token)
+        with self.lock:
+            session = self.sessions.get(token)
+            if session is None or session.room is not room:
+                self.sessions[token] = UdpSession(token, room, player_id)
+            else:
+                # Rejoin, possibly from a new socket whose sequence numbers start over
+                session.last_seq = None
+                session.address = None
+                session.sent_version = None
+                session.last_seen = time.time()
+
+    def bind(self):
+        self.sock.bind(('0.0.0.0', self.port))
+
+    def run(self):
+        threading.Thread(target=self.push_loop, daemon=True).start()
+        while True:
+            try:
+                data, address = self.sock.recvfrom(2048)
+            except OSError as e:
+                if self.sock.fileno() < 0:
+                    return  # Closed
+                logging.warning(f"UDP receive error: {e}")
+                continue
+            reply = self.handle_datagram(data, address)
+            if reply:
+                self.link.sendto(reply, address)
+
+    def handle_datagram(self, data, address):
+        """Apply one client datagram, returns the reply bytes (or None)"""
+        if len(data) < HEADER.size:
+            return None
+        packet_type, token, seq = HEADER.unpack_from(data)
+        session = self.sessions.get(token)
+        if session is None or self.rooms.get(session.room.room_id) is not session.room:
+            return ERROR_RECORD.pack(ERROR, seq, ERROR_UNKNOWN_SESSION)
+        if not is_newer(seq, session.last_seq):
+            self.stale_packets += 1
+            return None  # Duplicate or overtaken by a newer packet
+        session.last_seq = seq
+        session.address = address
+        session.last_seen = time.time()
+        game = session.room.game
+        payload = data[HEADER.size:]
+
+        try:
+            if packet_type == MOVE:
+                x, y = MOVE_PAYLOAD.unpack_from(payload)
+                ok = game.move_player(session.player_id, x, y)
+                pos = game.get_player_position(session.player_id)
+                return MOVE_ACK_RECORD.pack(MOVE_ACK, seq, 1 if ok else 0, pos['x'], pos['y'])
+            elif packet_type == INPUT:
+                dx, dy = INPUT_PAYLOAD.unpack_from(payload)
+                game.queue_input(session.player_id, dx, dy)
+                return None
+            elif packet_type == PING:
+                session.sent_version = None  # Next push round sends a snapshot
+                return None
+        except struct.error:
+            pass
+        return ERROR_RECORD.pack(ERROR, seq, ERROR_BAD_PACKET)
+
+    def push_loop(self):
+        interval = 1.0 / self.push_rate
+        next_prune = time.time() + 1
+        while True:
+            time.sleep(interval)
+            try:
+                self.push_positions()
+                if time.time() >= next_prune:
+                    self.prune_sessions()
+                    next_prune = time.time() + 1
+            except Exception as e:
+                logging.warning(f"UDP push failed: {e}")
+
+    def prune_sessions(self):
+        """Drop expired sessions and those of removed rooms, returns how many"""
+        now = time.time()
+        with self.lock:
+            expired = [token for token, session in self.sessions.items()
+                       if now - session.last_seen > self.session_timeout
+                       or self.rooms.rooms.get(session.room.room_id) is not session.room]
+            for token in expired:
+                del self.sessions[token]
+        return len(expired)
+
+    def push_positions(self):
+        now = time.time()
+        encoded = {}  # One encoding per room snapshot per round
+        with self.lock:
+            sessions = list(self.sessions.values())
+        for session in sessions:
+            if session.address is None or now - session.last_seen > self.session_timeout:
+                continue
+            snapshot = session.room.game.snapshot
+            if snapshot.version == session.sent_version:
+                continue
+            datagrams = encoded.get(id(snapshot))
+            if datagrams is None:
+                datagrams = encoded[id(snapshot)] = encode_positions(snapshot)
+            for datagram in datagrams:
+                self.link.sendto(datagram, session.address)
+            session.sent_version = snapshot.version
+
+
+class UdpChannel:
+    """Client side, non-blocking: send moves/inputs, call poll() to collect what came back
+
+    When the server no longer knows the session (it expired, or the server
+    restarted) poll() calls rejoin with the current token, at most every
+    rejoin_interval seconds, e.g. HttpClientInterface.add_player; the token
+    in its OK answer carries the session on.
+    """
+    rejoin_interval = 1.0
+
+    def __init__(self, token, server_address, link=None, rejoin=None):
+        self.token = bytes.fromhex(token)
+        self.server_address = server_address
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.link = link or self.sock
+        self.seq = 0
+        # Newest accepted server data
+        self.last_ack_seq = None
+        self.position = None          # (ok, x, y) of the newest acked move
+        self.positions_version = None
+        self.positions = {}           # player index -> (x, y)
+        self.stale_packets = 0
+        self.rejoin = rejoin
+        self.session_lost = False
+        self.last_rejoin = 0
+
+    def send(self, packet_type, payload=b''):
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        self.link.sendto(encode_header(packet_type, self.token, self.seq) + payload, self.server_address)
+        return self.seq
+
+    def move(self, x, y):
+        return self.send(MOVE, MOVE_PAYLOAD.pack(x, y))
+
+    def send_input(self, dx, dy):
+        return self.send(INPUT, INPUT_PAYLOAD.pack(dx, dy))
+
+    def ping(self):
+        return self.send(PING)
+
+    def poll(self):
+        """Read every waiting datagram, returns True if a newer ack or snapshot arrived"""
+        updated = False
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                break  # e.g. ICMP port unreachable while the server is down
+            if data and self.handle_datagram(data):
+                updated = True
+        if self.session_lost and self.rejoin and time.time() - self.last_rejoin > self.rejoin_interval:
+            self.rejoin_session()
+        return updated
+
+    def rejoin_session(self):
+        self.last_rejoin = time.time()
+        try:
+            result = self.rejoin(self.token.hex())
+        except Exception as e:
+            logging.warning(f"UDP session lost, rejoin failed: {e}")
+            return
+        if result.get('status') != 'OK' or not result.get('token'):
+            logging.warning(f"UDP session lost, rejoin failed: {result.get('message')}")
+            return
+        self.token = bytes.fromhex(result['token'])
+        self.session_lost = False
+        # The session starts over on the server, a restarted one counts
+        # state versions from the beginning again
+        self.last_ack_seq = None
+        self.positions_version = None
+        self.positions = {}
+        self.ping()
+
+    def handle_datagram(self, data):
+        packet_type = data[0]
+        if packet_type == MOVE_ACK and len(data) >= MOVE_ACK_RECORD.size:
+            _, seq, ok, x, y = MOVE_ACK_RECORD.unpack_from(data)
+            if not is_newer(seq, self.last_ack_seq):
+                self.stale_packets += 1
+                return False
+            self.last_ack_seq = seq
+            self.position = (bool(ok), x, y)
+            return True
+        elif packet_type == POSITIONS and len(data) >= maze_binary.POSITIONS_HEADER.size:
+            _, version, count = maze_binary.POSITIONS_HEADER.unpack_from(data)
+            if self.positions_version is not None and version < self.positions_version:
+                self.stale_packets += 1
+                return False
+            if version != self.positions_version:
+                # Parts of a split snapshot share its version: keep merging them
+                self.positions = {}
+                self.positions_version = version
+            entry = maze_binary.POSITION_ENTRY
+            for i in range(count):
+                index, x, y = entry.unpack_from(data, maze_binary.POSITIONS_HEADER.size + i * entry.size)
+                self.positions[index] = (x, y)
+            return True
+        elif packet_type == ERROR and len(data) >= ERROR_RECORD.size:
+            _, seq, code = ERROR_RECORD.unpack_from(data)
+            if code == ERROR_UNKNOWN_SESSION:
+                self.session_lost = True
+            logging.warning(f"UDP packet {seq} rejected by server (code {code})")
+        return False
+
+    def close(self):
+        self.sock.close()
+
+
+class LossyLink:
+    """Local network simulator: a sendto() that drops, delays, jitters and duplicates datagrams
+
+    Wrap either end's socket with it (UdpChannel(link=...) or
+    UdpGameServer(link=...)) to see how the game behaves on a bad network.
+    Delayed datagrams are released by a background thread, so reordering
+    happens naturally when jitter exceeds the send interval.
+    """
+    def __init__(self, sock, loss=0.0, latency=0.0, jitter=0.0, duplicate=0.0, seed=None):
+        self.sock = sock
+        self.loss = loss
+        self.latency = latency
+        self.jitter = jitter
+        self.duplicate = duplicate
+        self.random = random.Random(seed)
+        self.queue = []
+        self.counter = 0
+        self.condition = threading.Condition()
+        self.sent = 0
+        self.dropped = 0
+        threading.Thread(target=self.release_loop, daemon=True).start()
+
+    def sendto(self, data, address):
+        copies = 2 if self.random.random() < self.duplicate else 1
+        for _ in range(copies):
+            if self.random.random() < self.loss:
+                self.dropped += 1
+                continue
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            with self.condition:
+                self.counter += 1
+                heapq.heappush(self.queue, (time.monotonic() + delay, self.counter, data, address))
+                self.condition.notify()
+        return len(data)
+
+    def release_loop(self):
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                due, _, data, address = self.queue[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self.condition.wait(wait)
+                    continue
+                heapq.heappop(self.queue)
+            try:
+                self.sock.sendto(data, address)
+                self.sent += 1
+            except OSError:
+                pass
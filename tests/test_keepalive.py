@@ -0,0 +1,88 @@
+"""Idle keep-alive connections of the threaded engine must not hold pool workers
+
+    python -m unittest discover tests
+"""
+import os
+import socket
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import maze_server  # noqa: E402
+
+REQUEST = b"GET /api/status HTTP/1.1\r\nHost: localhost\r\n\r\n"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def read_response(sock):
+    """Status code of one response, read up to the end of its body"""
+    data = b''
+    while b'\r\n\r\n' not in data:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    head, body = data.split(b'\r\n\r\n', 1)
+    length = 0
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            length = int(value)
+    while len(body) < length:
+        body += sock.recv(4096)
+    return int(head.split()[1])
+
+
+class KeepAliveParkingTest(unittest.TestCase):
+    workers = 2
+
+    @classmethod
+    def setUpClass(cls):
+        cls.port = free_port()
+        cls.server = maze_server.MazeServer(cls.port, workers=cls.workers, queue_size=16)
+        cls.server.daemon = True
+        cls.server.start()
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', cls.port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError("server did not start")
+
+    def connect(self):
+        sock = socket.create_connection(('127.0.0.1', self.port), timeout=5)
+        self.addCleanup(sock.close)
+        return sock
+
+    def test_new_request_served_while_pool_full_of_idle_connections(self):
+        idle = []
+        for _ in range(self.workers * 3):
+            sock = self.connect()
+            sock.sendall(REQUEST)
+            self.assertEqual(read_response(sock), 200)
+            idle.append(sock)
+
+        started = time.monotonic()
+        sock = self.connect()
+        sock.sendall(REQUEST)
+        self.assertEqual(read_response(sock), 200)
+        # A worker waiting out an idle connection would take a second or more
+        self.assertLess(time.monotonic() - started, 0.5)
+
+        # The parked connections are still served when they speak again
+        for sock in idle:
+            sock.sendall(REQUEST)
+            self.assertEqual(read_response(sock), 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
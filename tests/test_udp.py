@@ -0,0 +1,80 @@
+"""UDP sessions: rejoining resets a session, a client whose session was dropped joins again
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import maze_udp  # noqa: E402
+from maze_game import MazeGame  # noqa: E402
+from maze_server import RoomRegistry  # noqa: E402
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class UdpSessionTest(unittest.TestCase):
+    def setUp(self):
+        self.rooms = RoomRegistry(MazeGame())
+        self.room = self.rooms.get(RoomRegistry.default_room)
+        self.room.game.add_player('p1', 'Player')
+        self.token = self.room.game.get_session_token('p1')
+        self.server = maze_udp.UdpGameServer(0, self.rooms)
+        self.server.sock.bind(('127.0.0.1', 0))
+        self.server.start()
+        self.address = self.server.sock.getsockname()
+        self.server.register(self.room, 'p1', self.token)
+
+    def tearDown(self):
+        self.server.sock.close()
+
+    def join(self, token):
+        """What /api/player/add does for an existing player with a matching token"""
+        self.server.register(self.room, 'p1', self.token)
+        return {'status': 'OK', 'message': 'Player rejoined', 'token': self.token}
+
+    def test_register_again_resets_sequence_and_address(self):
+        session = self.server.sessions[bytes.fromhex(self.token)]
+        ping = maze_udp.encode_header(maze_udp.PING, session.token, 500)
+        self.server.handle_datagram(ping, ('127.0.0.1', 40000))
+        self.assertEqual(session.last_seq, 500)
+
+        self.server.register(self.room, 'p1', self.token)
+        self.assertIsNone(session.last_seq)
+        self.assertIsNone(session.address)
+        # A new socket starting its sequence over is accepted
+        stale = self.server.stale_packets
+        self.server.handle_datagram(maze_udp.encode_header(maze_udp.PING, session.token, 1), ('127.0.0.1', 40001))
+        self.assertEqual(self.server.stale_packets, stale)
+        self.assertEqual(session.address, ('127.0.0.1', 40001))
+
+    def test_client_rejoins_when_session_dropped(self):
+        channel = maze_udp.UdpChannel(self.token, self.address, rejoin=self.join)
+        channel.rejoin_interval = 0
+        self.addCleanup(channel.close)
+        token = bytes.fromhex(self.token)
+
+        self.server.sessions.clear()  # As prune_sessions does after session_timeout
+        channel.ping()
+        self.assertTrue(wait_for(lambda: channel.poll() or channel.session_lost or token in self.server.sessions))
+        # The error reply made poll() join again over "HTTP", which registered the session
+        self.assertIn(token, self.server.sessions)
+        self.assertFalse(channel.session_lost)
+
+        channel.move(1, 1)
+        self.assertTrue(wait_for(lambda: channel.poll() and channel.position is not None))
+        self.assertIsNotNone(self.server.sessions[token].address)
+
+
+if __name__ == '__main__':
+    unittest.main()